@@ -0,0 +1,108 @@
+"""
+Compares ORM and column projected read paths of get_users.
+
+ORM path is what get_users handler did before: select(User) -> ORM objects -> GetUsersResponse -> json,
+row path is UserService.get_users_json: selected columns -> plain rows -> json.
+
+Usage: python -m benchmarks.get_users_read_path [--rows 10000 100000] [--repeat 3] [--database-url URL]
+Database is created from models metadata, by default in a temporary SQLite file
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert, delete
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.models.base import Base
+from src.models.user import User
+from src.repositories.notification_repository import NotificationRepository
+from src.repositories.user_repository import UserRepository
+from src.schemas.Request.GetUsersRequest import GetUsersRequest
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.services.user_events import get_user_event_bus
+from src.services.user_identity_cache import get_user_identity_cache
+from src.services.user_query_flights import get_user_query_flights
+from src.services.users_service import UserService
+
+
+async def seed(session_builder: async_sessionmaker, rows: int):
+    async with session_builder() as session:
+        await session.execute(delete(User))
+
+        project_id = uuid.uuid4()
+        now = datetime.now(timezone.utc)
+
+        for start in range(0, rows, 5000):
+            await session.execute(insert(User), [
+                {'id': uuid.uuid4(), 'created_at': now, 'login': f'bench_user_{i}', 'hashed_password': 'x' * 64,
+                 'project_id': project_id, 'env': Environment.PROD, 'domain': Domain.REGULAR}
+                for i in range(start, min(start + 5000, rows))
+            ])
+
+        await session.commit()
+
+
+async def orm_path(user_service: UserService, session_builder: async_sessionmaker) -> bytes:
+    users = await user_service.get_users(session_builder, GetUsersRequest(env=Environment.PROD))
+
+    return json.dumps(jsonable_encoder(users)).encode()
+
+
+async def row_path(user_service: UserService, session_builder: async_sessionmaker) -> bytes:
+    return await user_service.get_users_json(session_builder, GetUsersRequest(env=Environment.PROD))
+
+
+async def measure(path, user_service: UserService, session_builder: async_sessionmaker, repeat: int) -> float:
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await path(user_service, session_builder)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+async def main(rows_counts: list[int], repeat: int, database_url: str | None):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(database_url or f"sqlite+aiosqlite:///{Path(directory) / 'bench.db'}")
+
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        session_builder = async_sessionmaker(engine, expire_on_commit=False)
+        user_service = UserService(UserRepository(), get_user_event_bus(NotificationRepository()),
+                                   get_user_identity_cache(UserRepository()), get_user_query_flights())
+        results = []
+
+        for rows in rows_counts:
+            await seed(session_builder, rows)
+
+            orm_seconds = await measure(orm_path, user_service, session_builder, repeat)
+            row_seconds = await measure(row_path, user_service, session_builder, repeat)
+
+            results.append({'rows': rows, 'orm_path_ms': round(orm_seconds * 1000, 1),
+                            'row_path_ms': round(row_seconds * 1000, 1),
+                            'speedup': round(orm_seconds / row_seconds, 2)})
+
+        await engine.dispose()
+
+    print(json.dumps({'benchmark': 'get_users_read_path', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.rows, args.repeat, args.database_url))
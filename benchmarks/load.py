@@ -0,0 +1,301 @@
+"""
+Load and contention benchmark of lock and user endpoints.
+
+Drives src.handlers.main:app in-process through httpx ASGITransport (with its lifespan), so numbers cover routing,
+validation, services, pool and db, but not uvicorn and the network.
+
+Scenarios:
+  acquire_storm - bots fight over a small pool of users with acquire_any / release_lock
+  mixed         - bots mix reads (get_users_page, get_users by id) with acquire_lock / release_lock of random users
+  bulk_create   - one streamed NDJSON upload through bulk_create_users
+  get_users     - get_users of one project at a time over a big table
+
+Every scenario reports p50/p99 latency per operation, throughput and lock conflict rate as JSON.
+
+Usage: python -m benchmarks.load [--scenarios acquire_storm mixed ...] [--concurrency 1000] [--database-url URL]
+                                 [--wipe] [--output results.json]
+Database is created from models metadata, by default in a temporary SQLite file. SQLite serializes writes,
+so contention numbers are only representative on Postgres. Scenarios delete all users before seeding their own,
+so a database passed with --database-url that already has users is refused unless --wipe is passed.
+Settings (pool size, hasher...) are read from the environment as usual, password hashing is made cheap unless
+--real-hashing is passed
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+SCENARIOS = ('acquire_storm', 'mixed', 'bulk_create', 'get_users')
+# Responses meaning the user was taken by someone else (or, with --wait-timeout, too many bots already wait
+# for one), not a failure
+CONFLICT_STATUSES = {'acquire_any': (404, 429), 'acquire_lock': (409,)}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.conflicts: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, operation: str, url: str, **kwargs) -> httpx.Response:
+        started_at = time.perf_counter()
+        response = await client.post(url, **kwargs)
+        self.latencies[operation].append(time.perf_counter() - started_at)
+
+        if response.status_code in CONFLICT_STATUSES.get(operation, ()):
+            self.conflicts[operation] += 1
+        elif response.status_code >= 400:
+            self.errors[operation] += 1
+
+        return response
+
+    def summarize(self, elapsed: float) -> dict:
+        operations = {}
+
+        for operation, latencies in self.latencies.items():
+            latencies.sort()
+            operations[operation] = {
+                'count': len(latencies), 'errors': self.errors[operation], 'conflicts': self.conflicts[operation],
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+                'max_ms': round(latencies[-1] * 1000, 2)
+            }
+
+        requests = sum(len(latencies) for latencies in self.latencies.values())
+        lock_attempts = sum(len(self.latencies[operation]) for operation in CONFLICT_STATUSES)
+
+        return {'elapsed_s': round(elapsed, 3), 'requests': requests,
+                'throughput_rps': round(requests / elapsed, 1) if elapsed else None,
+                'conflict_rate': round(sum(self.conflicts.values()) / lock_attempts, 4) if lock_attempts else None,
+                'operations': operations}
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted values
+    """
+    index = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+async def seed(session_builder, buckets: list[tuple[uuid.UUID, str, str]], users_per_bucket: int) -> list[uuid.UUID]:
+    """
+    Replaces all users with users_per_bucket users in every bucket, written directly without hashing
+    :return: ids of created users
+    """
+    from sqlalchemy import delete, insert
+
+    from src.models.user import User
+    from src.schemas.Shared.Domain import Domain
+    from src.schemas.Shared.Environment import Environment
+
+    ids = []
+    rows = [(project_id, Environment(env), Domain(domain))
+            for project_id, env, domain in buckets for _ in range(users_per_bucket)]
+    now = datetime.now(timezone.utc)
+
+    async with session_builder() as session:
+        await session.execute(delete(User))
+
+        for start in range(0, len(rows), 5000):
+            chunk = [{'id': uuid.uuid4(), 'created_at': now, 'login': f'bench_user_{start + i}',
+                      'hashed_password': 'x' * 64, 'project_id': project_id, 'env': env, 'domain': domain}
+                     for i, (project_id, env, domain) in enumerate(rows[start:start + 5000])]
+            await session.execute(insert(User), chunk)
+            ids.extend(row['id'] for row in chunk)
+
+        await session.commit()
+
+    return ids
+
+
+async def run_bots(concurrency: int, bot) -> float:
+    started_at = time.perf_counter()
+    await asyncio.gather(*(bot(number) for number in range(concurrency)))
+
+    return time.perf_counter() - started_at
+
+
+async def acquire_storm(client: httpx.AsyncClient, session_builder, args) -> dict:
+    project_id = uuid.uuid4()
+    await seed(session_builder, [(project_id, 'prod', 'regular')], args.pool_users)
+    await resync_caches()
+    recorder = Recorder()
+    filters = {'project_id': str(project_id), 'env': 'prod', 'domain': 'regular', 'ttl': 60}
+
+    if args.wait_timeout is not None:
+        filters['wait_timeout'] = args.wait_timeout
+
+    async def bot(number: int):
+        for _ in range(args.iterations):
+            response = await recorder.request(client, 'acquire_any', '/api/v1/lock/acquire_any', json=filters)
+
+            if response.status_code == 200:
+                user = response.json()
+                await recorder.request(client, 'release_lock', '/api/v1/lock/release_lock',
+                                       json={'user_id': user['id'], 'lock_token': user['lock_token']})
+
+    return recorder.summarize(await run_bots(args.concurrency, bot)) | {'pool_users': args.pool_users}
+
+
+async def mixed(client: httpx.AsyncClient, session_builder, args) -> dict:
+    project_id = uuid.uuid4()
+    ids = [str(user_id) for user_id in await seed(session_builder, [(project_id, 'prod', 'regular')],
+                                                  args.mixed_users)]
+    await resync_caches()
+    recorder = Recorder()
+
+    async def bot(number: int):
+        bot_random = random.Random(number)
+
+        for _ in range(args.iterations):
+            if bot_random.random() < args.read_ratio:
+                if bot_random.random() < 0.5:
+                    await recorder.request(client, 'get_users_page', '/api/v1/users/get_users_page',
+                                           json={'project_id': str(project_id), 'limit': 20})
+                else:
+                    await recorder.request(client, 'get_users_by_id', '/api/v1/users/get_users',
+                                           json={'id': bot_random.choice(ids), 'fields': ['id', 'login']})
+            else:
+                response = await recorder.request(client, 'acquire_lock', '/api/v1/lock/acquire_lock',
+                                                  json={'user_id': bot_random.choice(ids), 'ttl': 60})
+
+                if response.status_code == 200:
+                    user = response.json()
+                    await recorder.request(client, 'release_lock', '/api/v1/lock/release_lock',
+                                           json={'user_id': user['id'], 'lock_token': user['lock_token']})
+
+    return recorder.summarize(await run_bots(args.concurrency, bot)) | {'users': args.mixed_users,
+                                                                       'read_ratio': args.read_ratio}
+
+
+async def bulk_create(client: httpx.AsyncClient, session_builder, args) -> dict:
+    await seed(session_builder, [], 0)
+    recorder = Recorder()
+    project_id = str(uuid.uuid4())
+
+    async def upload():
+        for start in range(0, args.bulk_users, 1000):
+            yield ''.join(json.dumps({'login': f'bulk_user_{i}', 'password': f'password_{i}', 'project_id': project_id,
+                                      'env': 'prod', 'domain': 'regular'}) + '\n'
+                          for i in range(start, min(start + 1000, args.bulk_users))).encode()
+
+    started_at = time.perf_counter()
+    response = await recorder.request(client, 'bulk_create_users', '/api/v1/users/bulk_create_users',
+                                      content=upload(), headers={'content-type': 'application/x-ndjson'})
+    elapsed = time.perf_counter() - started_at
+
+    return recorder.summarize(elapsed) | {'users': args.bulk_users, 'created': response.json().get('created'),
+                                          'users_per_second': round(args.bulk_users / elapsed, 1)}
+
+
+async def get_users(client: httpx.AsyncClient, session_builder, args) -> dict:
+    projects = [uuid.uuid4() for _ in range(max(args.table_users // args.users_per_project, 1))]
+    await seed(session_builder, [(project_id, 'prod', 'regular') for project_id in projects],
+               args.users_per_project)
+    await resync_caches()
+    recorder = Recorder()
+
+    async def bot(number: int):
+        bot_random = random.Random(number)
+
+        for _ in range(args.iterations):
+            await recorder.request(client, 'get_users', '/api/v1/users/get_users',
+                                   json={'project_id': str(bot_random.choice(projects))})
+
+    return recorder.summarize(await run_bots(args.concurrency, bot)) | {
+        'table_users': len(projects) * args.users_per_project, 'users_per_response': args.users_per_project}
+
+
+async def resync_caches():
+    """
+    Seeded rows bypass the service, so in-process caches are reloaded the way they are after reconnect
+    """
+    from src.repositories.notification_repository import NotificationRepository
+    from src.services.user_events import get_user_event_bus
+
+    await get_user_event_bus(NotificationRepository()).resync()
+
+
+async def has_users(connection) -> bool:
+    from sqlalchemy import exists, inspect, select
+
+    from src.models.user import User
+
+    if not await connection.run_sync(lambda sync_connection: inspect(sync_connection).has_table(User.__tablename__)):
+        return False
+
+    return bool(await connection.scalar(select(exists(select(User.id)))))
+
+
+async def main(args) -> dict:
+    from src.db.database import AsyncSessionMaker, engine
+    from src.handlers.main import app
+    from src.models.base import Base
+
+    async with engine.begin() as connection:
+        if not args.wipe and await has_users(connection):
+            raise SystemExit(f'{engine.url!r} already has users, which the benchmark would delete. '
+                             f'Pass --wipe to run against it anyway')
+
+        await connection.run_sync(Base.metadata.create_all)
+
+    results = {}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+            for scenario in args.scenarios:
+                results[scenario] = await globals()[scenario](client, AsyncSessionMaker, args)
+
+    await engine.dispose()
+
+    return {'benchmark': 'load', 'database': engine.dialect.name, 'concurrency': args.concurrency,
+            'iterations': args.iterations, 'scenarios': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=1000, help='concurrent bots')
+    parser.add_argument('--iterations', type=int, default=10, help='requests (or lock cycles) per bot')
+    parser.add_argument('--pool-users', type=int, default=50, help='users fought over in acquire_storm')
+    parser.add_argument('--wait-timeout', type=float, default=None, help='long-poll wait_timeout of acquire_storm')
+    parser.add_argument('--mixed-users', type=int, default=10_000)
+    parser.add_argument('--read-ratio', type=float, default=0.8)
+    parser.add_argument('--bulk-users', type=int, default=100_000)
+    parser.add_argument('--table-users', type=int, default=1_000_000)
+    parser.add_argument('--users-per-project', type=int, default=1000)
+    parser.add_argument('--real-hashing', action='store_true', help='keep configured password hashing cost')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--wipe', action='store_true', help='allow deleting users of a non-empty database')
+    parser.add_argument('--output', default=None, help='file to write JSON results to, printed otherwise')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Settings and engine are created on import, so environment is prepared before importing the app
+        os.environ['DATABASE_URL'] = args.database_url or f"sqlite+aiosqlite:///{Path(directory) / 'bench.db'}"
+
+        if not args.real_hashing:
+            os.environ['SCRYPT_N'] = '16'
+            os.environ['PBKDF2_ITERATIONS'] = '10'
+
+        report = json.dumps(asyncio.run(main(args)), indent=2)
+
+    if args.output:
+        Path(args.output).write_text(report + '\n')
+    else:
+        print(report)
@@ -0,0 +1,30 @@
+"""Lock leases
+
+Revision ID: 9b2e51c7d3a0
+Revises: 4a03ce256e98
+Create Date: 2026-10-18 14:05:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2e51c7d3a0'
+down_revision: Union[str, Sequence[str], None] = '4a03ce256e98'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_users_lease_expires_at'), 'users', ['lease_expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_lease_expires_at'), table_name='users')
+    op.drop_column('users', 'lease_expires_at')
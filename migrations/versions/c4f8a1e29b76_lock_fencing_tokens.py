@@ -0,0 +1,28 @@
+"""Lock fencing tokens
+
+Revision ID: c4f8a1e29b76
+Revises: 9b2e51c7d3a0
+Create Date: 2026-10-18 15:40:03.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8a1e29b76'
+down_revision: Union[str, Sequence[str], None] = '9b2e51c7d3a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('lock_token', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'lock_token')
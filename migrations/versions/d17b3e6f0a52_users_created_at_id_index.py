@@ -0,0 +1,28 @@
+"""Users created_at id index
+
+Revision ID: d17b3e6f0a52
+Revises: c4f8a1e29b76
+Create Date: 2026-10-18 16:52:47.114390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd17b3e6f0a52'
+down_revision: Union[str, Sequence[str], None] = 'c4f8a1e29b76'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_created_at_id', table_name='users')
@@ -0,0 +1,38 @@
+"""Users bucket indexes
+
+Revision ID: e5a9c2d4b813
+Revises: d17b3e6f0a52
+Create Date: 2026-10-18 19:21:05.408137
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c2d4b813'
+down_revision: Union[str, Sequence[str], None] = 'd17b3e6f0a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY doesn't lock users table for writes, but can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_project_id_env_domain', 'users', ['project_id', 'env', 'domain'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_users_free_project_id_env_domain', 'users', ['project_id', 'env', 'domain'],
+                        unique=False, postgresql_where=sa.text('locktime IS NULL'), postgresql_concurrently=True)
+        # Composite bucket index starts with project_id and serves project_id filters alone as well
+        op.drop_index('ix_users_project_id', table_name='users', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_project_id', 'users', ['project_id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_users_free_project_id_env_domain', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_users_project_id_env_domain', table_name='users', postgresql_concurrently=True)
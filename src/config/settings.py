@@ -0,0 +1,128 @@
+import os
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+
+    if value is None:
+        return default
+
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _get_optional_int(name: str) -> int | None:
+    value = os.getenv(name)
+
+    return int(value) if value else None
+
+
+def _get_optional_float(name: str) -> float | None:
+    value = os.getenv(name)
+
+    return float(value) if value else None
+
+
+# Lease ttl (seconds) used when acquire request doesn't pass its own one, None means locks never expire
+LOCK_DEFAULT_TTL = _get_optional_int("LOCK_DEFAULT_TTL")
+
+LEASE_REAPER_ENABLED = _get_bool("LEASE_REAPER_ENABLED", True)
+LEASE_REAPER_INTERVAL = float(os.getenv("LEASE_REAPER_INTERVAL", "5"))
+LEASE_REAPER_BATCH_SIZE = int(os.getenv("LEASE_REAPER_BATCH_SIZE", "500"))
+
+# Heartbeats arriving within the window are written with one multi-row UPDATE
+LEASE_RENEW_WINDOW = float(os.getenv("LEASE_RENEW_WINDOW", "0.05"))
+LEASE_RENEW_MAX_BATCH_SIZE = int(os.getenv("LEASE_RENEW_MAX_BATCH_SIZE", "1000"))
+
+# Page size used by get_users_page when request doesn't pass its own limit
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "100"))
+
+# Amount of rows fetched from db cursor at once by streaming export
+USERS_STREAM_BATCH_SIZE = int(os.getenv("USERS_STREAM_BATCH_SIZE", "1000"))
+
+# Amount of users written by one COPY (or multi-row INSERT) during bulk ingestion
+BULK_CREATE_CHUNK_SIZE = int(os.getenv("BULK_CREATE_CHUNK_SIZE", "5000"))
+# Longest line (or CSV record) of bulk upload in bytes, longer ones are rejected instead of being buffered
+UPLOAD_MAX_LINE_LENGTH = int(os.getenv("UPLOAD_MAX_LINE_LENGTH", "65536"))
+
+# Hasher used for new passwords: scrypt, pbkdf2_sha256 or sha256 (legacy), hashes of all of them keep verifying
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "scrypt")
+SCRYPT_N = int(os.getenv("SCRYPT_N", "16384"))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", "600000"))
+
+# Hashing runs outside of event loop in chunks: executor is thread or process, None workers means executor default
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = _get_optional_int("PASSWORD_HASH_WORKERS")
+PASSWORD_HASH_CHUNK_SIZE = int(os.getenv("PASSWORD_HASH_CHUNK_SIZE", "64"))
+
+# In-process index of free users per (project_id, env, domain) bucket used by acquire_any, loaded at startup
+AVAILABILITY_INDEX_ENABLED = _get_bool("AVAILABILITY_INDEX_ENABLED", False)
+# Amount of indexed candidates acquire_any tries to lock before falling back to db query
+AVAILABILITY_INDEX_ATTEMPTS = int(os.getenv("AVAILABILITY_INDEX_ATTEMPTS", "3"))
+
+# Lock, release and create events are sent to other workers with pg_notify on this channel and applied
+# to their in-process caches, workers resync their caches after (re)connecting to the channel
+USER_EVENTS_NOTIFY_ENABLED = _get_bool("USER_EVENTS_NOTIFY_ENABLED", False)
+USER_EVENTS_CHANNEL = os.getenv("USER_EVENTS_CHANNEL", "botopia_user_events")
+USER_EVENTS_RECONNECT_INTERVAL = float(os.getenv("USER_EVENTS_RECONNECT_INTERVAL", "1"))
+# Listener connection is checked with a query this often (seconds), so silently dropped connections are noticed
+USER_EVENTS_KEEPALIVE_INTERVAL = float(os.getenv("USER_EVENTS_KEEPALIVE_INTERVAL", "10"))
+
+# Read-through cache of immutable user attributes (id, login, project_id, env, domain, created_at),
+# size 0 disables it
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# Acquire requests with wait_timeout park until a matching user is freed, at most this many per worker
+ACQUIRE_MAX_WAITERS = int(os.getenv("ACQUIRE_MAX_WAITERS", "1000"))
+ACQUIRE_MAX_WAIT_TIMEOUT = float(os.getenv("ACQUIRE_MAX_WAIT_TIMEOUT", "60"))
+# Without USER_EVENTS_NOTIFY_ENABLED users freed by other workers don't wake waiters,
+# so parked requests retry their claim this often (seconds)
+ACQUIRE_WAIT_POLL_INTERVAL = float(os.getenv("ACQUIRE_WAIT_POLL_INTERVAL", "2"))
+
+# Events stream: events buffered per subscriber before it is considered too slow and dropped,
+# and interval (seconds) of keepalive comments sent to idle subscribers
+EVENT_STREAM_QUEUE_SIZE = int(os.getenv("EVENT_STREAM_QUEUE_SIZE", "1000"))
+EVENT_STREAM_HEARTBEAT_INTERVAL = float(os.getenv("EVENT_STREAM_HEARTBEAT_INTERVAL", "15"))
+
+# Seconds per-bucket user counts returned by /users/stats are cached for
+USER_STATS_TTL = float(os.getenv("USER_STATS_TTL", "1"))
+
+# Connection pool of the main engine: connections kept open, extra connections opened under load, seconds to wait
+# for a free connection, seconds after which connections are reopened (-1 never) and liveness check on checkout
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = _get_bool("DB_POOL_PRE_PING", False)
+# Prepared statements cached per asyncpg connection, 0 is required behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Server-side statement_timeout (milliseconds) of every connection, None keeps server default
+DB_STATEMENT_TIMEOUT = _get_optional_int("DB_STATEMENT_TIMEOUT")
+
+# Seconds a request may take, db transactions it starts get the remaining time as statement_timeout.
+# Clients can shorten it with X-Request-Timeout header, None disables deadlines
+REQUEST_DEADLINE = _get_optional_float("REQUEST_DEADLINE")
+
+# Per-layer latency histograms (request, handler, service, repository, db) exported at /metrics,
+# when disabled timing hooks aren't installed at all
+LATENCY_METRICS_ENABLED = _get_bool("LATENCY_METRICS_ENABLED", True)
+
+# Identical concurrent get_users requests share one db query and its result, with ttl (seconds) above 0
+# requests arriving shortly after it finished get the same result too (at the cost of that much staleness)
+GET_USERS_COALESCING_ENABLED = _get_bool("GET_USERS_COALESCING_ENABLED", True)
+GET_USERS_COALESCE_TTL = float(os.getenv("GET_USERS_COALESCE_TTL", "0"))
+
+# Single-user acquires and releases arriving within the window are written by one transaction, so the window
+# trades latency of every lock write for throughput of commits
+LOCK_WRITE_BATCHING_ENABLED = _get_bool("LOCK_WRITE_BATCHING_ENABLED", False)
+LOCK_WRITE_BATCH_WINDOW = float(os.getenv("LOCK_WRITE_BATCH_WINDOW", "0.002"))
+LOCK_WRITE_MAX_BATCH_SIZE = int(os.getenv("LOCK_WRITE_MAX_BATCH_SIZE", "500"))
+# Batch transactions of different workers can deadlock on each other's rows, such batches are rerun this many times
+LOCK_WRITE_BATCH_RETRIES = int(os.getenv("LOCK_WRITE_BATCH_RETRIES", "3"))
@@ -1,14 +1,95 @@
 import os
+import time
 
 from dotenv import load_dotenv
+from sqlalchemy import event, make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.db.pool import InstrumentedPool
+from src.exceptions.exceptions import RequestDeadlineExceededException
+from src.utils import deadline
+from src.utils.timing import LAYER_DURATION
 
 
 load_dotenv()
 
-engine = create_async_engine(os.getenv("DATABASE_URL"))
 
-AsyncSessionMaker = async_sessionmaker(engine, expire_on_commit=False)
+def get_connect_args(url: str) -> dict:
+    """
+    :return: asyncpg connection arguments built from settings, empty for other drivers
+    """
+    if make_url(url).get_driver_name() != 'asyncpg':
+        return {}
+
+    # SQLAlchemy prepares statements itself, asyncpg cache is used by the rest (raw connection, COPY)
+    connect_args = {'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+                    'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE}
+
+    if settings.DB_STATEMENT_TIMEOUT is not None:
+        connect_args['server_settings'] = {'statement_timeout': str(settings.DB_STATEMENT_TIMEOUT)}
+
+    return connect_args
+
+
+class DeadlineSession(Session):
+    """
+    Session whose transactions don't outlive deadline of the request that started them
+    """
+
+
+@event.listens_for(DeadlineSession, 'after_begin')
+def apply_request_deadline(session: Session, transaction, connection):
+    timeout = deadline.remaining()
+
+    if timeout is None:
+        return
+
+    if timeout <= 0:
+        raise RequestDeadlineExceededException(message='Request deadline exceeded')
+
+    if connection.dialect.name == 'postgresql':
+        # LOCAL setting is reset when the transaction ends, so the connection goes back to the pool clean
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {max(int(timeout * 1000), 1)}')
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('statement_started_at', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    started_at = connection.info['statement_started_at'].pop()
+    operation = statement.split(None, 1)[0].upper() if statement.strip() else 'EMPTY'
+    LAYER_DURATION.labels('db', operation).observe(time.perf_counter() - started_at)
+
+
+def _handle_error(context):
+    # Failed statement never reaches after_cursor_execute
+    started_at = context.connection.info.get('statement_started_at') if context.connection is not None else None
+
+    if started_at:
+        started_at.pop()
+
+
+def instrument_statements(sync_engine):
+    """
+    Records duration of every statement executed by engine by its kind (SELECT, UPDATE...)
+    """
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', _handle_error)
+
+
+engine = create_async_engine(os.getenv("DATABASE_URL"), poolclass=InstrumentedPool, pool_size=settings.DB_POOL_SIZE,
+                             max_overflow=settings.DB_MAX_OVERFLOW, pool_timeout=settings.DB_POOL_TIMEOUT,
+                             pool_recycle=settings.DB_POOL_RECYCLE, pool_pre_ping=settings.DB_POOL_PRE_PING,
+                             connect_args=get_connect_args(os.getenv("DATABASE_URL")))
+
+if settings.LATENCY_METRICS_ENABLED:
+    instrument_statements(engine.sync_engine)
+
+AsyncSessionMaker = async_sessionmaker(engine, expire_on_commit=False, sync_session_class=DeadlineSession)
 
 
 async def get_db() -> async_sessionmaker[AsyncSession] | None:
@@ -0,0 +1,40 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.utils.metrics import Counter, Gauge, Histogram
+
+POOL_CHECKOUT_WAIT = Histogram('db_pool_checkout_wait_seconds',
+                               'Time spent getting a connection from the pool, including opening new ones')
+POOL_CHECKOUT_TIMEOUTS = Counter('db_pool_checkout_timeouts_total',
+                                 'Connection checkouts that gave up after waiting pool_timeout')
+POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Connections checked out of the pool')
+POOL_OVERFLOW = Gauge('db_pool_overflow_connections', 'Connections opened above pool_size')
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool exporting checkout wait time and usage. Long waits with every connection in use mean pool starvation,
+    short waits together with slow requests mean slow queries
+    """
+
+    def connect(self):
+        started_at = time.perf_counter()
+
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started_at)
+            self._update_usage()
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._update_usage()
+
+    def _update_usage(self):
+        POOL_IN_USE.set(self.checkedout())
+        POOL_OVERFLOW.set(max(self.overflow(), 0))
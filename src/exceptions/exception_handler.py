@@ -1,5 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError
 
 from src.exceptions.exceptions import BaseServiceException
 
@@ -12,3 +13,17 @@ async def service_exception_handler(request: Request, exception: BaseServiceExce
         status_code=exception.status_code,
         content=exception.get_exception_details()
     )
+
+
+# Postgres query_canceled, raised when statement_timeout cancels a statement
+QUERY_CANCELED_SQLSTATE = '57014'
+
+
+async def statement_timeout_handler(request: Request, exception: DBAPIError):
+    if getattr(exception.orig, 'sqlstate', None) != QUERY_CANCELED_SQLSTATE:
+        raise exception
+
+    return JSONResponse(
+        status_code=504,
+        content={"message": "Database statement timed out", "meta": {}}
+    )
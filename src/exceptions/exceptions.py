@@ -29,3 +29,43 @@ class UserNotFoundException(BaseServiceException):
 class UserIsAlreadyLockedException(BaseServiceException):
     def __init__(self, message: str = "", meta: dict | None = None):
         super().__init__(409, message, meta)
+
+
+class NoAvailableUsersException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(404, message, meta)
+
+
+class NotEnoughAvailableUsersException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(409, message, meta)
+
+
+class UserIsNotLockedException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(409, message, meta)
+
+
+class StaleLockTokenException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(409, message, meta)
+
+
+class InvalidCursorException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(400, message, meta)
+
+
+class InvalidUploadException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(400, message, meta)
+
+
+class TooManyWaitersException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(429, message, meta)
+
+
+class RequestDeadlineExceededException(BaseServiceException):
+    def __init__(self, message: str = "", meta: dict | None = None):
+        super().__init__(504, message, meta)
@@ -1,15 +1,82 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy.exc import DBAPIError
 import uvicorn
 
+from src.config import settings
+from src.db.database import AsyncSessionMaker, engine
+from src.handlers import metrics_handler
 from src.handlers.v1 import users_handler, lock_handler
 from src.exceptions.exceptions import BaseServiceException
-from src.exceptions.exception_handler import service_exception_handler
+from src.exceptions.exception_handler import service_exception_handler, statement_timeout_handler
+from src.handlers.middleware import RequestDeadlineMiddleware, RequestTimingMiddleware
+from src.repositories.lock_repository import LockRepository
+from src.repositories.notification_repository import NotificationRepository
+from src.repositories.user_repository import UserRepository
+from src.services.availability_index import get_availability_index
+from src.services.lease_reaper import LeaseReaper
+from src.services.lease_renewer import shutdown_lease_renewer
+from src.services.lock_write_batcher import shutdown_lock_write_batcher
+from src.services.user_event_listener import UserEventListener
+from src.services.user_events import get_user_event_bus
+from src.services.user_identity_cache import get_user_identity_cache
+from src.services.user_waiters import get_user_waiters
+from src.services.user_event_stream import get_user_event_stream
+from src.utils.hashing import shutdown_hashing_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    availability_index = get_availability_index()
+    user_event_bus = get_user_event_bus(NotificationRepository())
+    user_identity_cache = get_user_identity_cache(UserRepository())
+    user_event_bus.subscribe(availability_index.apply_events)
+    user_event_bus.subscribe(user_identity_cache.apply_events)
+    user_event_bus.subscribe(get_user_waiters().apply_events)
+    user_event_bus.subscribe(get_user_event_stream().apply_events)
+    user_event_bus.on_resync(user_identity_cache.clear)
+
+    if settings.AVAILABILITY_INDEX_ENABLED:
+        user_event_bus.on_resync(lambda: availability_index.rebuild(AsyncSessionMaker, UserRepository()))
+
+    lease_reaper = LeaseReaper(AsyncSessionMaker, LockRepository(), interval=settings.LEASE_REAPER_INTERVAL,
+                               batch_size=settings.LEASE_REAPER_BATCH_SIZE, user_event_bus=user_event_bus)
+    user_event_listener = UserEventListener(engine.url.set(drivername='postgresql').render_as_string(False),
+                                            user_event_bus, channel=settings.USER_EVENTS_CHANNEL,
+                                            reconnect_interval=settings.USER_EVENTS_RECONNECT_INTERVAL,
+                                            keepalive_interval=settings.USER_EVENTS_KEEPALIVE_INTERVAL)
+
+    if settings.USER_EVENTS_NOTIFY_ENABLED:
+        # Listener resyncs caches (and loads them for the first time) right after connecting
+        user_event_listener.start()
+    else:
+        await user_event_bus.resync()
 
-app = FastAPI(title="Botopia Service")
+    if settings.LEASE_REAPER_ENABLED:
+        lease_reaper.start()
+
+    yield
+
+    # Writes still waiting for their batch window are flushed before the app stops
+    await shutdown_lock_write_batcher()
+    await shutdown_lease_renewer()
+    await lease_reaper.stop()
+    await user_event_listener.stop()
+    shutdown_hashing_executor()
+
+
+app = FastAPI(title="Botopia Service", lifespan=lifespan)
 
 app.include_router(users_handler.router, prefix="/api/v1")
 app.include_router(lock_handler.router, prefix="/api/v1")
+app.include_router(metrics_handler.router)
 app.add_exception_handler(BaseServiceException, service_exception_handler)
+app.add_exception_handler(DBAPIError, statement_timeout_handler)
+app.add_middleware(RequestDeadlineMiddleware)
+
+if settings.LATENCY_METRICS_ENABLED:
+    app.add_middleware(RequestTimingMiddleware)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
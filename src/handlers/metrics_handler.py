@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.utils.metrics import render_metrics
+
+router = APIRouter(tags=['metrics'])
+
+
+@router.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_handler():
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
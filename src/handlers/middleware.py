@@ -0,0 +1,69 @@
+import math
+import time
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.config import settings
+from src.utils import deadline
+from src.utils.timing import LAYER_DURATION
+
+REQUEST_TIMEOUT_HEADER = 'x-request-timeout'
+
+
+class RequestDeadlineMiddleware:
+    """
+    Gives every http request a deadline: REQUEST_DEADLINE seconds or less if client asked for it in
+    X-Request-Timeout header. Endpoints run in the middleware task, so the deadline reaches their db transactions
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'http':
+            deadline.set_deadline(get_request_timeout(Headers(scope=scope).get(REQUEST_TIMEOUT_HEADER)))
+
+        await self.app(scope, receive, send)
+
+
+def get_request_timeout(header: str | None) -> float | None:
+    """
+    :param header: value of X-Request-Timeout header, malformed values are ignored
+    :return: seconds request may take, None if unlimited
+    """
+    timeout = settings.REQUEST_DEADLINE
+
+    try:
+        requested = float(header) if header is not None else None
+    except ValueError:
+        requested = None
+
+    if requested is not None and math.isfinite(requested) and requested > 0 and (timeout is None or requested < timeout):
+        timeout = requested
+
+    return timeout
+
+
+class RequestTimingMiddleware:
+    """
+    Records full duration of every http request by route. Its difference with the handler layer is the time
+    spent resolving dependencies, validating and serializing
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get('route')
+            LAYER_DURATION.labels('request', route.path if route is not None else 'unmatched').observe(
+                time.perf_counter() - started_at)
@@ -6,20 +6,71 @@ from typing import Annotated
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
 from src.db.database import get_db
+from src.schemas.Request.AcquireAnyUserRequest import AcquireAnyUserRequest
+from src.schemas.Request.AcquireUsersRequest import AcquireUsersRequest
+from src.schemas.Request.UserLockRequest import UserLockRequest
+from src.schemas.Response.LockedUserResponse import LockedUserResponse
+from src.schemas.Response.RebuildAvailabilityIndexResponse import RebuildAvailabilityIndexResponse
 from src.services.lock_service import LockService
+from src.utils.timing import timed
 
 router = APIRouter(prefix='/lock', tags=['lock'])
 
 
-@router.post('/acquire_lock')
+@router.post('/acquire_lock', response_model=LockedUserResponse)
+@timed('handler')
 async def acquire_lock_handler(user_id: Annotated[UUID, Body(embed=True)],
                                lock_service: Annotated[LockService, Depends()],
+                               ttl: Annotated[int | None, Body(embed=True, gt=0)] = None,
                                session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
-    await lock_service.acquire_lock(session_builder, user_id)
+    return await lock_service.acquire_lock(session_builder, user_id, ttl=ttl)
 
 
 @router.post('/release_lock')
+@timed('handler')
 async def release_lock_handler(user_id: Annotated[UUID, Body(embed=True)],
+                               lock_token: Annotated[int, Body(embed=True)],
                                lock_service: Annotated[LockService, Depends()],
                                session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
-    await lock_service.release_lock(session_builder, user_id)
+    await lock_service.release_lock(session_builder, user_id, lock_token)
+
+
+@router.post('/renew_lock')
+@timed('handler')
+async def renew_lock_handler(user_id: Annotated[UUID, Body(embed=True)],
+                             lock_token: Annotated[int, Body(embed=True)],
+                             ttl: Annotated[int, Body(embed=True, gt=0)],
+                             lock_service: Annotated[LockService, Depends()],
+                             session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    await lock_service.renew_lock(session_builder, user_id, lock_token, ttl)
+
+
+@router.post('/acquire_any', response_model=LockedUserResponse)
+@timed('handler')
+async def acquire_any_handler(user_filters: AcquireAnyUserRequest,
+                              lock_service: Annotated[LockService, Depends()],
+                              session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    return await lock_service.acquire_any(session_builder, user_filters)
+
+
+@router.post('/acquire_users', response_model=list[LockedUserResponse])
+@timed('handler')
+async def acquire_users_handler(user_filters: AcquireUsersRequest,
+                                lock_service: Annotated[LockService, Depends()],
+                                session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    return await lock_service.acquire_users(session_builder, user_filters)
+
+
+@router.post('/release_users', response_model=list[UUID])
+@timed('handler')
+async def release_users_handler(locks: Annotated[list[UserLockRequest], Body(embed=True)],
+                                lock_service: Annotated[LockService, Depends()],
+                                session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    return await lock_service.release_users(session_builder, locks)
+
+
+@router.post('/rebuild_availability_index', response_model=RebuildAvailabilityIndexResponse)
+@timed('handler')
+async def rebuild_availability_index_handler(lock_service: Annotated[LockService, Depends()],
+                                             session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    return RebuildAvailabilityIndexResponse(indexed=await lock_service.rebuild_availability_index(session_builder))
@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Body, Depends
+from uuid import UUID
+
+from fastapi import APIRouter, Body, Depends, Request
+from fastapi.responses import Response, StreamingResponse
 from typing import Annotated
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
@@ -6,27 +9,97 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from src.db.database import get_db
 from src.schemas.Request.GetUsersRequest import GetUsersRequest
 from src.schemas.Request.CreateUsersRequest import CreateUsersRequest
+from src.schemas.Response.BulkCreateUsersResponse import BulkCreateUsersResponse
+from src.schemas.Response.CreateUsersResponse import CreateUsersResponse
+from src.schemas.Response.GetUsersPageResponse import GetUsersPageResponse
 from src.schemas.Response.GetUsersResponse import GetUsersResponse
+from src.schemas.Response.UserStatsResponse import UserStatsResponse
+from src.schemas.Shared.ConflictMode import ConflictMode
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.services.user_stats import UserStats, get_user_stats
+from src.services.user_event_stream import UserEventStream, get_user_event_stream
 from src.services.users_service import UserService
+from src.utils.upload import parse_users_upload
+from src.utils.timing import timed
 
 router = APIRouter(prefix='/users', tags=['users'])
 
 
-@router.post('/create_user')
+@router.post('/create_user', response_model=CreateUsersResponse)
+@timed('handler')
 async def create_user_handler(user: CreateUsersRequest, user_service: Annotated[UserService, Depends()],
                               session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
-    await user_service.create_users(session_builder, [user])
+    return await user_service.create_users(session_builder, [user])
 
 
-@router.post('/create_users')
+@router.post('/create_users', response_model=CreateUsersResponse)
+@timed('handler')
 async def create_users_handler(users: Annotated[list[CreateUsersRequest], Body(embed=True)],
                                user_service: Annotated[UserService, Depends()],
+                               on_conflict: Annotated[ConflictMode, Body(embed=True)] = ConflictMode.ERROR,
                                session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
-    await user_service.create_users(session_builder, users)
+    return await user_service.create_users(session_builder, users, on_conflict=on_conflict)
+
+
+@router.post('/bulk_create_users', response_model=BulkCreateUsersResponse)
+@timed('handler')
+async def bulk_create_users_handler(request: Request, user_service: Annotated[UserService, Depends()],
+                                    session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    """
+    Accepts streamed NDJSON (application/x-ndjson) or CSV (text/csv with header) body with users to create
+    """
+    users = parse_users_upload(request.headers.get('content-type'), request.stream())
 
+    return BulkCreateUsersResponse(created=await user_service.bulk_create_users(session_builder, users))
 
-@router.post('/get_users', response_model=list[GetUsersResponse])
+
+# Response is serialized by the service, schema is only documented: with `fields` users have only requested keys
+@router.post('/get_users', response_class=Response, responses={200: {
+    'model': list[GetUsersResponse], 'content': {'application/json': {}},
+    'description': 'Users that passed filters. If `fields` is passed, every user has only the requested fields'}})
+@timed('handler')
 async def get_users_handler(user_filters: GetUsersRequest,
                             user_service: Annotated[UserService, Depends()],
                             session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
-    return await user_service.get_users(session_builder, user_filters)
+    """
+    Returns users that passed filters as a plain list. `limit` and `cursor` cut a single page of it,
+    but the response has no cursor of the next page: paging through users is done with get_users_page
+    """
+    return Response(content=await user_service.get_users_json(session_builder, user_filters),
+                    media_type='application/json')
+
+
+@router.post('/get_users_page', response_model=GetUsersPageResponse)
+@timed('handler')
+async def get_users_page_handler(user_filters: GetUsersRequest,
+                                 user_service: Annotated[UserService, Depends()],
+                                 session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    return await user_service.get_users_page(session_builder, user_filters)
+
+
+@router.post('/get_users_stream')
+@timed('handler')
+async def get_users_stream_handler(user_filters: GetUsersRequest,
+                                   user_service: Annotated[UserService, Depends()],
+                                   session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    return StreamingResponse(user_service.stream_users(session_builder, user_filters),
+                             media_type='application/x-ndjson')
+
+
+@router.get('/events')
+@timed('handler')
+async def user_events_handler(user_event_stream: Annotated[UserEventStream, Depends(get_user_event_stream)],
+                              project_id: UUID | None = None, env: Environment | None = None,
+                              domain: Domain | None = None):
+    return StreamingResponse(user_event_stream.stream((project_id, env, domain)), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.get('/stats', response_model=UserStatsResponse)
+@timed('handler')
+async def user_stats_handler(user_stats: Annotated[UserStats, Depends(get_user_stats)],
+                             project_id: UUID | None = None, env: Environment | None = None,
+                             domain: Domain | None = None,
+                             session_builder: async_sessionmaker[AsyncSession] = Depends(get_db)):
+    return await user_stats.get(session_builder, (project_id, env, domain))
@@ -2,9 +2,9 @@ import uuid
 from uuid import UUID
 from datetime import datetime, timezone
 
-from sqlalchemy import String, Enum, DateTime
+from sqlalchemy import String, Enum, DateTime, BigInteger, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import UUID as ORM_UUID
+from sqlalchemy import Uuid as ORM_UUID
 
 from src.models.base import Base
 from src.schemas.Shared.Domain import Domain
@@ -13,13 +13,25 @@ from src.schemas.Shared.Environment import Environment
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index('ix_users_created_at_id', 'created_at', 'id'),
+        # Bucket filters of get_users and acquire queries, project_id alone is served by its prefix
+        Index('ix_users_project_id_env_domain', 'project_id', 'env', 'domain'),
+        # Free users of a bucket, serves the `locktime IS NULL` branch of availability filter,
+        # planner unites it with lease_expires_at index serving the expired leases branch
+        Index('ix_users_free_project_id_env_domain', 'project_id', 'env', 'domain',
+              postgresql_where=text('locktime IS NULL'), sqlite_where=text('locktime IS NULL')),
+    )
 
     id: Mapped[UUID] = mapped_column(ORM_UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False,
                                                  default=lambda: datetime.now(timezone.utc))
     login: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
-    project_id: Mapped[UUID] = mapped_column(ORM_UUID(as_uuid=True), nullable=False, index=True)
+    project_id: Mapped[UUID] = mapped_column(ORM_UUID(as_uuid=True), nullable=False)
     env: Mapped[Environment] = mapped_column(Enum(Environment, name='environment_enum'), nullable=False)
     domain: Mapped[Domain] = mapped_column(Enum(Domain, name='domain_enum'), nullable=False)
     locktime: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    # Fencing token, incremented on every acquire so it's monotonic per user and never reset on release
+    lock_token: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default='0')
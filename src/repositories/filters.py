@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from sqlalchemy import ColumnElement, or_
+
+from src.models.user import User
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+
+
+def user_is_available(now: datetime | None = None) -> ColumnElement[bool]:
+    """
+    User is available if it is not locked or its lease has already expired
+    (expired leases are treated as free even before the reaper clears them)
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+
+    return or_(User.locktime.is_(None), User.lease_expires_at <= now)
+
+
+def build_user_filters(project_id: UUID | None = None, env: Environment | None = None,
+                       domain: Domain | None = None, only_available: bool = False) -> list[ColumnElement[bool]]:
+    filters = []
+
+    if project_id is not None:
+        filters.append(User.project_id == project_id)
+
+    if env is not None:
+        filters.append(User.env == env)
+
+    if domain is not None:
+        filters.append(User.domain == domain)
+
+    if only_available:
+        filters.append(user_is_available())
+
+    return filters
@@ -1,20 +1,248 @@
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from uuid import UUID
 
 from fastapi import Depends
-from sqlalchemy import update, select
+from sqlalchemy import update, select, or_, tuple_, Row
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
 from src.models.user import User
+from src.repositories.filters import build_user_filters, user_is_available
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.utils.timing import timed_methods
 
+# Released users are returned with their buckets, so release events can be matched against bucket filters
+RELEASED_USER_COLUMNS = (User.id, User.project_id, User.env, User.domain)
 
+
+def _lock_values(now: datetime, ttl: int | None) -> dict:
+    return {'locktime': now, 'lease_expires_at': now + timedelta(seconds=ttl) if ttl is not None else None,
+            'lock_token': User.lock_token + 1}
+
+
+@timed_methods('repository')
 class LockRepository:
     @staticmethod
-    async def toggle_user_lock(session_builder: async_sessionmaker[AsyncSession],
-                               user_id: UUID, should_lock: bool = True):
+    async def try_lock_user(session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                            ttl: int | None = None) -> User | None:
+        """
+        Locks user in one conditional statement, so concurrent callers can't both acquire the same user
+        :param session_builder: db session maker
+        :param user_id: id of user to lock
+        :param ttl: lease duration in seconds, lock never expires if not passed
+        :return: locked user with new fencing token, None if user is missing or already locked
+        """
+        async with session_builder() as session:
+            now = datetime.now(timezone.utc)
+            query = update(User).where(User.id == user_id, user_is_available(now)).values(
+                **_lock_values(now, ttl)).returning(User)
+
+            result = await session.execute(query, execution_options={'synchronize_session': False})
+            user = result.scalar_one_or_none()
+            await session.commit()
+
+            return user
+
+    @staticmethod
+    async def unlock_user(session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                          lock_token: int) -> Row | None:
+        """
+        Releases user only if it's still locked with passed fencing token
+        :param session_builder: db session maker
+        :param user_id: id of user to release
+        :param lock_token: fencing token received on acquire
+        :return: id and bucket of released user, None if user is missing, not locked or locked with another token
+        """
+        async with session_builder() as session:
+            query = update(User).where(User.id == user_id, User.lock_token == lock_token,
+                                       User.locktime.is_not(None)).values(
+                locktime=None, lease_expires_at=None).returning(*RELEASED_USER_COLUMNS)
+
+            result = await session.execute(query, execution_options={'synchronize_session': False})
+            await session.commit()
+
+            return result.one_or_none()
+
+    @staticmethod
+    async def lock_any_user(session_builder: async_sessionmaker[AsyncSession], project_id: UUID | None = None,
+                            env: Environment | None = None, domain: Domain | None = None,
+                            ttl: int | None = None) -> User | None:
+        """
+        Claims one free user matching filters in a single statement.
+        Rows that are being claimed by concurrent transactions are skipped instead of waited for
+        :param session_builder: db session maker
+        :param project_id: project of user to claim
+        :param env: environment of user to claim
+        :param domain: domain of user to claim
+        :param ttl: lease duration in seconds, lock never expires if not passed
+        :return: locked user or None if there are no free users left
+        """
+        async with session_builder() as session:
+            now = datetime.now(timezone.utc)
+            candidate = select(User.id).where(
+                *build_user_filters(project_id=project_id, env=env, domain=domain, only_available=True)
+            ).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+
+            query = update(User).where(User.id == candidate, user_is_available(now)).values(
+                **_lock_values(now, ttl)).returning(User)
+
+            result = await session.execute(query, execution_options={'synchronize_session': False})
+            user = result.scalar_one_or_none()
+            await session.commit()
+
+            return user
+
+    @staticmethod
+    async def lock_users(session_builder: async_sessionmaker[AsyncSession], count: int,
+                         project_id: UUID | None = None, env: Environment | None = None,
+                         domain: Domain | None = None, all_or_nothing: bool = False,
+                         ttl: int | None = None) -> list[User]:
+        """
+        Claims up to count free users matching filters in one transaction
+        :param session_builder: db session maker
+        :param count: max amount of users to claim
+        :param project_id: project of users to claim
+        :param env: environment of users to claim
+        :param domain: domain of users to claim
+        :param all_or_nothing: if set and less than count users are free, nothing is claimed
+        :param ttl: lease duration in seconds, locks never expire if not passed
+        :return: locked users, empty list if nothing was claimed
+        """
+        async with session_builder() as session:
+            now = datetime.now(timezone.utc)
+            candidates = select(User.id).where(
+                *build_user_filters(project_id=project_id, env=env, domain=domain, only_available=True)
+            ).limit(count).with_for_update(skip_locked=True)
+
+            query = update(User).where(User.id.in_(candidates), user_is_available(now)).values(
+                **_lock_values(now, ttl)).returning(User)
+
+            result = await session.execute(query, execution_options={'synchronize_session': False})
+            users = result.scalars().all()
+
+            if all_or_nothing and len(users) < count:
+                await session.rollback()
+                return []
+
+            await session.commit()
+
+            return users
+
+    @staticmethod
+    async def unlock_users(session_builder: async_sessionmaker[AsyncSession],
+                           locks: list[tuple[UUID, int]]) -> list[Row]:
+        """
+        Releases all passed users that are still locked with their fencing tokens in one statement
+        :param session_builder: db session maker
+        :param locks: pairs of user id and fencing token
+        :return: ids and buckets of users that got released
+        """
         async with session_builder() as session:
-            query = update(User).where(User.id == user_id).values(
-                locktime=datetime.now(timezone.utc) if should_lock else None)
+            query = update(User).where(tuple_(User.id, User.lock_token).in_(locks), User.locktime.is_not(None)).values(
+                locktime=None, lease_expires_at=None).returning(*RELEASED_USER_COLUMNS)
+
+            result = await session.execute(query, execution_options={'synchronize_session': False})
+            released = result.all()
+            await session.commit()
+
+            return released
+
+    @staticmethod
+    async def apply_lock_batch(session_builder: async_sessionmaker[AsyncSession], releases: list[tuple[UUID, int]],
+                               locks: dict[int | None, list[UUID]],
+                               claims: list[tuple[UUID | None, Environment | None, Domain | None, int | None, int]]
+                               ) -> tuple[list[Row], list[User], list[list[User]]]:
+        """
+        Applies lock writes of many callers in one transaction: releases first, so freed users can be locked again
+        by the same batch, then locks of users by id (one UPDATE per distinct ttl), then claims of free users
+        (one UPDATE per claim)
+        :param session_builder: db session maker
+        :param releases: pairs of user id and fencing token
+        :param locks: ids of users to lock grouped by lease ttl in seconds (None means locks never expire)
+        :param claims: (project_id, env, domain, ttl, count) of free users to claim
+        :return: released users (ids, buckets and fencing tokens), locked users, claimed users of every claim
+        """
+        async with session_builder() as session:
+            now = datetime.now(timezone.utc)
+            released, locked, claimed = [], [], []
+
+            if releases:
+                query = update(User).where(tuple_(User.id, User.lock_token).in_(releases),
+                                           User.locktime.is_not(None)).values(
+                    locktime=None, lease_expires_at=None).returning(*RELEASED_USER_COLUMNS, User.lock_token)
+
+                result = await session.execute(query, execution_options={'synchronize_session': False})
+                released = result.all()
+
+            for ttl, user_ids in locks.items():
+                query = update(User).where(User.id.in_(user_ids), user_is_available(now)).values(
+                    **_lock_values(now, ttl)).returning(User)
+
+                result = await session.execute(query, execution_options={'synchronize_session': False})
+                locked.extend(result.scalars().all())
+
+            for project_id, env, domain, ttl, count in claims:
+                candidates = select(User.id).where(
+                    *build_user_filters(project_id=project_id, env=env, domain=domain, only_available=True)
+                ).limit(count).with_for_update(skip_locked=True)
+
+                query = update(User).where(User.id.in_(candidates), user_is_available(now)).values(
+                    **_lock_values(now, ttl)).returning(User)
+
+                result = await session.execute(query, execution_options={'synchronize_session': False})
+                claimed.append(list(result.scalars().all()))
+
+            await session.commit()
+
+            return released, locked, claimed
+
+    @staticmethod
+    async def release_expired_locks(session_builder: async_sessionmaker[AsyncSession],
+                                    batch_size: int) -> list[Row]:
+        """
+        Clears at most batch_size expired leases, so row locks are held only for a short time
+        :param session_builder: db session maker
+        :param batch_size: max amount of leases to clear
+        :return: ids and buckets of users that got released
+        """
+        async with session_builder() as session:
+            now = datetime.now(timezone.utc)
+            candidates = select(User.id).where(User.lease_expires_at <= now).limit(batch_size).with_for_update(
+                skip_locked=True)
+
+            query = update(User).where(User.id.in_(candidates), User.lease_expires_at <= now).values(
+                locktime=None, lease_expires_at=None).returning(*RELEASED_USER_COLUMNS)
+
+            result = await session.execute(query, execution_options={'synchronize_session': False})
+            released = result.all()
+            await session.commit()
+
+            return released
+
+    @staticmethod
+    async def renew_leases(session_builder: async_sessionmaker[AsyncSession],
+                           renewals: dict[int, list[tuple[UUID, int]]]) -> list[tuple[UUID, int]]:
+        """
+        Extends leases of users that are still locked with passed fencing tokens and whose lease hasn't expired yet,
+        so an expired lease can't be revived before the reaper clears it.
+        Runs in one transaction, one UPDATE per distinct ttl
+        :param session_builder: db session maker
+        :param renewals: pairs of user id and fencing token grouped by new lease ttl in seconds
+        :return: pairs of user id and fencing token whose lease got extended
+        """
+        async with session_builder() as session:
+            now = datetime.now(timezone.utc)
+            renewed = []
+
+            for ttl, locks in renewals.items():
+                query = update(User).where(
+                    tuple_(User.id, User.lock_token).in_(locks), User.locktime.is_not(None),
+                    or_(User.lease_expires_at.is_(None), User.lease_expires_at > now)
+                ).values(lease_expires_at=now + timedelta(seconds=ttl)).returning(User.id, User.lock_token)
+
+                result = await session.execute(query, execution_options={'synchronize_session': False})
+                renewed.extend(tuple(row) for row in result.all())
+
+            await session.commit()
 
-            await session.execute(query)
-            await session.commit()
\ No newline at end of file
+            return renewed
@@ -0,0 +1,21 @@
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.utils.timing import timed_methods
+
+
+@timed_methods('repository')
+class NotificationRepository:
+    @staticmethod
+    async def notify(session_builder: async_sessionmaker[AsyncSession], channel: str, payloads: list[str]):
+        """
+        Sends payloads to channel listeners with pg_notify, they are delivered when the transaction commits
+        :param session_builder: db session maker
+        :param channel: LISTEN channel name
+        :param payloads: payloads to send, each must be shorter than 8000 bytes
+        """
+        async with session_builder() as session:
+            for payload in payloads:
+                await session.execute(select(func.pg_notify(channel, payload)))
+
+            await session.commit()
@@ -1,32 +1,56 @@
+from datetime import datetime
+from typing import AsyncIterator, Any
 from uuid import UUID
 
-from sqlalchemy import select, Select
+import asyncpg
+from sqlalchemy import select, Select, tuple_, RowMapping, Row, insert, func, case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
 from src.models.user import User
+from src.repositories.filters import build_user_filters, user_is_available
 from src.schemas.Shared.Domain import Domain
 from src.schemas.Shared.Environment import Environment
+from src.utils.timing import timed_methods
 
 
-class UserRepository:
-    @staticmethod
-    async def _build_query(project_id: UUID | None = None, env: Environment | None = None,
-                           domain: Domain | None = None, only_available: bool = False) -> Select[tuple[User]]:
-        query = select(User)
+# Columns returned to clients, hashed password is never read on these paths
+USER_RESPONSE_COLUMNS = (User.id, User.created_at, User.login, User.project_id, User.env, User.domain,
+                         User.locktime, User.lease_expires_at)
+
+# Columns filled by bulk ingestion, the rest have server side defaults or are empty for new users
+BULK_INSERT_COLUMNS = ('id', 'created_at', 'login', 'hashed_password', 'project_id', 'env', 'domain')
+
+# Columns overwritten when existing user is upserted, id and created_at of existing user are kept
+UPSERT_COLUMNS = ('hashed_password', 'project_id', 'env', 'domain')
+INSERT_CHUNK_SIZE = 1000
+
 
-        if project_id is not None:
-            query = query.where(User.project_id == project_id)
+def _response_columns(fields: list[str] | None) -> list:
+    if not fields:
+        return list(USER_RESPONSE_COLUMNS)
 
-        if env is not None:
-            query = query.where(User.env == env)
+    return [column for column in USER_RESPONSE_COLUMNS if column.key in fields]
 
-        if domain is not None:
-            query = query.where(User.domain == domain)
 
-        if only_available:
-            query = query.where(User.locktime.is_(None))
+def _paginate(query: Select, limit: int | None, after: tuple[datetime, UUID] | None) -> Select:
+    if limit is not None or after is not None:
+        query = query.order_by(User.created_at, User.id).limit(limit)
 
-        return query
+    if after is not None:
+        query = query.where(tuple_(User.created_at, User.id) > tuple_(*after))
+
+    return query
+
+
+@timed_methods('repository')
+class UserRepository:
+    @staticmethod
+    async def _build_query(project_id: UUID | None = None, env: Environment | None = None,
+                           domain: Domain | None = None, only_available: bool = False) -> Select[tuple[User]]:
+        return select(User).where(*build_user_filters(project_id=project_id, env=env, domain=domain,
+                                                      only_available=only_available))
 
     @staticmethod
     async def get_by_id(session_builder: async_sessionmaker[AsyncSession], user_id: UUID) -> User | None:
@@ -46,28 +70,185 @@ class UserRepository:
 
             return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_availability(session_builder: async_sessionmaker[AsyncSession]) -> list[Row]:
+        """
+        Selects bucket and availability of every user, used to load the in-process availability index
+        :param session_builder: db session maker
+        :return: rows of (id, project_id, env, domain, available)
+        """
+        async with session_builder() as session:
+            query = select(User.id, User.project_id, User.env, User.domain, user_is_available().label('available'))
+
+            result = await session.execute(query)
+
+            return result.all()
+
+    @staticmethod
+    async def count_by_bucket(session_builder: async_sessionmaker[AsyncSession]) -> list[Row]:
+        """
+        Counts users of every (project_id, env, domain) bucket with one grouped aggregate query
+        :param session_builder: db session maker
+        :return: rows of (project_id, env, domain, total, free)
+        """
+        async with session_builder() as session:
+            query = select(User.project_id, User.env, User.domain, func.count().label('total'),
+                           func.sum(case((user_is_available(), 1), else_=0)).label('free')).group_by(
+                User.project_id, User.env, User.domain).order_by(User.project_id, User.env, User.domain)
+
+            result = await session.execute(query)
+
+            return result.all()
+
     async def get_filtered_users(self, session_builder: async_sessionmaker[AsyncSession],
                                  project_id: UUID | None = None, env: Environment | None = None,
-                                 domain: Domain | None = None, only_available: bool = False) -> list[User]:
+                                 domain: Domain | None = None, only_available: bool = False,
+                                 limit: int | None = None, after: tuple[datetime, UUID] | None = None) -> list[User]:
+        """
+        Passing limit or after switches to keyset pagination: users are ordered by (created_at, id)
+        and only users strictly after the passed (created_at, id) pair are returned
+        """
         async with session_builder() as session:
             query = await self._build_query(project_id=project_id, env=env,
                                             domain=domain, only_available=only_available)
 
-            result = await session.execute(query)
+            result = await session.execute(_paginate(query, limit, after))
 
             return result.scalars().all()
 
     @staticmethod
-    async def add_users(session_builder: async_sessionmaker[AsyncSession], users: list[User]):
+    async def get_filtered_rows(session_builder: async_sessionmaker[AsyncSession], fields: list[str] | None = None,
+                                user_id: UUID | None = None, login: str | None = None,
+                                project_id: UUID | None = None, env: Environment | None = None,
+                                domain: Domain | None = None, only_available: bool = False,
+                                limit: int | None = None,
+                                after: tuple[datetime, UUID] | None = None) -> list[RowMapping]:
+        """
+        Same filtering as get_filtered_users, but only response columns are selected as plain rows,
+        so neither hashed password is read nor ORM objects are built
+        :param session_builder: db session maker
+        :param fields: names of columns to select, all response columns if not passed
+        :param user_id: if passed, only user with such id is selected
+        :param login: if passed, only user with such login is selected
+        :return: list of rows
+        """
         async with session_builder() as session:
-            session.add_all(users)
-            await session.commit()
+            query = select(*_response_columns(fields)).where(
+                *build_user_filters(project_id=project_id, env=env, domain=domain, only_available=only_available)
+            )
+
+            if user_id is not None:
+                query = query.where(User.id == user_id)
+
+            if login is not None:
+                query = query.where(User.login == login)
+
+            result = await session.execute(_paginate(query, limit, after))
+
+            return result.mappings().all()
 
     @staticmethod
-    async def check_existing_logins(session_builder: async_sessionmaker[AsyncSession], logins: list[str]) -> list[str]:
+    async def stream_filtered_users(session_builder: async_sessionmaker[AsyncSession], batch_size: int,
+                                    fields: list[str] | None = None,
+                                    project_id: UUID | None = None, env: Environment | None = None,
+                                    domain: Domain | None = None,
+                                    only_available: bool = False) -> AsyncIterator[list[RowMapping]]:
+        """
+        Streams users matching filters from a server side cursor batch by batch.
+        Only response columns are selected as plain rows, so no ORM objects are built and memory stays flat
+        :param session_builder: db session maker
+        :param batch_size: amount of rows fetched from cursor at once
+        :param fields: names of columns to select, all response columns if not passed
+        :return: async iterator over batches of rows
+        """
         async with session_builder() as session:
-            query = select(User.login).where(User.login.in_(logins))
+            query = select(*_response_columns(fields)).where(
+                *build_user_filters(project_id=project_id, env=env, domain=domain, only_available=only_available)
+            ).execution_options(yield_per=batch_size)
 
-            result = await session.execute(query)
+            result = await session.stream(query)
 
-            return result.scalars().all()
+            async for rows in result.mappings().partitions():
+                yield rows
+
+    @staticmethod
+    async def insert_users(session_builder: async_sessionmaker[AsyncSession], users: list[dict[str, Any]],
+                           update_existing: bool = False, all_or_nothing: bool = False) -> list[Row]:
+        """
+        Inserts users with INSERT ... ON CONFLICT (login), so existence check and insert are one atomic statement
+        :param session_builder: db session maker
+        :param users: users to insert, every user is a dict with BULK_INSERT_COLUMNS keys and a unique login
+        :param update_existing: if set, users with existing logins get UPSERT_COLUMNS overwritten,
+        otherwise they are left untouched
+        :param all_or_nothing: if set and any login already exists, transaction is rolled back
+        :return: (id, login) rows of inserted or updated users. Id differs from the passed one for updated users.
+        If transaction was rolled back, rows show which users would have been written
+        """
+        async with session_builder() as session:
+            dialect_insert = sqlite.insert if session.get_bind().dialect.name == 'sqlite' else postgresql.insert
+            rows = []
+
+            for start in range(0, len(users), INSERT_CHUNK_SIZE):
+                statement = dialect_insert(User).values(users[start:start + INSERT_CHUNK_SIZE])
+
+                if update_existing:
+                    statement = statement.on_conflict_do_update(
+                        index_elements=[User.login],
+                        set_={column: statement.excluded[column] for column in UPSERT_COLUMNS})
+                else:
+                    statement = statement.on_conflict_do_nothing(index_elements=[User.login])
+
+                result = await session.execute(statement.returning(User.id, User.login))
+                rows.extend(result.all())
+
+            if all_or_nothing and len(rows) < len(users):
+                await session.rollback()
+            else:
+                await session.commit()
+
+            return rows
+
+    @staticmethod
+    async def bulk_insert_users(session_builder: async_sessionmaker[AsyncSession],
+                                chunks: AsyncIterator[list[dict[str, Any]]]) -> int:
+        """
+        Inserts users chunk by chunk in one transaction, bypassing ORM unit of work.
+        On PostgreSQL every chunk is sent with binary COPY, other databases get one multi-row INSERT per chunk
+        :param session_builder: db session maker
+        :param chunks: async iterator over chunks of users, every user is a dict with BULK_INSERT_COLUMNS keys
+        :return: amount of inserted users
+        """
+        async with session_builder() as session:
+            connection = await session.connection()
+            inserted = 0
+
+            if connection.dialect.name == 'postgresql':
+                driver_connection = (await connection.get_raw_connection()).driver_connection
+
+                # asyncpg adapter sends BEGIN only with the first statement and COPY bypasses it, so without
+                # own transaction (a savepoint if adapter already began one) every chunk would be autocommitted
+                async with driver_connection.transaction():
+                    async for chunk in chunks:
+                        await UserRepository._copy_users(driver_connection, chunk)
+                        inserted += len(chunk)
+            else:
+                async for chunk in chunks:
+                    await session.execute(insert(User), chunk)
+                    inserted += len(chunk)
+
+            await session.commit()
+
+            return inserted
+
+    @staticmethod
+    async def _copy_users(driver_connection: asyncpg.Connection, users: list[dict[str, Any]]):
+        # Enum columns store names of enum members
+        records = [tuple(user[column].name if column in ('env', 'domain') else user[column]
+                         for column in BULK_INSERT_COLUMNS) for user in users]
+
+        try:
+            await driver_connection.copy_records_to_table(User.__tablename__, records=records,
+                                                          columns=BULK_INSERT_COLUMNS)
+        except asyncpg.UniqueViolationError as exception:
+            # Raised the same way as by statements sent through SQLAlchemy, so callers don't depend on the driver
+            raise IntegrityError(f'COPY {User.__tablename__}', None, exception) from exception
@@ -0,0 +1,15 @@
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+from src.config import settings
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+
+
+class AcquireAnyUserRequest(BaseModel):
+    project_id: UUID | None = None
+    env: Environment | None = None
+    domain: Domain | None = None
+    ttl: int | None = Field(default=None, gt=0)
+    # Seconds to wait for a matching user to be freed if there are no free users right now
+    wait_timeout: float | None = Field(default=None, gt=0, le=settings.ACQUIRE_MAX_WAIT_TIMEOUT)
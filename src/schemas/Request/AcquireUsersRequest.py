@@ -0,0 +1,8 @@
+from pydantic import Field
+
+from src.schemas.Request.AcquireAnyUserRequest import AcquireAnyUserRequest
+
+
+class AcquireUsersRequest(AcquireAnyUserRequest):
+    count: int = Field(gt=0, le=1000)
+    all_or_nothing: bool = False
@@ -1,9 +1,12 @@
+from typing import Literal
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from src.schemas.Shared.Domain import Domain
 from src.schemas.Shared.Environment import Environment
 
+UserField = Literal['id', 'created_at', 'login', 'project_id', 'env', 'domain', 'locktime', 'lease_expires_at']
+
 
 class GetUsersRequest(BaseModel):
     id: UUID | None = None
@@ -12,3 +15,9 @@ class GetUsersRequest(BaseModel):
     env: Environment | None = None
     domain: Domain | None = None
     only_available: bool = False
+    # Keyset pagination, users are ordered by (created_at, id) when any of these is passed.
+    # Only get_users_page returns the cursor of the next page
+    limit: int | None = Field(default=None, gt=0, le=1000)
+    cursor: str | None = None
+    # Projection, only these fields are returned by get_users and get_users_stream (all fields if not passed)
+    fields: list[UserField] | None = Field(default=None, min_length=1)
@@ -0,0 +1,7 @@
+from uuid import UUID
+from pydantic import BaseModel
+
+
+class UserLockRequest(BaseModel):
+    user_id: UUID
+    lock_token: int
@@ -0,0 +1,14 @@
+from uuid import UUID
+from pydantic import BaseModel
+
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+
+
+class BucketStatsResponse(BaseModel):
+    project_id: UUID
+    env: Environment
+    domain: Domain
+    total: int
+    free: int
+    locked: int
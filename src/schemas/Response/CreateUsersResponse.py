@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class CreateUsersResponse(BaseModel):
+    inserted: list[str]
+    updated: list[str]
+    skipped: list[str]
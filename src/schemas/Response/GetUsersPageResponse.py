@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+from src.schemas.Response.GetUsersResponse import GetUsersResponse
+
+
+class GetUsersPageResponse(BaseModel):
+    users: list[GetUsersResponse]
+    next_cursor: str | None
@@ -14,3 +14,4 @@ class GetUsersResponse(BaseModel):
     env: Environment
     domain: Domain
     locktime: datetime | None
+    lease_expires_at: datetime | None = None
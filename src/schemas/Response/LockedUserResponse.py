@@ -0,0 +1,5 @@
+from src.schemas.Response.GetUsersResponse import GetUsersResponse
+
+
+class LockedUserResponse(GetUsersResponse):
+    lock_token: int
@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+
+class RebuildAvailabilityIndexResponse(BaseModel):
+    indexed: int
@@ -0,0 +1,10 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+from src.schemas.Response.BucketStatsResponse import BucketStatsResponse
+
+
+class UserStatsResponse(BaseModel):
+    buckets: list[BucketStatsResponse]
+    # Time counts were read from db at, they are cached for USER_STATS_TTL seconds
+    counted_at: datetime
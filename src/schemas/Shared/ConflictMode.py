@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class ConflictMode(str, Enum):
+    ERROR = 'error'
+    SKIP = 'skip'
+    UPDATE = 'update'
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class UserEventType(str, Enum):
+    CREATED = 'created'
+    LOCKED = 'locked'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.repositories.user_repository import UserRepository
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_events import Bucket, UserEvent
+
+
+class AvailabilityIndex:
+    """
+    In-process sets of free user ids per (project_id, env, domain) bucket.
+    Index is only a hint: candidate taken from it is still confirmed by a conditional UPDATE, db stays the source
+    of truth. Users whose lease expired become free in the index only after the reaper releases them.
+    Until the index is loaded all its hooks are no-ops and it has no candidates
+    """
+
+    def __init__(self):
+        self._buckets: dict[UUID, Bucket] = {}
+        self._free: dict[Bucket, set[UUID]] = defaultdict(set)
+        self._loaded = False
+        # Changes made while rebuild is reading the table, they are replayed on top of the loaded state
+        self._journal: list[tuple[str, tuple]] | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def rebuild(self, session_builder: async_sessionmaker[AsyncSession],
+                      user_repository: UserRepository) -> int:
+        """
+        Reloads the index from db, index keeps serving its previous state until the new one is ready
+        :param session_builder: db session maker
+        :param user_repository: repository to read users from
+        :return: amount of indexed users
+        """
+        self._journal = []
+
+        try:
+            rows = await user_repository.get_availability(session_builder)
+        except Exception:
+            self._journal = None
+            raise
+
+        journal, self._journal = self._journal, None
+        self._buckets = {}
+        self._free = defaultdict(set)
+
+        for row in rows:
+            bucket = (row.project_id, row.env, row.domain)
+            self._buckets[row.id] = bucket
+
+            if row.available:
+                self._free[bucket].add(row.id)
+
+        self._loaded = True
+
+        for method, args in journal:
+            getattr(self, method)(*args)
+
+        return len(rows)
+
+    def pick(self, bucket: Bucket) -> UUID | None:
+        """
+        Takes a free user out of the bucket, so concurrent callers in this worker never get the same candidate
+        :return: candidate id or None if bucket has no known free users
+        """
+        free = self._free.get(bucket)
+
+        return free.pop() if free else None
+
+    def add_user(self, user_id: UUID, bucket: Bucket):
+        """
+        Registers created user as free, or moves upserted user to its new bucket keeping its lock state
+        """
+        if self._record('add_user', user_id, bucket):
+            return
+
+        old_bucket = self._buckets.get(user_id)
+        is_free = old_bucket is None or user_id in self._free[old_bucket]
+
+        if old_bucket is not None:
+            self._free[old_bucket].discard(user_id)
+
+        self._buckets[user_id] = bucket
+
+        if is_free:
+            self._free[bucket].add(user_id)
+
+    def mark_locked(self, user_ids: Iterable[UUID]):
+        user_ids = list(user_ids)
+
+        if self._record('mark_locked', user_ids):
+            return
+
+        for user_id in user_ids:
+            bucket = self._buckets.get(user_id)
+
+            if bucket is not None:
+                self._free[bucket].discard(user_id)
+
+    def mark_free(self, user_ids: Iterable[UUID]):
+        user_ids = list(user_ids)
+
+        if self._record('mark_free', user_ids):
+            return
+
+        for user_id in user_ids:
+            bucket = self._buckets.get(user_id)
+
+            if bucket is not None:
+                self._free[bucket].add(user_id)
+
+    def apply_events(self, events: list[UserEvent]):
+        """
+        User events subscriber, keeps the index in sync with changes made by this and other workers
+        """
+        for event in events:
+            if event.type == UserEventType.CREATED:
+                self.add_user(event.user_id, event.bucket)
+            elif event.type == UserEventType.LOCKED:
+                self.mark_locked([event.user_id])
+            else:
+                self.mark_free([event.user_id])
+
+    def _record(self, method: str, *args) -> bool:
+        """
+        :return: True if change shouldn't be applied to the current state because index is not loaded yet
+        """
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+        return not self._loaded
+
+
+_availability_index = AvailabilityIndex()
+
+
+def get_availability_index() -> AvailabilityIndex:
+    return _availability_index
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.repositories.lock_repository import LockRepository
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_events import UserEventBus, user_events
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseReaper:
+    """
+    Background task that periodically frees users whose lease has expired.
+    Leases are cleared in bounded batches, each in its own short transaction
+    """
+
+    def __init__(self, session_builder: async_sessionmaker[AsyncSession], lock_repository: LockRepository,
+                 interval: float, batch_size: int, user_event_bus: UserEventBus | None = None):
+        self._session_builder = session_builder
+        self._lock_repository = lock_repository
+        self._user_event_bus = user_event_bus
+        self._interval = interval
+        self._batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    async def reap(self) -> int:
+        """
+        Clears expired leases batch by batch until a batch comes back incomplete
+        :return: amount of released users
+        """
+        released = 0
+
+        while True:
+            released_users = await self._lock_repository.release_expired_locks(self._session_builder,
+                                                                               self._batch_size)
+            released += len(released_users)
+
+            if self._user_event_bus is not None:
+                self._user_event_bus.publish(self._session_builder, user_events(UserEventType.EXPIRED, released_users))
+
+            if len(released_users) < self._batch_size:
+                return released
+
+    async def run(self):
+        while True:
+            try:
+                released = await self.reap()
+
+                if released:
+                    logger.info('Released %d users with expired leases', released)
+            except Exception:
+                logger.exception('Failed to release expired leases')
+
+            await asyncio.sleep(self._interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
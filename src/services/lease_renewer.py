@@ -0,0 +1,65 @@
+from collections import defaultdict
+from typing import Annotated
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.config import settings
+from src.repositories.lock_repository import LockRepository
+from src.utils.batching import MicroBatcher
+
+
+class LeaseRenewer:
+    """
+    Coalesces lease heartbeats from concurrent requests, so they are written by a handful of multi-row
+    statements instead of one transaction per heartbeat
+    """
+
+    def __init__(self, lock_repository: LockRepository, window: float, max_batch_size: int):
+        self._lock_repository = lock_repository
+        self._batcher = MicroBatcher(self._flush, window=window, max_batch_size=max_batch_size)
+
+    async def renew(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID, lock_token: int,
+                    ttl: int) -> bool:
+        """
+        :return: True if lease was extended, False if user is missing, not locked or locked with another token
+        """
+        return await self._batcher.submit((session_builder, user_id, lock_token, ttl))
+
+    async def _flush(self, batch: list[tuple[async_sessionmaker[AsyncSession], UUID, int, int]]) -> list[bool]:
+        renewals_by_builder = defaultdict(lambda: defaultdict(list))
+
+        for session_builder, user_id, lock_token, ttl in batch:
+            renewals_by_builder[session_builder][ttl].append((user_id, lock_token))
+
+        renewed = set()
+
+        for session_builder, renewals in renewals_by_builder.items():
+            renewed.update(await self._lock_repository.renew_leases(session_builder, dict(renewals)))
+
+        return [(user_id, lock_token) in renewed for _, user_id, lock_token, _ in batch]
+
+    async def close(self):
+        """
+        Writes heartbeats still waiting for their batch, called on shutdown
+        """
+        await self._batcher.close()
+
+
+_lease_renewer: LeaseRenewer | None = None
+
+
+def get_lease_renewer(lock_repository: Annotated[LockRepository, Depends()]) -> LeaseRenewer:
+    global _lease_renewer
+
+    if _lease_renewer is None:
+        _lease_renewer = LeaseRenewer(lock_repository, window=settings.LEASE_RENEW_WINDOW,
+                                      max_batch_size=settings.LEASE_RENEW_MAX_BATCH_SIZE)
+
+    return _lease_renewer
+
+
+async def shutdown_lease_renewer():
+    if _lease_renewer is not None:
+        await _lease_renewer.close()
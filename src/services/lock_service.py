@@ -1,36 +1,268 @@
-from typing import Annotated
+import asyncio
+from typing import Annotated, Awaitable, Callable, TypeVar
 from uuid import UUID
 
 from fastapi import Depends
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
-from src.exceptions.exceptions import UserNotFoundException, UserIsAlreadyLockedException
+from src.config import settings
+from src.exceptions.exceptions import (UserNotFoundException, UserIsAlreadyLockedException, NoAvailableUsersException,
+                                       NotEnoughAvailableUsersException, UserIsNotLockedException,
+                                       StaleLockTokenException)
 from src.repositories.lock_repository import LockRepository
+from src.models.user import User
 from src.repositories.user_repository import UserRepository
+from src.services.availability_index import AvailabilityIndex, get_availability_index
+from src.services.lease_renewer import LeaseRenewer, get_lease_renewer
+from src.services.lock_write_batcher import LockWriteBatcher, get_lock_write_batcher
+from src.services.user_events import UserEventBus, get_user_event_bus, user_events
+from src.services.user_waiters import UserWaiters, get_user_waiters
+from src.schemas.Request.AcquireAnyUserRequest import AcquireAnyUserRequest
+from src.schemas.Request.AcquireUsersRequest import AcquireUsersRequest
+from src.schemas.Request.UserLockRequest import UserLockRequest
+from src.schemas.Response.LockedUserResponse import LockedUserResponse
+from src.schemas.Shared.UserEventType import UserEventType
+from src.utils import deadline as request_deadline
+from src.utils.timing import timed_methods
 
+T = TypeVar('T')
 
+
+@timed_methods('service')
 class LockService:
     def __init__(self, lock_repository: Annotated[LockRepository, Depends()],
-                 user_repository: Annotated[UserRepository, Depends()]):
+                 user_repository: Annotated[UserRepository, Depends()],
+                 lease_renewer: Annotated[LeaseRenewer, Depends(get_lease_renewer)],
+                 availability_index: Annotated[AvailabilityIndex, Depends(get_availability_index)],
+                 user_event_bus: Annotated[UserEventBus, Depends(get_user_event_bus)],
+                 user_waiters: Annotated[UserWaiters, Depends(get_user_waiters)],
+                 lock_write_batcher: Annotated[LockWriteBatcher, Depends(get_lock_write_batcher)]):
         self._lock_repository = lock_repository
         self._user_repository = user_repository
+        self._lease_renewer = lease_renewer
+        self._availability_index = availability_index
+        self._user_event_bus = user_event_bus
+        self._user_waiters = user_waiters
+        self._lock_write_batcher = lock_write_batcher
+
+    @staticmethod
+    def _resolve_ttl(ttl: int | None) -> int | None:
+        return ttl if ttl is not None else settings.LOCK_DEFAULT_TTL
+
+    # Single-user lock writes go through the write batcher when it is enabled, straight to db otherwise
+    async def _try_lock_user(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                             ttl: int | None) -> User | None:
+        if settings.LOCK_WRITE_BATCHING_ENABLED:
+            return await self._lock_write_batcher.lock(session_builder, user_id, ttl)
+
+        return await self._lock_repository.try_lock_user(session_builder, user_id, ttl=ttl)
+
+    async def _unlock_user(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                           lock_token: int) -> Row | None:
+        if settings.LOCK_WRITE_BATCHING_ENABLED:
+            return await self._lock_write_batcher.release(session_builder, user_id, lock_token)
+
+        return await self._lock_repository.unlock_user(session_builder, user_id, lock_token)
 
-    async def acquire_lock(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID):
+    async def _lock_any_user(self, session_builder: async_sessionmaker[AsyncSession],
+                             user_filters: AcquireAnyUserRequest, ttl: int | None) -> User | None:
+        if settings.LOCK_WRITE_BATCHING_ENABLED:
+            return await self._lock_write_batcher.claim(
+                session_builder, (user_filters.project_id, user_filters.env, user_filters.domain), ttl)
+
+        return await self._lock_repository.lock_any_user(session_builder, project_id=user_filters.project_id,
+                                                         env=user_filters.env, domain=user_filters.domain, ttl=ttl)
+
+    async def _raise_lock_not_owned(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                                    lock_token: int):
+        # Conditional update didn't match, second query is only needed to tell the reason
         user = await self._user_repository.get_by_id(session_builder, user_id)
 
         if user is None:
             raise UserNotFoundException(message='User not found', meta={'id': str(user_id)})
 
-        if user.locktime is not None:
-            raise UserIsAlreadyLockedException(message='User is already locked by someone else',
-                                               meta={'id': str(user_id), 'locktime': user.locktime.isoformat()})
+        if user.locktime is None:
+            raise UserIsNotLockedException(message='User is not locked', meta={'id': str(user_id)})
+
+        # Token still matches, so the lock was lost to an expired lease that isn't reaped yet
+        if user.lock_token == lock_token:
+            raise UserIsNotLockedException(message='Lease has expired', meta={'id': str(user_id)})
+
+        raise StaleLockTokenException(message='User is locked with another lock token', meta={'id': str(user_id)})
+
+    async def acquire_lock(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                           ttl: int | None = None) -> LockedUserResponse:
+        user = await self._try_lock_user(session_builder, user_id, self._resolve_ttl(ttl))
 
-        await self._lock_repository.toggle_user_lock(session_builder, user_id, should_lock=True)
+        if user is not None:
+            self._user_event_bus.publish(session_builder, user_events(UserEventType.LOCKED, [user]))
 
-    async def release_lock(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID):
+            return LockedUserResponse.model_validate(user, from_attributes=True)
+
+        # Lock was not acquired, second query is only needed to tell the reason
         user = await self._user_repository.get_by_id(session_builder, user_id)
 
         if user is None:
             raise UserNotFoundException(message='User not found', meta={'id': str(user_id)})
 
-        await self._lock_repository.toggle_user_lock(session_builder, user_id, should_lock=False)
+        raise UserIsAlreadyLockedException(message='User is already locked by someone else',
+                                           meta={'id': str(user_id),
+                                                 'locktime': user.locktime.isoformat() if user.locktime else None})
+
+    async def release_lock(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID, lock_token: int):
+        """
+        Releases user only if caller still owns the lock, ownership is checked by the fencing token
+        :param session_builder: db session maker
+        :param user_id: id of locked user
+        :param lock_token: fencing token received on acquire
+        """
+        released = await self._unlock_user(session_builder, user_id, lock_token)
+
+        if released is None:
+            await self._raise_lock_not_owned(session_builder, user_id, lock_token)
+
+        self._user_event_bus.publish(session_builder, user_events(UserEventType.RELEASED, [released]))
+
+    async def renew_lock(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID, lock_token: int,
+                         ttl: int):
+        """
+        Extends lease of a locked user without releasing it.
+        Heartbeats from concurrent requests are written together, see LeaseRenewer
+        :param session_builder: db session maker
+        :param user_id: id of locked user
+        :param lock_token: fencing token received on acquire
+        :param ttl: new lease duration in seconds, counted from now
+        """
+        if not await self._lease_renewer.renew(session_builder, user_id, lock_token, ttl):
+            await self._raise_lock_not_owned(session_builder, user_id, lock_token)
+
+    async def acquire_any(self, session_builder: async_sessionmaker[AsyncSession],
+                          user_filters: AcquireAnyUserRequest) -> LockedUserResponse:
+        """
+        Claims one free user matching filters, with wait_timeout waits for a matching user to be freed if there are
+        no free users right now.
+        If the whole bucket (project_id, env, domain) is passed and availability index is loaded, candidates
+        are taken from the index and confirmed by a conditional UPDATE, otherwise (or if indexed candidates
+        turn out to be taken) free user is searched in db
+        :param session_builder: db session maker
+        :param user_filters: filters and lease ttl
+        :return: claimed user
+        """
+        ttl = self._resolve_ttl(user_filters.ttl)
+
+        async def claim() -> User | None:
+            return (await self._acquire_indexed(session_builder, user_filters, ttl) or
+                    await self._lock_any_user(session_builder, user_filters, ttl))
+
+        user = await self._claim_waiting(user_filters, claim)
+
+        if user is None:
+            raise NoAvailableUsersException(message='No available users',
+                                            meta=user_filters.model_dump(mode='json', exclude_none=True))
+
+        self._user_event_bus.publish(session_builder, user_events(UserEventType.LOCKED, [user]))
+
+        return LockedUserResponse.model_validate(user, from_attributes=True)
+
+    async def _claim_waiting(self, user_filters: AcquireAnyUserRequest, claim: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs claim, if it comes back empty and request has wait_timeout, parks request until a matching user
+        is freed and tries again, until claim succeeds or timeout passes. Claim is retried once more when timeout
+        passes, and every ACQUIRE_WAIT_POLL_INTERVAL if users freed by other workers don't wake local waiters
+        :return: result of the last claim attempt
+        """
+        if user_filters.wait_timeout is None:
+            return await claim()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + user_filters.wait_timeout
+        # Time spent parked doesn't count towards request deadline
+        request_deadline.extend_deadline(user_filters.wait_timeout)
+        waiter = self._user_waiters.enqueue((user_filters.project_id, user_filters.env, user_filters.domain))
+
+        try:
+            result = await claim()
+
+            while not result and (remaining := deadline - loop.time()) > 0:
+                if not settings.USER_EVENTS_NOTIFY_ENABLED:
+                    remaining = min(remaining, settings.ACQUIRE_WAIT_POLL_INTERVAL)
+
+                # Waiters cap only applies to requests that have to wait, free users are handed out regardless
+                self._user_waiters.park(waiter)
+                woken = await self._user_waiters.wait(waiter, remaining)
+                result = await claim()
+
+                if not result and woken:
+                    self._user_waiters.pass_wake(waiter)
+
+            return result
+        finally:
+            self._user_waiters.remove(waiter)
+
+    async def _acquire_indexed(self, session_builder: async_sessionmaker[AsyncSession],
+                               user_filters: AcquireAnyUserRequest, ttl: int | None) -> User | None:
+        if not self._availability_index.loaded or None in (user_filters.project_id, user_filters.env,
+                                                             user_filters.domain):
+            return None
+
+        bucket = (user_filters.project_id, user_filters.env, user_filters.domain)
+
+        for _ in range(settings.AVAILABILITY_INDEX_ATTEMPTS):
+            user_id = self._availability_index.pick(bucket)
+
+            if user_id is None:
+                return None
+
+            user = await self._try_lock_user(session_builder, user_id, ttl)
+
+            if user is not None:
+                return user
+
+        return None
+
+    async def acquire_users(self, session_builder: async_sessionmaker[AsyncSession],
+                            user_filters: AcquireUsersRequest) -> list[LockedUserResponse]:
+        """
+        Claims several free users at once.
+        In all-or-nothing mode either exactly count users are claimed or none of them,
+        otherwise as many users as available (up to count) are claimed.
+        With wait_timeout request waits until claim succeeds (at least one user in best effort mode)
+        :param session_builder: db session maker
+        :param user_filters: filters, amount of users and claim mode
+        :return: list of claimed users
+        """
+        users = await self._claim_waiting(user_filters, lambda: self._lock_repository.lock_users(
+            session_builder, user_filters.count, project_id=user_filters.project_id, env=user_filters.env,
+            domain=user_filters.domain, all_or_nothing=user_filters.all_or_nothing,
+            ttl=self._resolve_ttl(user_filters.ttl)))
+
+        if user_filters.all_or_nothing and len(users) < user_filters.count:
+            raise NotEnoughAvailableUsersException(message='Not enough available users',
+                                                   meta=user_filters.model_dump(mode='json', exclude_none=True))
+
+        self._user_event_bus.publish(session_builder, user_events(UserEventType.LOCKED, users))
+
+        return list(map(lambda user: LockedUserResponse.model_validate(user, from_attributes=True), users))
+
+    async def release_users(self, session_builder: async_sessionmaker[AsyncSession],
+                            locks: list[UserLockRequest]) -> list[UUID]:
+        """
+        Releases several users at once, users locked with other tokens are left untouched
+        :param session_builder: db session maker
+        :param locks: ids of users with fencing tokens received on acquire
+        :return: ids of released users
+        """
+        released = await self._lock_repository.unlock_users(session_builder,
+                                                            [(lock.user_id, lock.lock_token) for lock in locks])
+        self._user_event_bus.publish(session_builder, user_events(UserEventType.RELEASED, released))
+
+        return [user.id for user in released]
+
+    async def rebuild_availability_index(self, session_builder: async_sessionmaker[AsyncSession]) -> int:
+        """
+        Reloads availability index from db, e.g. after users were changed bypassing the service
+        :param session_builder: db session maker
+        :return: amount of indexed users
+        """
+        return await self._availability_index.rebuild(session_builder, self._user_repository)
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from typing import Annotated, Any
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import Row
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.config import settings
+from src.models.user import User
+from src.repositories.lock_repository import LockRepository
+from src.services.user_events import FilterKey
+from src.utils.batching import MicroBatcher
+from src.utils.metrics import Counter, Histogram
+
+LOCK_WRITE_BATCH_SIZE = Histogram('lock_write_batch_size', 'Lock writes committed by one batched transaction',
+                                  buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+LOCK_WRITE_BATCH_RETRIES = Counter('lock_write_batch_retries_total',
+                                   'Batched lock write transactions rerun after a deadlock or serialization failure')
+
+# Postgres deadlock_detected and serialization_failure, the transaction is rolled back and can be rerun as is
+RETRYABLE_SQLSTATES = ('40P01', '40001')
+
+RELEASE, LOCK, CLAIM = 'release', 'lock', 'claim'
+
+
+class LockWriteBatcher:
+    """
+    Gathers single-user acquires and releases of concurrent requests for a short window and writes them
+    with a few set-based statements in one transaction, trading a little latency for one commit per batch
+    instead of one per request. Every caller gets its own outcome back.
+    Batches of different workers may lock the same rows in opposite order, so a batch aborted by a deadlock
+    is rerun instead of failing all of its callers
+    """
+
+    def __init__(self, lock_repository: LockRepository, window: float, max_batch_size: int):
+        self._lock_repository = lock_repository
+        self._batcher = MicroBatcher(self._flush, window=window, max_batch_size=max_batch_size)
+
+    async def release(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                      lock_token: int) -> Row | None:
+        """
+        :return: id and bucket of released user, None if user is missing, not locked or locked with another token
+        """
+        return await self._batcher.submit((session_builder, RELEASE, user_id, lock_token))
+
+    async def lock(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID,
+                   ttl: int | None) -> User | None:
+        """
+        :return: locked user with new fencing token, None if user is missing or already locked
+        """
+        return await self._batcher.submit((session_builder, LOCK, user_id, ttl))
+
+    async def claim(self, session_builder: async_sessionmaker[AsyncSession], key: FilterKey,
+                    ttl: int | None) -> User | None:
+        """
+        :param key: (project_id, env, domain) filters, None matches any value
+        :return: locked free user matching filters, None if there are no free users left
+        """
+        return await self._batcher.submit((session_builder, CLAIM, key, ttl))
+
+    async def _flush(self, batch: list[tuple[async_sessionmaker[AsyncSession], str, Any, Any]]) -> list:
+        LOCK_WRITE_BATCH_SIZE.observe(len(batch))
+        writes_by_builder = defaultdict(list)
+
+        for session_builder, kind, key, value in batch:
+            writes_by_builder[session_builder].append((kind, key, value))
+
+        outcomes = {}
+
+        for session_builder, writes in writes_by_builder.items():
+            outcomes[session_builder] = iter(await self._apply(session_builder, writes))
+
+        return [next(outcomes[session_builder]) for session_builder, *_ in batch]
+
+    async def _apply(self, session_builder: async_sessionmaker[AsyncSession],
+                     writes: list[tuple[str, Any, Any]]) -> list:
+        releases = [(user_id, lock_token) for kind, user_id, lock_token in writes if kind == RELEASE]
+        locks = defaultdict(list)
+        claims = defaultdict(int)
+
+        for kind, key, value in writes:
+            if kind == LOCK:
+                locks[value].append(key)
+            elif kind == CLAIM:
+                claims[(*key, value)] += 1
+
+        released, locked, claimed = await self._apply_lock_batch(
+            session_builder, releases, dict(locks), [(*claim, count) for claim, count in claims.items()])
+
+        # Each user is handed to the first caller asking for it, duplicates in the batch get nothing
+        released_by_lock = {(row.id, row.lock_token): row for row in released}
+        locked_by_id = {user.id: user for user in locked}
+        claimed_by_claim = {claim: list(users) for claim, users in zip(claims, claimed)}
+        outcomes = []
+
+        for kind, key, value in writes:
+            if kind == RELEASE:
+                outcomes.append(released_by_lock.pop((key, value), None))
+            elif kind == LOCK:
+                outcomes.append(locked_by_id.pop(key, None))
+            else:
+                users = claimed_by_claim[(*key, value)]
+                outcomes.append(users.pop(0) if users else None)
+
+        return outcomes
+
+    async def _apply_lock_batch(self, session_builder: async_sessionmaker[AsyncSession], *args) -> tuple:
+        for attempt in range(settings.LOCK_WRITE_BATCH_RETRIES + 1):
+            try:
+                return await self._lock_repository.apply_lock_batch(session_builder, *args)
+            except DBAPIError as exception:
+                if getattr(exception.orig, 'sqlstate', None) not in RETRYABLE_SQLSTATES \
+                        or attempt == settings.LOCK_WRITE_BATCH_RETRIES:
+                    raise
+
+                LOCK_WRITE_BATCH_RETRIES.inc()
+
+    async def close(self):
+        """
+        Commits queued acquires and releases and waits for batches in flight, called on shutdown
+        """
+        await self._batcher.close()
+
+
+_lock_write_batcher: LockWriteBatcher | None = None
+
+
+def get_lock_write_batcher(lock_repository: Annotated[LockRepository, Depends()]) -> LockWriteBatcher:
+    global _lock_write_batcher
+
+    if _lock_write_batcher is None:
+        _lock_write_batcher = LockWriteBatcher(lock_repository, window=settings.LOCK_WRITE_BATCH_WINDOW,
+                                               max_batch_size=settings.LOCK_WRITE_MAX_BATCH_SIZE)
+
+    return _lock_write_batcher
+
+
+async def shutdown_lock_write_batcher():
+    if _lock_write_batcher is not None:
+        await _lock_write_batcher.close()
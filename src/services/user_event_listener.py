@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+
+import asyncpg
+
+from src.services.user_events import UserEventBus, decode_events
+from src.utils.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_LAG = Histogram('user_events_notification_lag_seconds',
+                             'Time between publishing user events in one worker and receiving them in another')
+RECEIVED_EVENTS = Counter('user_events_received_total', 'User events received from other workers')
+RESYNCS = Counter('user_events_resyncs_total', 'Cache resyncs made after (re)connecting to the events channel')
+
+
+class UserEventListener:
+    """
+    Background task that LISTENs to user events of other workers on a dedicated connection and applies them
+    to local subscribers. Events sent while the listener was disconnected are lost, so after every (re)connect
+    subscribers reload their state from db
+    """
+
+    def __init__(self, dsn: str, user_event_bus: UserEventBus, channel: str, reconnect_interval: float,
+                 keepalive_interval: float):
+        self._dsn = dsn
+        self._user_event_bus = user_event_bus
+        self._channel = channel
+        self._reconnect_interval = reconnect_interval
+        self._keepalive_interval = keepalive_interval
+        self._task: asyncio.Task | None = None
+
+    def handle_notification(self, connection, pid: int, channel: str, payload: str):
+        try:
+            worker_id, published_at, events = decode_events(payload)
+        except Exception:
+            logger.exception('Malformed user events notification: %s', payload)
+            return
+
+        # Own events were applied when they were published
+        if worker_id == self._user_event_bus.worker_id:
+            return
+
+        NOTIFICATION_LAG.observe(max(time.time() - published_at, 0.0))
+        RECEIVED_EVENTS.inc(len(events))
+        self._user_event_bus.apply(events)
+
+    async def listen(self):
+        connection = await asyncpg.connect(self._dsn)
+
+        try:
+            await connection.add_listener(self._channel, self.handle_notification)
+            # Listener is registered first, so nothing committed after the resync snapshot is missed
+            RESYNCS.inc()
+            await self._user_event_bus.resync()
+
+            while not connection.is_closed():
+                await asyncio.sleep(self._keepalive_interval)
+                await connection.fetchval('SELECT 1')
+        finally:
+            if not connection.is_closed():
+                await connection.close()
+
+    async def run(self):
+        while True:
+            try:
+                await self.listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('User events listener disconnected, reconnecting')
+
+            await asyncio.sleep(self._reconnect_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator
+
+from src.config import settings
+from src.services.user_events import FilterKey, UserEvent, bucket_matches
+from src.utils.metrics import Counter, Gauge
+
+STREAM_SUBSCRIBERS = Gauge('event_stream_subscribers', 'Clients subscribed to the user events stream')
+DROPPED_SUBSCRIBERS = Counter('event_stream_dropped_subscribers_total',
+                              'Event stream subscribers dropped for not keeping up with events')
+
+
+class Subscription:
+    """
+    Bounded buffer of events of one stream client. Once it overflows the client is dropped instead of buffering
+    without limit, the client is expected to reconnect and reread the state it needs
+    """
+
+    def __init__(self, key: FilterKey, max_size: int):
+        self.key = key
+        self.dropped = False
+        self._max_size = max_size
+        self._events: deque[UserEvent] = deque()
+        self._ready = asyncio.Event()
+
+    def matches(self, event: UserEvent) -> bool:
+        return event.bucket is not None and bucket_matches(self.key, event.bucket)
+
+    def push(self, events: list[UserEvent]):
+        if self.dropped:
+            return
+
+        events = [event for event in events if self.matches(event)]
+
+        if len(self._events) + len(events) > self._max_size:
+            self.dropped = True
+            self._events.clear()
+            DROPPED_SUBSCRIBERS.inc()
+        else:
+            self._events.extend(events)
+
+        if events:
+            self._ready.set()
+
+    async def next_batch(self, timeout: float) -> list[UserEvent]:
+        """
+        :return: all buffered events, empty list if none arrived within timeout or subscriber got dropped
+        """
+        if not self._events and not self.dropped:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        self._ready.clear()
+        events = list(self._events)
+        self._events.clear()
+
+        return events
+
+
+def _format_event(event: UserEvent) -> str:
+    data = {'user_id': str(event.user_id), 'project_id': str(event.bucket[0]), 'env': event.bucket[1].value,
+            'domain': event.bucket[2].value}
+
+    return f'event: {event.type.value}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class UserEventStream:
+    """
+    Shared per-worker fan-out of user events to Server-Sent Events clients.
+    Events are pushed into per-client bounded buffers synchronously by the event bus, so one slow client never
+    delays the others or the requests that published the events
+    """
+
+    def __init__(self, queue_size: int, heartbeat_interval: float):
+        self._queue_size = queue_size
+        self._heartbeat_interval = heartbeat_interval
+        self._subscriptions: set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def apply_events(self, events: list[UserEvent]):
+        """
+        User events subscriber, fans events out to stream clients
+        """
+        for subscription in self._subscriptions:
+            subscription.push(events)
+
+    async def stream(self, key: FilterKey) -> AsyncIterator[bytes]:
+        """
+        Streams events of users matching filters as SSE frames, idle stream gets keepalive comments.
+        Slow client gets `dropped` event and the stream ends
+        :param key: (project_id, env, domain) filters, None matches any value
+        :return: async iterator over SSE frames
+        """
+        subscription = Subscription(key, self._queue_size)
+        self._subscriptions.add(subscription)
+        STREAM_SUBSCRIBERS.inc()
+
+        try:
+            # Comment frame makes proxies and clients consider the stream open right away
+            yield b': connected\n\n'
+
+            while True:
+                events = await subscription.next_batch(self._heartbeat_interval)
+
+                if subscription.dropped:
+                    yield b'event: dropped\ndata: {"reason":"too slow"}\n\n'
+                    return
+
+                yield ''.join(map(_format_event, events)).encode() if events else b': keepalive\n\n'
+        finally:
+            self._subscriptions.discard(subscription)
+            STREAM_SUBSCRIBERS.dec()
+
+
+_user_event_stream: UserEventStream | None = None
+
+
+def get_user_event_stream() -> UserEventStream:
+    global _user_event_stream
+
+    if _user_event_stream is None:
+        _user_event_stream = UserEventStream(queue_size=settings.EVENT_STREAM_QUEUE_SIZE,
+                                             heartbeat_interval=settings.EVENT_STREAM_HEARTBEAT_INTERVAL)
+
+    return _user_event_stream
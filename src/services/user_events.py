@@ -0,0 +1,152 @@
+import asyncio
+import inspect
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Annotated, Awaitable, Callable, Iterable
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.config import settings
+from src.repositories.notification_repository import NotificationRepository
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.schemas.Shared.UserEventType import UserEventType
+
+logger = logging.getLogger(__name__)
+
+Bucket = tuple[UUID, Environment, Domain]
+# (project_id, env, domain) filter, None matches any value
+FilterKey = tuple[UUID | None, Environment | None, Domain | None]
+
+# pg_notify payload must be shorter than 8000 bytes, one encoded event takes about 120 bytes
+EVENTS_PER_PAYLOAD = 50
+
+
+@dataclass(frozen=True)
+class UserEvent:
+    user_id: UUID
+    type: UserEventType
+    bucket: Bucket | None = None
+
+
+def bucket_matches(key: FilterKey, bucket: Bucket) -> bool:
+    return all(value is None or value == bucket_value for value, bucket_value in zip(key, bucket))
+
+
+def user_events(event_type: UserEventType, users: Iterable) -> list[UserEvent]:
+    return [UserEvent(user.id, event_type, (user.project_id, user.env, user.domain)) for user in users]
+
+
+def encode_events(worker_id: str, published_at: float, events: list[UserEvent]) -> str:
+    return json.dumps({'o': worker_id, 't': published_at,
+                       'e': [[str(event.user_id), event.type.value] +
+                             ([str(event.bucket[0]), event.bucket[1].value, event.bucket[2].value]
+                              if event.bucket else []) for event in events]},
+                      separators=(',', ':'))
+
+
+def decode_events(payload: str) -> tuple[str, float, list[UserEvent]]:
+    """
+    :return: id of worker that sent the events, time they were published at and the events
+    """
+    data = json.loads(payload)
+    events = [UserEvent(UUID(event[0]), UserEventType(event[1]),
+                        (UUID(event[2]), Environment(event[3]), Domain(event[4])) if len(event) > 2 else None)
+              for event in data['e']]
+
+    return data['o'], data['t'], events
+
+
+class UserEventBus:
+    """
+    Delivers lock, release, expire and create events to in-process subscribers (caches, indexes) and,
+    if enabled, to other workers with pg_notify. Notifications are sent by a background task, events published
+    while it is busy are sent together with the next round, so callers never wait for them
+    """
+
+    def __init__(self, notification_repository: NotificationRepository, worker_id: str | None = None):
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self._notification_repository = notification_repository
+        self._subscribers: list[Callable[[list[UserEvent]], None]] = []
+        self._resync_callbacks: list[Callable[[], Awaitable | None]] = []
+        self._pending: dict[async_sessionmaker[AsyncSession], list[tuple[float, UserEvent]]] = defaultdict(list)
+        self._task: asyncio.Task | None = None
+
+    @property
+    def active(self) -> bool:
+        """
+        False if nobody would receive published events, so callers may skip building them
+        """
+        return bool(self._subscribers) or settings.USER_EVENTS_NOTIFY_ENABLED
+
+    def subscribe(self, callback: Callable[[list[UserEvent]], None]):
+        self._subscribers.append(callback)
+
+    def on_resync(self, callback: Callable[[], Awaitable | None]):
+        """
+        Registers callback (sync or async) that reloads or drops subscriber state when events could have been missed
+        """
+        self._resync_callbacks.append(callback)
+
+    def publish(self, session_builder: async_sessionmaker[AsyncSession], events: list[UserEvent]):
+        if not events:
+            return
+
+        self.apply(events)
+
+        if settings.USER_EVENTS_NOTIFY_ENABLED:
+            published_at = time.time()
+            self._pending[session_builder].extend((published_at, event) for event in events)
+
+            if self._task is None:
+                self._task = asyncio.create_task(self._send_pending())
+
+    def apply(self, events: list[UserEvent]):
+        for callback in self._subscribers:
+            try:
+                callback(events)
+            except Exception:
+                logger.exception('User events subscriber failed')
+
+    async def resync(self):
+        for callback in self._resync_callbacks:
+            result = callback()
+
+            if inspect.isawaitable(result):
+                await result
+
+    async def _send_pending(self):
+        try:
+            while self._pending:
+                pending, self._pending = self._pending, defaultdict(list)
+
+                for session_builder, events in pending.items():
+                    payloads = [encode_events(self.worker_id, events[i][0],
+                                              [event for _, event in events[i:i + EVENTS_PER_PAYLOAD]])
+                                for i in range(0, len(events), EVENTS_PER_PAYLOAD)]
+
+                    try:
+                        await self._notification_repository.notify(session_builder, settings.USER_EVENTS_CHANNEL,
+                                                                   payloads)
+                    except Exception:
+                        logger.exception('Failed to notify other workers about %d user events', len(events))
+        finally:
+            self._task = None
+
+
+_user_event_bus: UserEventBus | None = None
+
+
+def get_user_event_bus(notification_repository: Annotated[NotificationRepository, Depends()]) -> UserEventBus:
+    global _user_event_bus
+
+    if _user_event_bus is None:
+        _user_event_bus = UserEventBus(notification_repository)
+
+    return _user_event_bus
@@ -0,0 +1,133 @@
+import time
+from collections import OrderedDict
+from typing import Annotated, Any, Iterable
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.config import settings
+from src.repositories.user_repository import UserRepository
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_events import UserEvent
+from src.utils.metrics import Counter
+
+# Attributes that don't change while user is locked and released, volatile lock state is never cached
+IDENTITY_FIELDS = ('id', 'created_at', 'login', 'project_id', 'env', 'domain')
+
+CACHE_HITS = Counter('user_identity_cache_hits_total', 'User identity lookups served from cache')
+CACHE_MISSES = Counter('user_identity_cache_misses_total', 'User identity lookups that went to db')
+
+
+class UserIdentityCache:
+    """
+    Bounded LRU cache with TTL of immutable user attributes, filled on lookups by id or login.
+    Missing users are not cached, so users created after a miss are found right away.
+    Attributes may still change when user is upserted, such users are invalidated by their create events
+    """
+
+    def __init__(self, user_repository: UserRepository, max_size: int, ttl: float):
+        self._user_repository = user_repository
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[UUID, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._ids_by_login: dict[str, UUID] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_by_id(self, session_builder: async_sessionmaker[AsyncSession],
+                        user_id: UUID) -> dict[str, Any] | None:
+        """
+        :return: identity attributes of user or None if there is no such user
+        """
+        identity = self._get(user_id)
+
+        if identity is None:
+            identity = await self._load(session_builder, user_id=user_id)
+
+        return identity
+
+    async def get_by_login(self, session_builder: async_sessionmaker[AsyncSession],
+                           login: str) -> dict[str, Any] | None:
+        """
+        :return: identity attributes of user or None if there is no such user
+        """
+        user_id = self._ids_by_login.get(login)
+        identity = self._get(user_id) if user_id is not None else None
+
+        if identity is None:
+            if user_id is None:
+                CACHE_MISSES.inc()
+
+            identity = await self._load(session_builder, login=login)
+
+        return identity
+
+    def invalidate(self, user_ids: Iterable[UUID]):
+        for user_id in user_ids:
+            self._pop(user_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._ids_by_login.clear()
+
+    def apply_events(self, events: list[UserEvent]):
+        """
+        User events subscriber: only create events can change identity of existing (upserted) user
+        """
+        self.invalidate(event.user_id for event in events if event.type == UserEventType.CREATED)
+
+    def _get(self, user_id: UUID) -> dict[str, Any] | None:
+        entry = self._entries.get(user_id)
+
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._pop(user_id)
+
+            CACHE_MISSES.inc()
+            return None
+
+        self._entries.move_to_end(user_id)
+        CACHE_HITS.inc()
+
+        return entry[1]
+
+    async def _load(self, session_builder: async_sessionmaker[AsyncSession], user_id: UUID | None = None,
+                    login: str | None = None) -> dict[str, Any] | None:
+        rows = await self._user_repository.get_filtered_rows(session_builder, fields=list(IDENTITY_FIELDS),
+                                                             user_id=user_id, login=login)
+
+        if not rows:
+            return None
+
+        identity = dict(rows[0])
+
+        if self._max_size > 0:
+            self._pop(identity['id'])
+            self._entries[identity['id']] = (time.monotonic() + self._ttl, identity)
+            self._ids_by_login[identity['login']] = identity['id']
+
+            while len(self._entries) > self._max_size:
+                self._pop(next(iter(self._entries)))
+
+        return identity
+
+    def _pop(self, user_id: UUID):
+        entry = self._entries.pop(user_id, None)
+
+        if entry is not None and self._ids_by_login.get(entry[1]['login']) == user_id:
+            del self._ids_by_login[entry[1]['login']]
+
+
+_user_identity_cache: UserIdentityCache | None = None
+
+
+def get_user_identity_cache(user_repository: Annotated[UserRepository, Depends()]) -> UserIdentityCache:
+    global _user_identity_cache
+
+    if _user_identity_cache is None:
+        _user_identity_cache = UserIdentityCache(user_repository, max_size=settings.USER_CACHE_MAX_SIZE,
+                                                 ttl=settings.USER_CACHE_TTL)
+
+    return _user_identity_cache
@@ -0,0 +1,21 @@
+from src.config import settings
+from src.utils.metrics import Counter, Histogram
+from src.utils.single_flight import SingleFlight
+
+GET_USERS_QUERIES = Counter('get_users_queries_total', 'get_users queries executed against db')
+GET_USERS_COALESCED = Counter('get_users_coalesced_total',
+                              'get_users requests served by the query of an identical concurrent request')
+GET_USERS_FLIGHT_CALLERS = Histogram('get_users_flight_callers', 'Requests served by one get_users query',
+                                     buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000))
+
+_user_query_flights: SingleFlight | None = None
+
+
+def get_user_query_flights() -> SingleFlight:
+    global _user_query_flights
+
+    if _user_query_flights is None:
+        _user_query_flights = SingleFlight(ttl=settings.GET_USERS_COALESCE_TTL, executed=GET_USERS_QUERIES,
+                                           coalesced=GET_USERS_COALESCED, callers=GET_USERS_FLIGHT_CALLERS)
+
+    return _user_query_flights
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Annotated
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.config import settings
+from src.repositories.user_repository import UserRepository
+from src.schemas.Response.BucketStatsResponse import BucketStatsResponse
+from src.schemas.Response.UserStatsResponse import UserStatsResponse
+from src.services.user_events import FilterKey, bucket_matches
+
+
+class UserStats:
+    """
+    Per-bucket counts of free and locked users. Counts come from one grouped aggregate query and are cached
+    for a short ttl, concurrent requests arriving after the ttl passed share one recount
+    """
+
+    def __init__(self, user_repository: UserRepository, ttl: float):
+        self._user_repository = user_repository
+        self._ttl = ttl
+        self._stats: UserStatsResponse | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, session_builder: async_sessionmaker[AsyncSession], key: FilterKey) -> UserStatsResponse:
+        """
+        :param session_builder: db session maker
+        :param key: (project_id, env, domain) filters, None matches any value
+        :return: counts of buckets matching filters
+        """
+        stats = await self._get_all(session_builder)
+
+        return UserStatsResponse(buckets=[bucket for bucket in stats.buckets
+                                          if bucket_matches(key, (bucket.project_id, bucket.env, bucket.domain))],
+                                 counted_at=stats.counted_at)
+
+    async def _get_all(self, session_builder: async_sessionmaker[AsyncSession]) -> UserStatsResponse:
+        if self._stats is not None and time.monotonic() < self._expires_at:
+            return self._stats
+
+        async with self._lock:
+            # Someone could have recounted while this request was waiting for the lock
+            if self._stats is None or time.monotonic() >= self._expires_at:
+                counted_at = datetime.now(timezone.utc)
+                rows = await self._user_repository.count_by_bucket(session_builder)
+
+                self._stats = UserStatsResponse(
+                    buckets=[BucketStatsResponse(project_id=row.project_id, env=row.env, domain=row.domain,
+                                                 total=row.total, free=row.free, locked=row.total - row.free)
+                             for row in rows],
+                    counted_at=counted_at
+                )
+                self._expires_at = time.monotonic() + self._ttl
+
+        return self._stats
+
+
+_user_stats: UserStats | None = None
+
+
+def get_user_stats(user_repository: Annotated[UserRepository, Depends()]) -> UserStats:
+    global _user_stats
+
+    if _user_stats is None:
+        _user_stats = UserStats(user_repository, ttl=settings.USER_STATS_TTL)
+
+    return _user_stats
@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+from collections import deque
+
+from src.config import settings
+from src.exceptions.exceptions import TooManyWaitersException
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_events import Bucket, FilterKey, UserEvent, bucket_matches
+from src.utils.metrics import Gauge
+
+PARKED_WAITERS = Gauge('acquire_waiters_parked', 'Acquire requests waiting for a user to be freed')
+
+# Events after which a user matching the waiter may be free
+WAKING_EVENTS = (UserEventType.RELEASED, UserEventType.EXPIRED, UserEventType.CREATED)
+
+
+class Waiter:
+    def __init__(self, seq: int, key: FilterKey):
+        self.seq = seq
+        self.key = key
+        self.future = asyncio.get_running_loop().create_future()
+        # Bucket of the freed user that woke the waiter last
+        self.woken_by: Bucket | None = None
+        self.parked = False
+
+
+class UserWaiters:
+    """
+    FIFO queues of acquire requests parked until a user matching their filters is released, expires or is created.
+    Every freed user wakes only one waiter, the one that has been waiting the longest among all matching filters.
+    Woken waiter keeps its place in the queue, so if someone else grabbed the user first it is woken first again.
+    If woken waiter can't use the freed user (e.g. all-or-nothing claim of more users than are free), the wake is
+    passed on to the next matching waiter in line.
+    Only waiters actually parked after an empty claim count towards max_waiters
+    """
+
+    def __init__(self, max_waiters: int):
+        self._max_waiters = max_waiters
+        self._queues: dict[FilterKey, deque[Waiter]] = {}
+        self._seq = itertools.count()
+        self._parked = 0
+
+    @property
+    def parked(self) -> int:
+        return self._parked
+
+    def enqueue(self, key: FilterKey) -> Waiter:
+        """
+        Registers waiter, it has to be registered before the claim attempt, so users freed during it aren't missed.
+        Waiter must always be removed afterwards
+        :param key: filters of the claim
+        :return: registered waiter
+        """
+        waiter = Waiter(next(self._seq), key)
+        self._queues.setdefault(key, deque()).append(waiter)
+
+        return waiter
+
+    def park(self, waiter: Waiter):
+        """
+        Counts waiter as parked, called once the claim came back empty and the request is going to wait
+        """
+        if waiter.parked:
+            return
+
+        if self._parked >= self._max_waiters:
+            raise TooManyWaitersException(message='Too many requests are waiting for free users',
+                                          meta={'max_waiters': self._max_waiters})
+
+        waiter.parked = True
+        self._parked += 1
+        PARKED_WAITERS.inc()
+
+    async def wait(self, waiter: Waiter, timeout: float) -> bool:
+        """
+        :return: True if waiter was woken by a freed user, False on timeout
+        """
+        if not waiter.future.done():
+            await asyncio.wait([waiter.future], timeout=max(timeout, 0))
+
+            if not waiter.future.done():
+                return False
+
+        waiter.future = asyncio.get_running_loop().create_future()
+
+        return True
+
+    def remove(self, waiter: Waiter):
+        queue = self._queues[waiter.key]
+        queue.remove(waiter)
+
+        if waiter.parked:
+            self._parked -= 1
+            PARKED_WAITERS.dec()
+
+        if not queue:
+            del self._queues[waiter.key]
+
+        # Waiter was woken but left without trying to claim the user, hand the wake over to the next one in line
+        if waiter.future.done():
+            self.pass_wake(waiter)
+
+    def pass_wake(self, waiter: Waiter):
+        """
+        Hands the last wake of waiter over to the next matching waiter queued after it,
+        called when the claim made after the wake came back empty
+        """
+        if waiter.woken_by is not None:
+            self._wake(waiter.woken_by, after=waiter.seq)
+            waiter.woken_by = None
+
+    def apply_events(self, events: list[UserEvent]):
+        """
+        User events subscriber, wakes one waiter per freed user
+        """
+        for event in events:
+            if event.type in WAKING_EVENTS and event.bucket is not None:
+                self._wake(event.bucket)
+
+    def _wake(self, bucket: Bucket, after: int = -1):
+        first = None
+
+        for key, queue in self._queues.items():
+            if bucket_matches(key, bucket):
+                waiter = next((waiter for waiter in queue if not waiter.future.done() and waiter.seq > after), None)
+
+                if waiter is not None and (first is None or waiter.seq < first.seq):
+                    first = waiter
+
+        if first is not None:
+            first.woken_by = bucket
+            first.future.set_result(True)
+
+
+_user_waiters: UserWaiters | None = None
+
+
+def get_user_waiters() -> UserWaiters:
+    global _user_waiters
+
+    if _user_waiters is None:
+        _user_waiters = UserWaiters(max_waiters=settings.ACQUIRE_MAX_WAITERS)
+
+    return _user_waiters
@@ -1,33 +1,164 @@
-from typing import Annotated
+import uuid
+from datetime import datetime, timezone
+from typing import Annotated, Any, AsyncIterator, Awaitable, Callable, TypeVar
+from uuid import UUID
 
 from fastapi import Depends
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
-from src.exceptions.exceptions import UserAlreadyExistsException, UserNotFoundException
+from src.config import settings
+from src.exceptions.exceptions import UserAlreadyExistsException, UserNotFoundException, InvalidCursorException
 from src.repositories.user_repository import UserRepository
-from src.models.user import User
+from src.services.user_identity_cache import IDENTITY_FIELDS, UserIdentityCache, get_user_identity_cache
+from src.services.user_events import Bucket, UserEvent, UserEventBus, get_user_event_bus
+from src.services.user_query_flights import get_user_query_flights
 from src.schemas.Request.CreateUsersRequest import CreateUsersRequest
 from src.schemas.Request.GetUsersRequest import GetUsersRequest
+from src.schemas.Response.CreateUsersResponse import CreateUsersResponse
+from src.schemas.Response.GetUsersPageResponse import GetUsersPageResponse
 from src.schemas.Response.GetUsersResponse import GetUsersResponse
-from src.utils.utils import hash_password
+from src.schemas.Shared.ConflictMode import ConflictMode
+from src.schemas.Shared.UserEventType import UserEventType
+from src.utils import deadline as request_deadline
+from src.utils.cursor import encode_cursor, decode_cursor
+from src.utils.serialization import row_to_json
+from src.utils.hashing import hash_passwords
+from src.utils.single_flight import SingleFlight
+from src.utils.timing import timed_methods
 
+T = TypeVar('T')
 
+
+@timed_methods('service')
 class UserService:
-    def __init__(self, user_repository: Annotated[UserRepository, Depends()]):
+    def __init__(self, user_repository: Annotated[UserRepository, Depends()],
+                 user_event_bus: Annotated[UserEventBus, Depends(get_user_event_bus)],
+                 user_identity_cache: Annotated[UserIdentityCache, Depends(get_user_identity_cache)],
+                 user_query_flights: Annotated[SingleFlight, Depends(get_user_query_flights)]):
         self._user_repository = user_repository
+        self._user_event_bus = user_event_bus
+        self._user_identity_cache = user_identity_cache
+        self._user_query_flights = user_query_flights
+
+    async def create_users(self, session_builder: async_sessionmaker[AsyncSession], users: list[CreateUsersRequest],
+                           on_conflict: ConflictMode = ConflictMode.ERROR) -> CreateUsersResponse:
+        """
+        Creates users with one INSERT ... ON CONFLICT statement, so concurrent creates can't slip between
+        the existence check and the insert.
+        If login is passed several times, in error mode nothing is created and repeated logins are reported,
+        otherwise only its first occurrence is used and the rest are skipped
+        :param session_builder: db session maker
+        :param users: users to create
+        :param on_conflict: what to do with users whose login already exists:
+        error - create nothing and raise, skip - create only new users, update - overwrite password, project,
+        env and domain of existing users
+        :return: logins of inserted, updated and skipped users
+        """
+        now = datetime.now(timezone.utc)
+        unique_users = {}
+        repeated_logins = []
+
+        for user in users:
+            if user.login in unique_users and user.login not in repeated_logins:
+                repeated_logins.append(user.login)
+
+            unique_users.setdefault(user.login, user)
+
+        if on_conflict == ConflictMode.ERROR and repeated_logins:
+            raise UserAlreadyExistsException(message='Login is passed more than once',
+                                             meta={'repeated_logins': repeated_logins})
+
+        hashed_passwords = await hash_passwords([user.password for user in unique_users.values()])
+
+        records = {user.login: {'id': uuid.uuid4(), 'created_at': now, 'login': user.login,
+                                'hashed_password': hashed_password, 'project_id': user.project_id, 'env': user.env,
+                                'domain': user.domain}
+                   for user, hashed_password in zip(unique_users.values(), hashed_passwords)}
+
+        rows = await self._user_repository.insert_users(session_builder, list(records.values()),
+                                                        update_existing=on_conflict == ConflictMode.UPDATE,
+                                                        all_or_nothing=on_conflict == ConflictMode.ERROR)
+
+        written = {row.login: row.id for row in rows}
+        skipped = []
+        seen_logins = set()
+
+        for user in users:
+            if user.login not in written or user.login in seen_logins:
+                skipped.append(user.login)
+
+            seen_logins.add(user.login)
+
+        if on_conflict == ConflictMode.ERROR and skipped:
+            raise UserAlreadyExistsException(message='User already exists', meta={'existing_logins': skipped})
+
+        self._user_event_bus.publish(session_builder, [
+            UserEvent(user_id, UserEventType.CREATED,
+                      (records[login]['project_id'], records[login]['env'], records[login]['domain']))
+            for login, user_id in written.items()
+        ])
+
+        # Upserted user keeps its id, so only newly inserted users have the id generated here
+        inserted = [login for login, user_id in written.items() if user_id == records[login]['id']]
+        updated = [login for login, user_id in written.items() if user_id != records[login]['id']]
+
+        return CreateUsersResponse(inserted=inserted, updated=updated, skipped=skipped)
 
-    async def create_users(self, session_builder: async_sessionmaker[AsyncSession], users: list[CreateUsersRequest]):
-        logins = [user.login for user in users]
+    async def bulk_create_users(self, session_builder: async_sessionmaker[AsyncSession],
+                                users: AsyncIterator[CreateUsersRequest]) -> int:
+        """
+        Bulk ingestion mode for large uploads: users are consumed lazily from the iterator and written in chunks
+        with COPY, so neither the whole upload nor ORM objects for it are ever held in memory.
+        Upload is written in one transaction, if any login already exists nothing is created
+        :param session_builder: db session maker
+        :param users: async iterator over users to create
+        :return: amount of created users
+        """
+        # Ids are only collected if someone listens to events about the upload
+        created = [] if self._user_event_bus.active else None
+
+        try:
+            count = await self._user_repository.bulk_insert_users(session_builder,
+                                                                  self._chunk_records(users, created))
+        except IntegrityError:
+            raise UserAlreadyExistsException(message='User already exists')
+
+        self._user_event_bus.publish(session_builder, [UserEvent(user_id, UserEventType.CREATED, bucket)
+                                                       for user_id, bucket in created or []])
+
+        return count
+
+    @staticmethod
+    async def _chunk_records(users: AsyncIterator[CreateUsersRequest],
+                             created: list[tuple[UUID, Bucket]] | None = None) -> AsyncIterator[list[dict[str, Any]]]:
+        chunk = []
+
+        async for user in users:
+            chunk.append(user)
+
+            if len(chunk) >= settings.BULK_CREATE_CHUNK_SIZE:
+                yield await UserService._to_records(chunk, created)
+                chunk = []
 
-        existing_logins = await self._user_repository.check_existing_logins(session_builder, logins)
+        if chunk:
+            yield await UserService._to_records(chunk, created)
 
-        if len(existing_logins) != 0:
-            raise UserAlreadyExistsException(message='User already exists', meta={'existing_logins': existing_logins})
+    @staticmethod
+    async def _to_records(users: list[CreateUsersRequest],
+                          created: list[tuple[UUID, Bucket]] | None = None) -> list[dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        hashed_passwords = await hash_passwords([user.password for user in users])
 
-        users = list(map(lambda user: User(login=user.login, hashed_password=hash_password(user.password),
-                                           project_id=user.project_id, env=user.env, domain=user.domain), users))
+        records = [{'id': uuid.uuid4(), 'created_at': now, 'login': user.login, 'hashed_password': hashed_password,
+                    'project_id': user.project_id, 'env': user.env, 'domain': user.domain}
+                   for user, hashed_password in zip(users, hashed_passwords)]
 
-        return await self._user_repository.add_users(session_builder, users)
+        if created is not None:
+            created.extend((record['id'], (record['project_id'], record['env'], record['domain']))
+                           for record in records)
+
+        return records
 
     async def get_users(self, session_builder: async_sessionmaker[AsyncSession],
                         user_filters: GetUsersRequest) -> list[GetUsersResponse]:
@@ -36,11 +167,34 @@ class UserService:
         If user id is passed, will return one user with such id and stop
         If user login is passed, will return one user with such login and stop
         Otherwise will filter users by all other passed params and return valid users
+        Identical concurrent requests share one query and the returned list, it must not be modified.
+        Shared query is bound by the deadline of the request that started it
         :param session_builder: db session maker
         :param user_filters: filters to use during user selection
         :return: list of users that passed all filters
         """
+        return await self._coalesce(session_builder, 'models', user_filters,
+                                    lambda: self._get_users(session_builder, user_filters))
+
+    async def _coalesce(self, session_builder: async_sessionmaker[AsyncSession], kind: str,
+                        user_filters: GetUsersRequest, call: Callable[[], Awaitable[T]]) -> T:
+        if not settings.GET_USERS_COALESCING_ENABLED:
+            return await call()
+
+        # Shared query runs in its own task, so it gets the deadline of the caller that started it
+        timeout = request_deadline.remaining()
+
+        async def call_within_deadline() -> T:
+            request_deadline.set_deadline(timeout)
+
+            return await call()
 
+        # Dump of the parsed request is its normalized form: ids, enums and defaults are spelled the same way
+        return await self._user_query_flights.do((session_builder, kind, user_filters.model_dump_json()),
+                                                 call_within_deadline)
+
+    async def _get_users(self, session_builder: async_sessionmaker[AsyncSession],
+                         user_filters: GetUsersRequest) -> list[GetUsersResponse]:
         if user_filters.id is not None:
             found_user = await self._user_repository.get_by_id(session_builder, user_filters.id)
 
@@ -60,6 +214,127 @@ class UserService:
         users = await self._user_repository.get_filtered_users(session_builder, project_id=user_filters.project_id,
                                                                env=user_filters.env,
                                                                domain=user_filters.domain,
-                                                               only_available=user_filters.only_available)
+                                                               only_available=user_filters.only_available,
+                                                               limit=user_filters.limit,
+                                                               after=self._decode_cursor(user_filters.cursor))
 
         return list(map(lambda user: GetUsersResponse.model_validate(user, from_attributes=True), users))
+
+    async def get_users_json(self, session_builder: async_sessionmaker[AsyncSession],
+                             user_filters: GetUsersRequest) -> bytes:
+        """
+        Same filter priorities as get_users, but only requested columns are read as plain rows
+        and serialized straight into a json array, skipping ORM and pydantic models.
+        Lookups by id or login asking only for identity fields are served from the identity cache.
+        Identical concurrent requests share one query and its serialized result
+        :param session_builder: db session maker
+        :param user_filters: filters to use during user selection and fields to return
+        :return: json array of users that passed all filters
+        """
+        return await self._coalesce(session_builder, 'json', user_filters,
+                                    lambda: self._get_users_json(session_builder, user_filters))
+
+    async def _get_users_json(self, session_builder: async_sessionmaker[AsyncSession],
+                              user_filters: GetUsersRequest) -> bytes:
+        if (user_filters.id is not None or user_filters.login is not None) and user_filters.fields \
+                and set(user_filters.fields) <= set(IDENTITY_FIELDS):
+            return await self._get_identity_json(session_builder, user_filters)
+
+        if user_filters.id is not None:
+            rows = await self._user_repository.get_filtered_rows(session_builder, fields=user_filters.fields,
+                                                                 user_id=user_filters.id)
+
+            if not rows:
+                raise UserNotFoundException(message='User not found', meta={'id': str(user_filters.id)})
+        elif user_filters.login is not None:
+            rows = await self._user_repository.get_filtered_rows(session_builder, fields=user_filters.fields,
+                                                                 login=user_filters.login)
+
+            if not rows:
+                raise UserNotFoundException(message='User not found', meta={'login': user_filters.login})
+        else:
+            rows = await self._user_repository.get_filtered_rows(session_builder, fields=user_filters.fields,
+                                                                 project_id=user_filters.project_id,
+                                                                 env=user_filters.env,
+                                                                 domain=user_filters.domain,
+                                                                 only_available=user_filters.only_available,
+                                                                 limit=user_filters.limit,
+                                                                 after=self._decode_cursor(user_filters.cursor))
+
+        return f'[{",".join(map(row_to_json, rows))}]'.encode()
+
+    async def _get_identity_json(self, session_builder: async_sessionmaker[AsyncSession],
+                                 user_filters: GetUsersRequest) -> bytes:
+        if user_filters.id is not None:
+            identity = await self._user_identity_cache.get_by_id(session_builder, user_filters.id)
+
+            if identity is None:
+                raise UserNotFoundException(message='User not found', meta={'id': str(user_filters.id)})
+        else:
+            identity = await self._user_identity_cache.get_by_login(session_builder, user_filters.login)
+
+            if identity is None:
+                raise UserNotFoundException(message='User not found', meta={'login': user_filters.login})
+
+        row = {field: identity[field] for field in IDENTITY_FIELDS if field in user_filters.fields}
+
+        return f'[{row_to_json(row)}]'.encode()
+
+    async def get_users_page(self, session_builder: async_sessionmaker[AsyncSession],
+                             user_filters: GetUsersRequest) -> GetUsersPageResponse:
+        """
+        Same filtering as get_users, but users are returned page by page using keyset pagination on (created_at, id),
+        so each call reads at most limit + 1 rows no matter how many users match
+        :param session_builder: db session maker
+        :param user_filters: filters, page size and cursor returned by the previous page
+        :return: page of users and cursor of the next page, next cursor is None on the last page
+        """
+        if user_filters.id is not None or user_filters.login is not None:
+            return GetUsersPageResponse(users=await self.get_users(session_builder, user_filters), next_cursor=None)
+
+        limit = user_filters.limit or settings.USERS_PAGE_SIZE
+
+        users = await self._user_repository.get_filtered_users(session_builder, project_id=user_filters.project_id,
+                                                               env=user_filters.env,
+                                                               domain=user_filters.domain,
+                                                               only_available=user_filters.only_available,
+                                                               limit=limit + 1,
+                                                               after=self._decode_cursor(user_filters.cursor))
+
+        next_cursor = None
+
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
+
+        users = list(map(lambda user: GetUsersResponse.model_validate(user, from_attributes=True), users))
+
+        return GetUsersPageResponse(users=users, next_cursor=next_cursor)
+
+    async def stream_users(self, session_builder: async_sessionmaker[AsyncSession],
+                           user_filters: GetUsersRequest) -> AsyncIterator[bytes]:
+        """
+        Streams all users matching project_id, env, domain and only_available filters as NDJSON.
+        Every batch of rows is serialized into one chunk as soon as it arrives from db
+        :param session_builder: db session maker
+        :param user_filters: filters to use during user selection
+        :return: async iterator over NDJSON chunks
+        """
+        batches = self._user_repository.stream_filtered_users(session_builder, settings.USERS_STREAM_BATCH_SIZE,
+                                                              fields=user_filters.fields,
+                                                              project_id=user_filters.project_id,
+                                                              env=user_filters.env, domain=user_filters.domain,
+                                                              only_available=user_filters.only_available)
+
+        async for rows in batches:
+            yield ''.join(f'{row_to_json(row)}\n' for row in rows).encode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str | None) -> tuple[datetime, UUID] | None:
+        if cursor is None:
+            return None
+
+        try:
+            return decode_cursor(cursor)
+        except ValueError:
+            raise InvalidCursorException(message='Invalid cursor', meta={'cursor': cursor})
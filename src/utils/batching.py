@@ -0,0 +1,71 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects items submitted by concurrent callers and processes them together.
+    A batch is flushed when the window since its first item passes or when it reaches max_batch_size.
+    Flush function receives the whole batch and must return one result per item (in the same order),
+    every caller gets its own result back or the exception if the whole batch failed.
+    Pending items are not dropped on shutdown, close flushes them and waits for batches in flight
+    """
+
+    def __init__(self, flush: Callable[[list[T]], Awaitable[list[R]]], window: float, max_batch_size: int):
+        self._flush = flush
+        self._window = window
+        self._max_batch_size = max_batch_size
+        self._pending: list[tuple[T, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self._max_batch_size:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush_pending)
+
+        return await future
+
+    async def close(self):
+        self._flush_pending()
+
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future]]):
+        try:
+            results = await self._flush([item for item, _ in batch])
+
+            if len(results) != len(batch):
+                raise ValueError(f'Flush returned {len(results)} results for {len(batch)} items')
+        except Exception as exception:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+
+        for (_, future), result in zip(batch, results, strict=True):
+            if not future.done():
+                future.set_result(result)
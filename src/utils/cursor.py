@@ -0,0 +1,22 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+
+def encode_cursor(created_at: datetime, user_id: UUID) -> str:
+    payload = json.dumps([created_at.isoformat(), str(user_id)], separators=(',', ':'))
+
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """
+    :raises ValueError: if cursor wasn't produced by encode_cursor
+    """
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+        return datetime.fromisoformat(created_at), UUID(user_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exception:
+        raise ValueError('Invalid cursor') from exception
@@ -0,0 +1,37 @@
+import asyncio
+import time
+from contextvars import ContextVar
+
+# Task handling the request and monotonic time by which it has to be done
+_deadline: ContextVar[tuple[asyncio.Task, float] | None] = ContextVar('request_deadline', default=None)
+
+
+def set_deadline(timeout: float | None):
+    """
+    Sets deadline of the current task, None removes it.
+    Deadline is bound to the task, so background tasks spawned by the request don't inherit it
+    :param timeout: seconds from now
+    """
+    _deadline.set(None if timeout is None else (asyncio.current_task(), time.monotonic() + timeout))
+
+
+def remaining() -> float | None:
+    """
+    :return: seconds left until deadline of the current task (negative once it passed), None if it has no deadline
+    """
+    deadline = _deadline.get()
+
+    if deadline is None or deadline[0] is not asyncio.current_task():
+        return None
+
+    return deadline[1] - time.monotonic()
+
+
+def extend_deadline(seconds: float):
+    """
+    Pushes deadline of the current task back, used by requests that are allowed to wait (long-polling)
+    """
+    deadline = _deadline.get()
+
+    if deadline is not None and deadline[0] is asyncio.current_task():
+        _deadline.set((deadline[0], deadline[1] + seconds))
@@ -0,0 +1,182 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.config import settings
+
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+
+def _encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _decode(data: str) -> bytes:
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+
+class PasswordHasher(ABC):
+    """
+    Base class of password hashers. Every hasher except legacy sha256 one prefixes its hashes with
+    `<prefix>$` and stores its cost parameters inside the hash, so changing them doesn't break verification
+    """
+    prefix: str
+
+    @abstractmethod
+    def hash(self, password: str) -> str:
+        ...
+
+    @abstractmethod
+    def verify(self, password: str, hashed_password: str) -> bool:
+        ...
+
+
+class Sha256Hasher(PasswordHasher):
+    """
+    Legacy unsalted sha256, its hashes are bare hex digests without prefix
+    """
+    prefix = 'sha256'
+
+    def hash(self, password: str) -> str:
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return hmac.compare_digest(self.hash(password), hashed_password)
+
+
+class Pbkdf2Hasher(PasswordHasher):
+    prefix = 'pbkdf2_sha256'
+
+    def __init__(self, iterations: int):
+        self._iterations = iterations
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(SALT_SIZE)
+        key = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, self._iterations, KEY_SIZE)
+
+        return f'{self.prefix}${self._iterations}${_encode(salt)}${_encode(key)}'
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        _, iterations, salt, key = hashed_password.split('$')
+        expected = _decode(key)
+        actual = hashlib.pbkdf2_hmac('sha256', password.encode(), _decode(salt), int(iterations), len(expected))
+
+        return hmac.compare_digest(actual, expected)
+
+
+class ScryptHasher(PasswordHasher):
+    prefix = 'scrypt'
+
+    def __init__(self, n: int, r: int, p: int):
+        self._n = n
+        self._r = r
+        self._p = p
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(SALT_SIZE)
+        key = self._derive(password, salt, self._n, self._r, self._p, KEY_SIZE)
+
+        return f'{self.prefix}${self._n}${self._r}${self._p}${_encode(salt)}${_encode(key)}'
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        _, n, r, p, salt, key = hashed_password.split('$')
+        expected = _decode(key)
+        actual = self._derive(password, _decode(salt), int(n), int(r), int(p), len(expected))
+
+        return hmac.compare_digest(actual, expected)
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, n: int, r: int, p: int, size: int) -> bytes:
+        # Default maxmem (32 MiB) is too small for n=2^15 and up, give scrypt what the parameters need
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=size,
+                              maxmem=256 * n * r * p + 1024 * 1024)
+
+
+def get_password_hasher(name: str | None = None) -> PasswordHasher:
+    """
+    Builds hasher with cost parameters from settings
+    :param name: hasher prefix, hasher from settings is used if not passed
+    :return: password hasher
+    """
+    name = name or settings.PASSWORD_HASHER
+
+    if name == ScryptHasher.prefix:
+        return ScryptHasher(settings.SCRYPT_N, settings.SCRYPT_R, settings.SCRYPT_P)
+
+    if name == Pbkdf2Hasher.prefix:
+        return Pbkdf2Hasher(settings.PBKDF2_ITERATIONS)
+
+    if name == Sha256Hasher.prefix:
+        return Sha256Hasher()
+
+    raise ValueError(f'Unknown password hasher: {name}')
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """
+    Checks password against hash made by any of the hashers, hashes without prefix are legacy sha256 ones
+    :param password: plain password
+    :param hashed_password: stored hash
+    :return: whether password matches
+    """
+    prefix, separator, _ = hashed_password.partition('$')
+
+    if not separator:
+        return Sha256Hasher().verify(password, hashed_password)
+
+    try:
+        return get_password_hasher(prefix).verify(password, hashed_password)
+    except ValueError:
+        return False
+
+
+def _hash_chunk(hasher: PasswordHasher, passwords: list[str]) -> list[str]:
+    return [hasher.hash(password) for password in passwords]
+
+
+_executor: Executor | None = None
+
+
+def _get_executor() -> Executor:
+    global _executor
+
+    if _executor is None:
+        if settings.PASSWORD_HASH_EXECUTOR == 'process':
+            _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                           thread_name_prefix='password-hashing')
+
+    return _executor
+
+
+def shutdown_hashing_executor():
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def hash_passwords(passwords: list[str]) -> list[str]:
+    """
+    Hashes passwords outside of the event loop: they are split into chunks which are hashed in parallel
+    by thread or process pool. hashlib releases GIL during KDF rounds, so threads are enough unless
+    the pool is shared with other CPU-bound work
+    :param passwords: plain passwords
+    :return: hashes in the same order as passwords
+    """
+    hasher = get_password_hasher()
+    executor = _get_executor()
+    loop = asyncio.get_running_loop()
+    chunk_size = settings.PASSWORD_HASH_CHUNK_SIZE
+
+    chunks = await asyncio.gather(*(loop.run_in_executor(executor, _hash_chunk, hasher, passwords[i:i + chunk_size])
+                                    for i in range(0, len(passwords), chunk_size)))
+
+    return [hashed_password for chunk in chunks for hashed_password in chunk]
@@ -0,0 +1,135 @@
+import bisect
+
+# Every metric created in the process, in creation order
+REGISTRY: list['Metric'] = []
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    type: str
+
+    def __init__(self, name: str, description: str, registered: bool = True):
+        self.name = name
+        self.description = description
+
+        if registered:
+            REGISTRY.append(self)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, description: str, registered: bool = True):
+        super().__init__(name, description, registered)
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name: str, description: str, registered: bool = True):
+        super().__init__(name, description, registered)
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram: bucket_counts[i] is amount of observations not greater than buckets[i]
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+                 registered: bool = True):
+        super().__init__(name, description, registered)
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+
+        for i in range(bisect.bisect_left(self.buckets, value), len(self.buckets)):
+            self.bucket_counts[i] += 1
+
+
+class LabeledHistogram(Metric):
+    """
+    Histograms of the same metric split by label values, children are created on first use
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...],
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.label_names = label_names
+        self.buckets = buckets
+        self.children: dict[tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        child = self.children.get(values)
+
+        if child is None:
+            child = self.children[values] = Histogram(self.name, self.description, self.buckets, registered=False)
+
+        return child
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape_label(value: str) -> str:
+    return _escape(value).replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_histogram(histogram: Histogram, labels: dict[str, str]) -> list[str]:
+    lines = [f'{histogram.name}_bucket{_format_labels(labels | {"le": repr(float(bound))})} {count}'
+             for bound, count in zip(histogram.buckets, histogram.bucket_counts)]
+    lines.append(f'{histogram.name}_bucket{_format_labels(labels | {"le": "+Inf"})} {histogram.count}')
+    lines.append(f'{histogram.name}_sum{_format_labels(labels)} {histogram.sum}')
+    lines.append(f'{histogram.name}_count{_format_labels(labels)} {histogram.count}')
+
+    return lines
+
+
+def render_metrics(registry: list[Metric] | None = None) -> str:
+    """
+    :return: metrics in Prometheus text exposition format
+    """
+    lines = []
+
+    for metric in REGISTRY if registry is None else registry:
+        lines.append(f'# HELP {metric.name} {_escape(metric.description)}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+
+        if isinstance(metric, LabeledHistogram):
+            for values, child in metric.children.items():
+                lines.extend(_format_histogram(child, dict(zip(metric.label_names, values))))
+        elif isinstance(metric, Histogram):
+            lines.extend(_format_histogram(metric, {}))
+        else:
+            lines.append(f'{metric.name} {metric.value}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,22 @@
+import json
+from datetime import datetime
+from typing import Any, Mapping
+from uuid import UUID
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return str(value)
+
+    if isinstance(value, datetime):
+        return value.isoformat()
+
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def row_to_json(row: Mapping[str, Any]) -> str:
+    """
+    Serializes db row straight to json, without building ORM or pydantic objects.
+    Enums of this service are str based, so json writes their values as is
+    """
+    return json.dumps(dict(row), default=_default, separators=(',', ':'))
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from src.utils.metrics import Counter, Histogram
+
+R = TypeVar('R')
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.callers = 1
+
+
+class SingleFlight(Generic[R]):
+    """
+    Deduplicates concurrent calls with equal keys: the first caller starts the call, everyone asking for the same key
+    while it is in flight (or within ttl after it finished successfully) gets its result or exception.
+    The call runs in its own task, so a cancelled caller doesn't cancel it for the others
+    """
+
+    def __init__(self, ttl: float, executed: Counter, coalesced: Counter, callers: Histogram):
+        self._ttl = ttl
+        self._executed = executed
+        self._coalesced = coalesced
+        self._callers = callers
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[R]]) -> R:
+        flight = self._flights.get(key)
+
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.get_running_loop().create_task(call()))
+            flight.task.add_done_callback(lambda task: self._land(key, flight))
+            self._executed.inc()
+        else:
+            flight.callers += 1
+            self._coalesced.inc()
+
+        return await asyncio.shield(flight.task)
+
+    def _land(self, key: Hashable, flight: _Flight):
+        # Marks exception as retrieved even if every caller was cancelled
+        failed = flight.task.cancelled() or flight.task.exception() is not None
+
+        if self._ttl > 0 and not failed:
+            asyncio.get_running_loop().call_later(self._ttl, self._forget, key, flight)
+        else:
+            self._forget(key, flight)
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+            self._callers.observe(flight.callers)
@@ -0,0 +1,59 @@
+import functools
+import inspect
+import time
+from typing import Callable
+
+from src.config import settings
+from src.utils.metrics import LabeledHistogram
+
+LAYER_DURATION = LabeledHistogram('botopia_layer_duration_seconds',
+                                  'Time spent in request, handler, service, repository and db layers',
+                                  ('layer', 'operation'))
+
+
+def timed(layer: str, operation: str | None = None) -> Callable:
+    """
+    Decorator recording duration of an async function into layer histogram.
+    With LATENCY_METRICS_ENABLED off the function is returned as is, so disabled timing costs nothing
+    :param layer: request, handler, service, repository or db
+    :param operation: defaults to qualified name of the function
+    """
+    def decorator(func: Callable) -> Callable:
+        if not settings.LATENCY_METRICS_ENABLED:
+            return func
+
+        histogram = LAYER_DURATION.labels(layer, operation or func.__qualname__)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started_at)
+
+        return wrapper
+
+    return decorator
+
+
+def timed_methods(layer: str) -> Callable[[type], type]:
+    """
+    Class decorator applying `timed` to all public coroutine methods (static ones included) of the class
+    """
+    def decorator(cls: type) -> type:
+        for name, attribute in list(vars(cls).items()):
+            if name.startswith('_'):
+                continue
+
+            operation = f'{cls.__name__}.{name}'
+
+            if isinstance(attribute, staticmethod) and inspect.iscoroutinefunction(attribute.__func__):
+                setattr(cls, name, staticmethod(timed(layer, operation)(attribute.__func__)))
+            elif inspect.iscoroutinefunction(attribute):
+                setattr(cls, name, timed(layer, operation)(attribute))
+
+        return cls
+
+    return decorator
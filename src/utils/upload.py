@@ -0,0 +1,137 @@
+import csv
+import json
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from src.config import settings
+from src.exceptions.exceptions import InvalidUploadException
+from src.schemas.Request.CreateUsersRequest import CreateUsersRequest
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+CSV_CONTENT_TYPES = ('text/csv',)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_length: int | None = None,
+                     keep_empty: bool = False) -> AsyncIterator[str]:
+    """
+    Splits streamed body into lines without reading it whole, empty lines are skipped unless keep_empty is set
+    :param max_line_length: lines longer than this many bytes are rejected before being buffered whole
+    """
+    parts = []
+    length = 0
+    line_number = 0
+
+    async for chunk in chunks:
+        start = 0
+
+        while (end := chunk.find(b'\n', start)) != -1:
+            parts.append(chunk[start:end])
+            length += end - start
+            line_number += 1
+            _check_line_length(length, max_line_length)
+
+            line = _decode_line(parts, line_number)
+            parts, length = [], 0
+            start = end + 1
+
+            if keep_empty or line.strip():
+                yield line
+
+        parts.append(chunk[start:])
+        length += len(chunk) - start
+        _check_line_length(length, max_line_length)
+
+    line = _decode_line(parts, line_number + 1)
+
+    if line.strip():
+        yield line
+
+
+def _decode_line(parts: list[bytes], line_number: int) -> str:
+    try:
+        return b''.join(parts).decode()
+    except UnicodeDecodeError:
+        raise InvalidUploadException(message='Upload is not valid UTF-8', meta={'line': line_number})
+
+
+def _check_line_length(length: int, max_line_length: int | None):
+    if max_line_length is not None and length > max_line_length:
+        raise InvalidUploadException(message='Line is too long', meta={'max_line_length': max_line_length})
+
+
+async def _parse_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[CreateUsersRequest]:
+    line_number = 0
+
+    async for line in lines:
+        line_number += 1
+
+        try:
+            yield CreateUsersRequest.model_validate_json(line)
+        except ValidationError as exception:
+            raise InvalidUploadException(message='Invalid user in upload',
+                                         meta={'line': line_number, 'errors': json.loads(exception.json())})
+
+
+async def _csv_records(lines: AsyncIterator[str],
+                       max_record_length: int | None = None) -> AsyncIterator[tuple[int, list[str]]]:
+    """
+    Joins lines into CSV records, quoted values may contain line breaks: record ends on a line break
+    outside of quotes, that is once it has an even number of quote characters (escaped quote is doubled)
+    :return: async iterator over pairs of number of the line record starts on and its values
+    """
+    record = []
+    quotes = 0
+    line_number = 0
+
+    async for line in lines:
+        line_number += 1
+
+        if not record and not line.strip():
+            continue
+
+        record.append(line)
+        quotes += line.count('"')
+        _check_line_length(sum(map(len, record)), max_record_length)
+
+        if quotes % 2 == 0:
+            yield line_number - len(record) + 1, next(csv.reader(['\n'.join(record)]))
+            record, quotes = [], 0
+
+    if record:
+        raise InvalidUploadException(message='Unterminated quoted value in upload',
+                                     meta={'line': line_number - len(record) + 1})
+
+
+async def _parse_csv(lines: AsyncIterator[str], max_record_length: int | None = None
+                     ) -> AsyncIterator[CreateUsersRequest]:
+    header = None
+
+    async for line_number, values in _csv_records(lines, max_record_length):
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+
+        try:
+            yield CreateUsersRequest.model_validate(dict(zip(header, values)))
+        except ValidationError as exception:
+            raise InvalidUploadException(message='Invalid user in upload',
+                                         meta={'line': line_number, 'errors': json.loads(exception.json())})
+
+
+def parse_users_upload(content_type: str | None, chunks: AsyncIterator[bytes]) -> AsyncIterator[CreateUsersRequest]:
+    """
+    Lazily parses streamed NDJSON (one user object per line) or CSV (header line with user fields first) upload,
+    so users are validated one by one as body arrives. Lines (and CSV records) longer than UPLOAD_MAX_LINE_LENGTH
+    bytes are rejected
+    """
+    media_type = (content_type or '').split(';')[0].strip().lower()
+
+    if media_type in NDJSON_CONTENT_TYPES:
+        return _parse_ndjson(iter_lines(chunks, settings.UPLOAD_MAX_LINE_LENGTH))
+
+    if media_type in CSV_CONTENT_TYPES:
+        return _parse_csv(iter_lines(chunks, settings.UPLOAD_MAX_LINE_LENGTH, keep_empty=True),
+                          settings.UPLOAD_MAX_LINE_LENGTH)
+
+    raise InvalidUploadException(message='Unsupported content type', meta={'content_type': content_type})
@@ -1,16 +1,55 @@
+import os
+from contextlib import asynccontextmanager
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 from datetime import datetime, timezone
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
+from src.models.base import Base
 from src.models.user import User
 from src.schemas.Shared.Domain import Domain
 from src.schemas.Shared.Environment import Environment
 from src.repositories.user_repository import UserRepository
 from src.repositories.lock_repository import LockRepository
+from src.schemas.Response.CreateUsersResponse import CreateUsersResponse
+from src.schemas.Response.GetUsersPageResponse import GetUsersPageResponse
+from src.schemas.Response.LockedUserResponse import LockedUserResponse
 from src.services.users_service import UserService
 from src.services.lock_service import LockService
+from src.services.lease_renewer import LeaseRenewer
+from src.services.lock_write_batcher import LockWriteBatcher
+from src.services.availability_index import AvailabilityIndex
+from src.services.user_events import UserEventBus
+from src.services.user_identity_cache import UserIdentityCache
+from src.services.user_waiters import UserWaiters
+from src.repositories.notification_repository import NotificationRepository
+from src.utils.metrics import Counter, Histogram
+from src.utils.single_flight import SingleFlight
+
+
+# Integration tests run against this database when set (it is wiped), against a SQLite file otherwise
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+
+def pytest_configure(config):
+    # Tables are dropped before every integration test, so only a database meant for tests is accepted
+    if TEST_DATABASE_URL and 'test' not in (make_url(TEST_DATABASE_URL).database or ''):
+        raise pytest.UsageError('TEST_DATABASE_URL is wiped by tests, its database name must contain "test"')
+
+
+def pytest_collection_modifyitems(items):
+    for item in items:
+        if 'db_session_builder' in getattr(item, 'fixturenames', ()):
+            item.add_marker(pytest.mark.integration)
+
+
+@pytest.fixture(autouse=True)
+def cheap_password_hashing(monkeypatch):
+    monkeypatch.setattr('src.config.settings.SCRYPT_N', 16)
+    monkeypatch.setattr('src.config.settings.PBKDF2_ITERATIONS', 10)
 
 
 @pytest.fixture
@@ -34,6 +73,35 @@ def mock_session_builder(mock_session):
     return builder
 
 
+@asynccontextmanager
+async def fresh_schema(url: str, **engine_options):
+    engine = create_async_engine(url, **engine_options)
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    yield async_sessionmaker(engine, expire_on_commit=False)
+
+    await engine.dispose()
+
+
+@pytest.fixture
+async def sqlite_session_builder(tmp_path):
+    async with fresh_schema(f"sqlite+aiosqlite:///{tmp_path / 'botopia.db'}") as session_builder:
+        yield session_builder
+
+
+@pytest.fixture
+async def db_session_builder(tmp_path):
+    """
+    Real database with schema built from models: Postgres from TEST_DATABASE_URL if it is set, SQLite otherwise
+    """
+    async with fresh_schema(TEST_DATABASE_URL or f"sqlite+aiosqlite:///{tmp_path / 'botopia.db'}",
+                            **({'pool_size': 20} if TEST_DATABASE_URL else {})) as session_builder:
+        yield session_builder
+
+
 @pytest.fixture
 def generated_user_id():
     return uuid4()
@@ -54,7 +122,8 @@ def sample_user(generated_user_id, generated_project_id):
         env=Environment.PROD,
         domain=Domain.REGULAR,
         created_at=datetime.now(timezone.utc),
-        locktime=None
+        locktime=None,
+        lock_token=0
     )
 
 
@@ -68,7 +137,8 @@ def locked_user(generated_user_id, generated_project_id):
         env=Environment.PROD,
         domain=Domain.CANARY,
         created_at=datetime.now(timezone.utc),
-        locktime=datetime.now(timezone.utc)
+        locktime=datetime.now(timezone.utc),
+        lock_token=1
     )
 
 
@@ -78,8 +148,40 @@ def user_repository():
 
 
 @pytest.fixture
-def user_service(user_repository):
-    return UserService(user_repository=user_repository)
+def availability_index():
+    return AvailabilityIndex()
+
+
+@pytest.fixture
+def user_waiters():
+    return UserWaiters(max_waiters=10)
+
+
+@pytest.fixture
+def user_event_bus(availability_index, user_identity_cache, user_waiters):
+    bus = UserEventBus(NotificationRepository())
+    bus.subscribe(availability_index.apply_events)
+    bus.subscribe(user_identity_cache.apply_events)
+    bus.subscribe(user_waiters.apply_events)
+    return bus
+
+
+@pytest.fixture
+def user_identity_cache(user_repository):
+    return UserIdentityCache(user_repository, max_size=100, ttl=60)
+
+
+@pytest.fixture
+def user_query_flights():
+    return SingleFlight(ttl=0, executed=Counter('test_executed', '', registered=False),
+                        coalesced=Counter('test_coalesced', '', registered=False),
+                        callers=Histogram('test_callers', '', registered=False))
+
+
+@pytest.fixture
+def user_service(user_repository, user_event_bus, user_identity_cache, user_query_flights):
+    return UserService(user_repository=user_repository, user_event_bus=user_event_bus,
+                       user_identity_cache=user_identity_cache, user_query_flights=user_query_flights)
 
 
 @pytest.fixture
@@ -88,24 +190,48 @@ def lock_repository():
 
 
 @pytest.fixture
-def lock_service(lock_repository, user_repository):
+def lease_renewer(lock_repository):
+    return LeaseRenewer(lock_repository, window=0.01, max_batch_size=100)
+
+
+@pytest.fixture
+def lock_write_batcher(lock_repository):
+    return LockWriteBatcher(lock_repository, window=0.01, max_batch_size=100)
+
+
+@pytest.fixture
+def lock_service(lock_repository, user_repository, lease_renewer, availability_index, user_event_bus,
+                 user_waiters, lock_write_batcher):
     return LockService(
         lock_repository=lock_repository,
-        user_repository=user_repository
+        user_repository=user_repository,
+        lease_renewer=lease_renewer,
+        availability_index=availability_index,
+        user_event_bus=user_event_bus,
+        user_waiters=user_waiters,
+        lock_write_batcher=lock_write_batcher
     )
 
 
 @pytest.fixture
 def mock_user_service():
     service = MagicMock(spec=UserService)
-    service.create_users = AsyncMock()
+    service.create_users = AsyncMock(return_value=CreateUsersResponse(inserted=[], updated=[], skipped=[]))
+    service.bulk_create_users = AsyncMock(return_value=0)
     service.get_users = AsyncMock(return_value=[])
+    service.get_users_json = AsyncMock(return_value=b'[]')
+    service.get_users_page = AsyncMock(return_value=GetUsersPageResponse(users=[], next_cursor=None))
     return service
 
 
 @pytest.fixture
-def mock_lock_service():
+def mock_lock_service(locked_user):
     service = MagicMock(spec=LockService)
-    service.acquire_lock = AsyncMock()
+    service.acquire_lock = AsyncMock(return_value=LockedUserResponse.model_validate(locked_user, from_attributes=True))
     service.release_lock = AsyncMock()
+    service.renew_lock = AsyncMock()
+    service.acquire_any = AsyncMock()
+    service.acquire_users = AsyncMock(return_value=[])
+    service.release_users = AsyncMock(return_value=[])
+    service.rebuild_availability_index = AsyncMock(return_value=0)
     return service
@@ -0,0 +1,66 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+
+
+def availability_row(bucket, available=True):
+    return SimpleNamespace(id=uuid4(), project_id=bucket[0], env=bucket[1], domain=bucket[2], available=available)
+
+
+@pytest.fixture
+def bucket():
+    return uuid4(), Environment.PROD, Domain.REGULAR
+
+
+@pytest.mark.asyncio
+async def test_rebuild_indexes_only_free_users(availability_index, bucket):
+    free, locked = availability_row(bucket), availability_row(bucket, available=False)
+    user_repository = SimpleNamespace(get_availability=AsyncMock(return_value=[free, locked]))
+
+    assert await availability_index.rebuild(MagicMock(), user_repository) == 2
+    assert availability_index.pick(bucket) == free.id
+    assert availability_index.pick(bucket) is None
+
+
+@pytest.mark.asyncio
+async def test_rebuild_replays_changes_made_while_loading(availability_index, bucket):
+    row = availability_row(bucket)
+
+    async def get_availability(session_builder):
+        availability_index.mark_locked([row.id])
+        return [row]
+
+    await availability_index.rebuild(MagicMock(), SimpleNamespace(get_availability=get_availability))
+
+    assert availability_index.pick(bucket) is None
+
+
+def test_hooks_are_noops_until_loaded(availability_index, bucket):
+    user_id = uuid4()
+
+    availability_index.add_user(user_id, bucket)
+
+    assert not availability_index.loaded
+    assert availability_index.pick(bucket) is None
+
+
+@pytest.mark.asyncio
+async def test_lock_release_and_move_between_buckets(availability_index, bucket):
+    await availability_index.rebuild(MagicMock(), SimpleNamespace(get_availability=AsyncMock(return_value=[])))
+    other_bucket = (bucket[0], Environment.STAGE, bucket[2])
+    user_id = uuid4()
+
+    availability_index.add_user(user_id, bucket)
+    availability_index.mark_locked([user_id])
+    availability_index.add_user(user_id, other_bucket)
+
+    assert availability_index.pick(bucket) is None
+    assert availability_index.pick(other_bucket) is None
+
+    availability_index.mark_free([user_id])
+
+    assert availability_index.pick(other_bucket) == user_id
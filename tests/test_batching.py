@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from src.utils.batching import MicroBatcher
+
+
+@pytest.mark.asyncio
+async def test_items_within_window_are_flushed_together():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(flush, window=0.01, max_batch_size=100)
+
+    results = await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+
+    assert results == [i * 2 for i in range(10)]
+    assert batches == [list(range(10))]
+
+
+@pytest.mark.asyncio
+async def test_batch_is_flushed_when_full():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return items
+
+    batcher = MicroBatcher(flush, window=10, max_batch_size=3)
+
+    results = await asyncio.wait_for(asyncio.gather(*[batcher.submit(i) for i in range(6)]), timeout=1)
+
+    assert results == list(range(6))
+    assert batches == [[0, 1, 2], [3, 4, 5]]
+
+
+@pytest.mark.asyncio
+async def test_flush_failure_is_raised_for_every_item():
+    async def flush(items):
+        raise RuntimeError("flush failed")
+
+    batcher = MicroBatcher(flush, window=0.01, max_batch_size=100)
+
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_missing_results_fail_every_item():
+    async def flush(items):
+        return items[:-1]
+
+    batcher = MicroBatcher(flush, window=0.01, max_batch_size=100)
+
+    results = await asyncio.wait_for(asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True),
+                                     timeout=1)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_pending_items():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return items
+
+    batcher = MicroBatcher(flush, window=10, max_batch_size=100)
+    submits = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+    await asyncio.sleep(0)
+
+    await asyncio.wait_for(batcher.close(), timeout=1)
+
+    assert batches == [[0, 1, 2]]
+    assert await asyncio.gather(*submits) == [0, 1, 2]
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy import exc, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.db.database import DeadlineSession, apply_request_deadline, get_connect_args
+from src.db.pool import InstrumentedPool, POOL_CHECKOUT_TIMEOUTS, POOL_CHECKOUT_WAIT, POOL_IN_USE
+from src.exceptions.exceptions import RequestDeadlineExceededException
+from src.handlers.middleware import get_request_timeout
+from src.utils import deadline
+
+
+def test_connect_args_configure_asyncpg_only(monkeypatch):
+    monkeypatch.setattr('src.config.settings.DB_STATEMENT_CACHE_SIZE', 0)
+    monkeypatch.setattr('src.config.settings.DB_STATEMENT_TIMEOUT', 5000)
+
+    assert get_connect_args('postgresql+asyncpg://u:p@localhost/db') == {
+        'prepared_statement_cache_size': 0, 'statement_cache_size': 0,
+        'server_settings': {'statement_timeout': '5000'}}
+    assert get_connect_args('sqlite+aiosqlite:///botopia.db') == {}
+
+
+def test_request_timeout_header_only_shortens_deadline(monkeypatch):
+    monkeypatch.setattr('src.config.settings.REQUEST_DEADLINE', 10.0)
+
+    assert get_request_timeout(None) == 10.0
+    assert get_request_timeout('2.5') == 2.5
+    assert get_request_timeout('30') == 10.0
+    assert get_request_timeout('soon') == 10.0
+    assert get_request_timeout('inf') == 10.0
+
+    monkeypatch.setattr('src.config.settings.REQUEST_DEADLINE', None)
+
+    assert get_request_timeout(None) is None
+    assert get_request_timeout('2.5') == 2.5
+
+
+@pytest.mark.asyncio
+async def test_deadline_becomes_local_statement_timeout():
+    connection = MagicMock()
+    connection.dialect.name = 'postgresql'
+
+    deadline.set_deadline(2)
+    apply_request_deadline(MagicMock(), MagicMock(), connection)
+
+    sql = connection.exec_driver_sql.call_args.args[0]
+    assert sql.startswith('SET LOCAL statement_timeout = ')
+    assert 1900 < int(sql.rsplit(' ', 1)[1]) <= 2000
+
+
+@pytest.mark.asyncio
+async def test_transaction_after_deadline_is_rejected(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'botopia.db'}")
+    session_builder = async_sessionmaker(engine, sync_session_class=DeadlineSession)
+
+    deadline.set_deadline(-1)
+
+    with pytest.raises(RequestDeadlineExceededException):
+        async with session_builder() as session:
+            await session.execute(select(1))
+
+    # Background tasks spawned by the request don't inherit its deadline
+    async def background_query():
+        async with session_builder() as session:
+            return await session.scalar(select(1))
+
+    assert await asyncio.create_task(background_query()) == 1
+
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_extended_deadline_covers_waiting():
+    deadline.set_deadline(-1)
+    deadline.extend_deadline(5)
+
+    assert 3 < deadline.remaining() <= 4
+
+
+@pytest.mark.asyncio
+async def test_pool_exports_usage_and_checkout_timeouts(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'botopia.db'}", poolclass=InstrumentedPool,
+                                 pool_size=1, max_overflow=0, pool_timeout=0.05)
+    checkouts = POOL_CHECKOUT_WAIT.count
+    timeouts = POOL_CHECKOUT_TIMEOUTS.value
+
+    async with engine.connect():
+        assert POOL_IN_USE.value == 1
+
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+
+    assert POOL_IN_USE.value == 0
+    assert POOL_CHECKOUT_WAIT.count == checkouts + 2
+    assert POOL_CHECKOUT_TIMEOUTS.value == timeouts + 1
+
+    await engine.dispose()
@@ -0,0 +1,55 @@
+import hashlib
+
+import pytest
+
+from src.utils.hashing import get_password_hasher, hash_passwords, verify_password
+
+
+@pytest.mark.parametrize("name", ["scrypt", "pbkdf2_sha256", "sha256"])
+def test_hasher_round_trip(name):
+    hashed_password = get_password_hasher(name).hash("secret")
+
+    assert verify_password("secret", hashed_password)
+    assert not verify_password("wrong", hashed_password)
+
+
+def test_hash_is_versioned_and_salted():
+    first = get_password_hasher("scrypt").hash("secret")
+    second = get_password_hasher("scrypt").hash("secret")
+
+    assert first.startswith("scrypt$16$8$1$")
+    assert first != second
+
+
+def test_legacy_sha256_hash_verifies():
+    legacy = hashlib.sha256(b"secret").hexdigest()
+
+    assert verify_password("secret", legacy)
+    assert not verify_password("wrong", legacy)
+
+
+def test_cost_change_keeps_old_hashes_valid(monkeypatch):
+    old_hash = get_password_hasher("pbkdf2_sha256").hash("secret")
+    monkeypatch.setattr('src.config.settings.PBKDF2_ITERATIONS', 20)
+
+    assert get_password_hasher("pbkdf2_sha256").hash("secret").startswith("pbkdf2_sha256$20$")
+    assert verify_password("secret", old_hash)
+
+
+def test_unknown_hasher():
+    assert not verify_password("secret", "bcrypt$whatever")
+
+    with pytest.raises(ValueError):
+        get_password_hasher("bcrypt")
+
+
+@pytest.mark.asyncio
+async def test_hash_passwords_in_chunks_keeps_order(monkeypatch):
+    monkeypatch.setattr('src.config.settings.PASSWORD_HASH_CHUNK_SIZE', 3)
+    passwords = [f"password{i}" for i in range(10)]
+
+    hashed_passwords = await hash_passwords(passwords)
+
+    assert len(hashed_passwords) == 10
+    assert all(verify_password(password, hashed) for password, hashed in zip(passwords, hashed_passwords))
+    assert await hash_passwords([]) == []
@@ -0,0 +1,123 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+from uuid import uuid4
+from sqlalchemy import event, text
+
+from src.models.user import User
+from src.repositories.lock_repository import LockRepository
+from src.repositories.user_repository import UserRepository
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+
+BUCKET_INDEX = 'ix_users_project_id_env_domain'
+FREE_USERS_INDEX = 'ix_users_free_project_id_env_domain'
+LEASE_INDEX = 'ix_users_lease_expires_at'
+
+
+@pytest.fixture
+async def mostly_locked_bucket(db_session_builder, generated_project_id):
+    """
+    Big bucket where only every fiftieth user is free and the rest hold live leases, next to a few small buckets,
+    with statistics collected. Free users are a small part of the bucket, so the partial index is the cheap way
+    to find them, walking the bucket index would mostly visit locked users
+    """
+    now = datetime.now(timezone.utc)
+    project_ids = [generated_project_id] * 1000 + [project_id for project_id in (uuid4(), uuid4()) for _ in range(20)]
+
+    async with db_session_builder() as session:
+        session.add_all([User(login=str(uuid4()), hashed_password="hash", project_id=project_id,
+                              env=Environment.PROD, domain=Domain.REGULAR, locktime=None if i % 50 == 0 else now,
+                              lease_expires_at=None if i % 50 == 0 else now + timedelta(minutes=5))
+                         for i, project_id in enumerate(project_ids)])
+        await session.commit()
+        await session.execute(text('ANALYZE'))
+
+    return generated_project_id, Environment.PROD, Domain.REGULAR
+
+
+async def issued_plan(session_builder, call) -> str:
+    """
+    Runs repository call and explains the statement it sent to db with the same parameters
+    """
+    engine = session_builder.kw['bind'].sync_engine
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith(('SELECT', 'UPDATE')):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+
+    try:
+        await call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    statement, parameters = statements[0]
+
+    async with session_builder() as session:
+        connection = await session.connection()
+
+        if connection.dialect.name == 'postgresql':
+            # Small test table is cheaper to scan than any index, planner is pushed towards index plans
+            await connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            result = await connection.exec_driver_sql(f'EXPLAIN {statement}', parameters)
+
+            return '\n'.join(row[0] for row in result.all())
+
+        result = await connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+
+        return '\n'.join(row[-1] for row in result.all())
+
+
+def assert_uses_free_users_index(plan: str, dialect: str):
+    if dialect == 'sqlite':
+        # Branches of availability filter are looked up separately and united:
+        # free users of the bucket in the partial index, expired leases in the lease index
+        assert 'MULTI-INDEX OR' in plan
+        assert FREE_USERS_INDEX in plan
+        assert LEASE_INDEX in plan
+    else:
+        # Bitmap OR of the partial index and the lease index, no lease has expired yet
+        assert FREE_USERS_INDEX in plan
+        assert 'Seq Scan' not in plan
+
+
+@pytest.mark.asyncio
+async def test_bucket_filters_use_composite_index(db_session_builder, mostly_locked_bucket):
+    project_id, env, domain = mostly_locked_bucket
+
+    plan = await issued_plan(db_session_builder, lambda: UserRepository().get_filtered_users(
+        db_session_builder, project_id=project_id, env=env, domain=domain))
+
+    assert BUCKET_INDEX in plan
+
+
+@pytest.mark.asyncio
+async def test_available_users_lookup_uses_partial_index(db_session_builder, mostly_locked_bucket):
+    project_id, env, domain = mostly_locked_bucket
+
+    plan = await issued_plan(db_session_builder, lambda: UserRepository().get_filtered_users(
+        db_session_builder, project_id=project_id, env=env, domain=domain, only_available=True))
+
+    assert_uses_free_users_index(plan, db_session_builder.kw['bind'].dialect.name)
+
+
+@pytest.mark.asyncio
+async def test_lock_any_user_candidate_uses_partial_index(db_session_builder, mostly_locked_bucket):
+    project_id, env, domain = mostly_locked_bucket
+
+    plan = await issued_plan(db_session_builder, lambda: LockRepository.lock_any_user(
+        db_session_builder, project_id=project_id, env=env, domain=domain))
+
+    assert_uses_free_users_index(plan, db_session_builder.kw['bind'].dialect.name)
+
+
+@pytest.mark.asyncio
+async def test_lock_users_candidates_use_partial_index(db_session_builder, mostly_locked_bucket):
+    project_id, env, domain = mostly_locked_bucket
+
+    plan = await issued_plan(db_session_builder, lambda: LockRepository.lock_users(
+        db_session_builder, 3, project_id=project_id, env=env, domain=domain))
+
+    assert_uses_free_users_index(plan, db_session_builder.kw['bind'].dialect.name)
@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from uuid import uuid4
+
+from src.exceptions.exceptions import NoAvailableUsersException, UserIsAlreadyLockedException
+from src.models.user import User
+from src.schemas.Request.AcquireAnyUserRequest import AcquireAnyUserRequest
+from src.schemas.Request.AcquireUsersRequest import AcquireUsersRequest
+from src.schemas.Request.CreateUsersRequest import CreateUsersRequest
+from src.schemas.Request.GetUsersRequest import GetUsersRequest
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+
+
+async def add_users(session_builder, project_id, count, **values) -> list[User]:
+    users = [User(login=str(uuid4()), hashed_password="hash", project_id=project_id, env=Environment.PROD,
+                  domain=Domain.REGULAR, **values) for _ in range(count)]
+
+    async with session_builder() as session:
+        session.add_all(users)
+        await session.commit()
+
+    return users
+
+
+@pytest.mark.asyncio
+async def test_only_available_means_not_locked_or_lease_expired(db_session_builder, user_repository,
+                                                                generated_project_id):
+    now = datetime.now(timezone.utc)
+    free, = await add_users(db_session_builder, generated_project_id, 1)
+    expired, = await add_users(db_session_builder, generated_project_id, 1, locktime=now,
+                               lease_expires_at=now - timedelta(seconds=1))
+    await add_users(db_session_builder, generated_project_id, 1, locktime=now,
+                    lease_expires_at=now + timedelta(minutes=1))
+    await add_users(db_session_builder, generated_project_id, 1, locktime=now)
+
+    users = await user_repository.get_filtered_users(db_session_builder, project_id=generated_project_id,
+                                                     only_available=True)
+
+    assert {user.id for user in users} == {free.id, expired.id}
+
+
+@pytest.mark.asyncio
+async def test_lock_users_all_or_nothing_rolls_back(db_session_builder, lock_repository, generated_project_id):
+    await add_users(db_session_builder, generated_project_id, 2)
+
+    assert await lock_repository.lock_users(db_session_builder, 3, project_id=generated_project_id,
+                                            all_or_nothing=True) == []
+    assert len(await lock_repository.lock_users(db_session_builder, 3, project_id=generated_project_id)) == 2
+
+
+@pytest.mark.asyncio
+async def test_release_requires_current_lock_token(db_session_builder, lock_repository, generated_project_id):
+    user, = await add_users(db_session_builder, generated_project_id, 1)
+
+    first = await lock_repository.try_lock_user(db_session_builder, user.id)
+    await lock_repository.unlock_user(db_session_builder, user.id, first.lock_token)
+    second = await lock_repository.try_lock_user(db_session_builder, user.id)
+
+    assert second.lock_token == first.lock_token + 1
+    assert await lock_repository.unlock_user(db_session_builder, user.id, first.lock_token) is None
+    assert (await lock_repository.unlock_user(db_session_builder, user.id, second.lock_token)).id == user.id
+
+
+@pytest.mark.asyncio
+async def test_created_users_are_served_by_service(db_session_builder, user_service, generated_project_id):
+    await user_service.create_users(db_session_builder, [
+        CreateUsersRequest(login=f'bot_{i}', password='secret', project_id=generated_project_id,
+                           env=Environment.PROD, domain=Domain.REGULAR) for i in range(3)])
+
+    users = await user_service.get_users(db_session_builder, GetUsersRequest(project_id=generated_project_id))
+
+    assert sorted(user.login for user in users) == ['bot_0', 'bot_1', 'bot_2']
+
+
+@pytest.mark.asyncio
+async def test_concurrent_acquire_lock_has_single_winner(db_session_builder, lock_service, generated_project_id):
+    user, = await add_users(db_session_builder, generated_project_id, 1)
+
+    results = await asyncio.gather(*(lock_service.acquire_lock(db_session_builder, user.id) for _ in range(20)),
+                                   return_exceptions=True)
+
+    assert sum(not isinstance(result, Exception) for result in results) == 1
+    assert all(isinstance(result, UserIsAlreadyLockedException) for result in results
+               if isinstance(result, Exception))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_acquire_any_never_hands_out_user_twice(db_session_builder, lock_service,
+                                                                 generated_project_id):
+    users = await add_users(db_session_builder, generated_project_id, 5)
+    request = AcquireAnyUserRequest(project_id=generated_project_id, env=Environment.PROD, domain=Domain.REGULAR)
+
+    results = await asyncio.gather(*(lock_service.acquire_any(db_session_builder, request) for _ in range(15)),
+                                   return_exceptions=True)
+    acquired = [result.id for result in results if not isinstance(result, Exception)]
+
+    assert sorted(acquired) == sorted(user.id for user in users)
+    assert all(isinstance(result, NoAvailableUsersException) for result in results
+               if isinstance(result, Exception))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_acquire_users_split_pool(db_session_builder, lock_service, generated_project_id):
+    await add_users(db_session_builder, generated_project_id, 10)
+    request = AcquireUsersRequest(count=3, project_id=generated_project_id)
+
+    results = await asyncio.gather(*(lock_service.acquire_users(db_session_builder, request) for _ in range(5)))
+    acquired = [user.id for users in results for user in users]
+
+    assert len(acquired) == len(set(acquired)) == 10
+
+
+@pytest.mark.asyncio
+async def test_release_and_expiry_race_releases_once(db_session_builder, lock_repository, generated_project_id):
+    user, = await add_users(db_session_builder, generated_project_id, 1)
+    lock = await lock_repository.try_lock_user(db_session_builder, user.id, ttl=1)
+
+    async with db_session_builder() as session:
+        locked = await session.get(User, user.id)
+        locked.lease_expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        await session.commit()
+
+    released, expired = await asyncio.gather(
+        lock_repository.unlock_user(db_session_builder, user.id, lock.lock_token),
+        lock_repository.release_expired_locks(db_session_builder, batch_size=10))
+
+    assert (released is not None) + len(expired) == 1
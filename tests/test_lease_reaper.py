@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.lease_reaper import LeaseReaper
+
+
+@pytest.fixture
+def mock_lock_repository():
+    return MagicMock()
+
+
+@pytest.mark.asyncio
+async def test_reap_runs_batches_until_incomplete(mock_session_builder, mock_lock_repository):
+    mock_lock_repository.release_expired_locks = AsyncMock(side_effect=[[uuid4(), uuid4()], [uuid4(), uuid4()],
+                                                                         [uuid4()]])
+    reaper = LeaseReaper(mock_session_builder, mock_lock_repository, interval=1, batch_size=2)
+
+    released = await reaper.reap()
+
+    assert released == 5
+    assert mock_lock_repository.release_expired_locks.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_reap_nothing_expired(mock_session_builder, mock_lock_repository):
+    mock_lock_repository.release_expired_locks = AsyncMock(return_value=[])
+    reaper = LeaseReaper(mock_session_builder, mock_lock_repository, interval=1, batch_size=100)
+
+    released = await reaper.reap()
+
+    assert released == 0
+    mock_lock_repository.release_expired_locks.assert_called_once_with(mock_session_builder, 100)
+
+
+@pytest.mark.asyncio
+async def test_reaper_keeps_running_after_failure(mock_session_builder, mock_lock_repository):
+    mock_lock_repository.release_expired_locks = AsyncMock(side_effect=[Exception("db is down"), [], []])
+    reaper = LeaseReaper(mock_session_builder, mock_lock_repository, interval=0.01, batch_size=100)
+
+    reaper.start()
+    await asyncio.sleep(0.05)
+    await reaper.stop()
+
+    assert mock_lock_repository.release_expired_locks.call_count >= 2
+
+
+@pytest.mark.asyncio
+async def test_reap_publishes_expired_events(mock_session_builder, mock_lock_repository):
+    released = [SimpleNamespace(id=uuid4(), project_id=uuid4(), env=Environment.PROD, domain=Domain.REGULAR)
+                for _ in range(2)]
+    mock_lock_repository.release_expired_locks = AsyncMock(return_value=released)
+    user_event_bus = MagicMock()
+    reaper = LeaseReaper(mock_session_builder, mock_lock_repository, interval=1, batch_size=100,
+                         user_event_bus=user_event_bus)
+
+    await reaper.reap()
+
+    events = user_event_bus.publish.call_args.args[1]
+
+    assert [event.user_id for event in events] == [user.id for user in released]
+    assert events[0].bucket == (released[0].project_id, Environment.PROD, Domain.REGULAR)
+    assert all(event.type == UserEventType.EXPIRED for event in events)
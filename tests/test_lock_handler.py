@@ -4,6 +4,7 @@ from uuid import uuid4
 
 from src.handlers.main import app
 from src.db.database import get_db
+from src.schemas.Response.LockedUserResponse import LockedUserResponse
 from src.services.lock_service import LockService
 
 
@@ -24,14 +25,94 @@ def test_acquire_lock_endpoint(client, mock_lock_service, mock_session_builder):
     response = client.post("/api/v1/lock/acquire_lock", json=request_body)
 
     assert response.status_code == 200
+    assert response.json()["lock_token"] == 1
     mock_lock_service.acquire_lock.assert_called_once()
 
 
+def test_acquire_lock_endpoint_with_ttl(client, mock_lock_service, mock_session_builder):
+    user_id = uuid4()
+
+    response = client.post("/api/v1/lock/acquire_lock", json={"user_id": str(user_id), "ttl": 60})
+
+    assert response.status_code == 200
+    assert mock_lock_service.acquire_lock.call_args.kwargs["ttl"] == 60
+
+
+def test_acquire_lock_endpoint_invalid_ttl(client, mock_lock_service, mock_session_builder):
+    response = client.post("/api/v1/lock/acquire_lock", json={"user_id": str(uuid4()), "ttl": 0})
+
+    assert response.status_code == 422
+    mock_lock_service.acquire_lock.assert_not_called()
+
+
 def test_release_lock_endpoint(client, mock_lock_service, mock_session_builder):
     user_id = uuid4()
-    request_body = {"user_id": str(user_id)}
+    request_body = {"user_id": str(user_id), "lock_token": 3}
 
     response = client.post("/api/v1/lock/release_lock", json=request_body)
 
     assert response.status_code == 200
     mock_lock_service.release_lock.assert_called_once()
+
+
+def test_acquire_any_endpoint(client, mock_lock_service, mock_session_builder, sample_user):
+    mock_lock_service.acquire_any.return_value = LockedUserResponse.model_validate(sample_user, from_attributes=True)
+    request_body = {"project_id": str(sample_user.project_id), "env": "prod"}
+
+    response = client.post("/api/v1/lock/acquire_any", json=request_body)
+
+    assert response.status_code == 200
+    assert response.json()["id"] == str(sample_user.id)
+    mock_lock_service.acquire_any.assert_called_once()
+
+
+def test_acquire_users_endpoint(client, mock_lock_service, mock_session_builder):
+    response = client.post("/api/v1/lock/acquire_users", json={"count": 10, "env": "prod", "all_or_nothing": True})
+
+    assert response.status_code == 200
+    mock_lock_service.acquire_users.assert_called_once()
+
+
+def test_release_users_endpoint(client, mock_lock_service, mock_session_builder):
+    user_ids = [str(uuid4()), str(uuid4())]
+    mock_lock_service.release_users.return_value = user_ids
+
+    response = client.post("/api/v1/lock/release_users",
+                           json={"locks": [{"user_id": user_id, "lock_token": 1} for user_id in user_ids]})
+
+    assert response.status_code == 200
+    assert response.json() == user_ids
+    mock_lock_service.release_users.assert_called_once()
+
+
+def test_renew_lock_endpoint(client, mock_lock_service, mock_session_builder):
+    user_id = uuid4()
+
+    response = client.post("/api/v1/lock/renew_lock", json={"user_id": str(user_id), "lock_token": 2, "ttl": 30})
+
+    assert response.status_code == 200
+    mock_lock_service.renew_lock.assert_called_once_with(mock_session_builder, user_id, 2, 30)
+
+
+def test_release_lock_endpoint_requires_token(client, mock_lock_service, mock_session_builder):
+    response = client.post("/api/v1/lock/release_lock", json={"user_id": str(uuid4())})
+
+    assert response.status_code == 422
+    mock_lock_service.release_lock.assert_not_called()
+
+
+def test_rebuild_availability_index_endpoint(client, mock_lock_service, mock_session_builder):
+    mock_lock_service.rebuild_availability_index.return_value = 42
+
+    response = client.post("/api/v1/lock/rebuild_availability_index")
+
+    assert response.status_code == 200
+    assert response.json() == {"indexed": 42}
+    mock_lock_service.rebuild_availability_index.assert_called_once_with(mock_session_builder)
+
+
+def test_acquire_any_endpoint_wait_timeout_limit(client, mock_lock_service):
+    response = client.post("/api/v1/lock/acquire_any", json={"wait_timeout": 3600})
+
+    assert response.status_code == 422
+    mock_lock_service.acquire_any.assert_not_called()
@@ -1,35 +1,228 @@
 import pytest
+from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
+from datetime import datetime, timezone, timedelta
 
+from src.models.user import User
 from src.repositories.lock_repository import LockRepository
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
 
 
 @pytest.mark.asyncio
-async def test_toggle_lock_acquire(mock_session_builder, mock_session):
-    user_id = uuid4()
+async def test_try_lock_user_acquired(mock_session_builder, mock_session):
+    locktime = datetime.now(timezone.utc)
 
-    await LockRepository.toggle_user_lock(mock_session_builder, user_id, should_lock=True)
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = locktime
+    mock_session.execute = AsyncMock(return_value=mock_result)
 
-    assert mock_session.execute.called
+    result = await LockRepository.try_lock_user(mock_session_builder, uuid4())
+
+    assert result == locktime
+    mock_session.execute.assert_called_once()
     mock_session.commit.assert_called_once()
 
 
 @pytest.mark.asyncio
-async def test_toggle_lock_release(mock_session_builder, mock_session):
-    user_id = uuid4()
+async def test_try_lock_user_not_acquired(mock_session_builder, mock_session):
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = None
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await LockRepository.try_lock_user(mock_session_builder, uuid4())
+
+    assert result is None
+
+
+@pytest.mark.asyncio
+async def test_try_lock_user_skips_locked_user(sqlite_session_builder, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    first = await LockRepository.try_lock_user(sqlite_session_builder, sample_user.id)
+    second = await LockRepository.try_lock_user(sqlite_session_builder, sample_user.id)
+    missing = await LockRepository.try_lock_user(sqlite_session_builder, uuid4())
+
+    assert first is not None
+    assert second is None
+    assert missing is None
 
-    await LockRepository.toggle_user_lock(mock_session_builder, user_id, should_lock=False)
 
-    assert mock_session.execute.called
+@pytest.mark.asyncio
+async def test_lock_any_user_found(mock_session_builder, mock_session, sample_user):
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = sample_user
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await LockRepository.lock_any_user(mock_session_builder, project_id=sample_user.project_id)
+
+    assert result == sample_user
+    mock_session.execute.assert_called_once()
     mock_session.commit.assert_called_once()
 
 
 @pytest.mark.asyncio
-async def test_toggle_lock_multiple_users(mock_session_builder, mock_session):
-    user_id1 = uuid4()
-    user_id2 = uuid4()
+async def test_lock_any_user_claims_each_user_once(sqlite_session_builder, generated_project_id):
+    async with sqlite_session_builder() as session:
+        session.add_all([User(login=f"user{i}", hashed_password="hash", project_id=generated_project_id,
+                              env=Environment.PROD, domain=Domain.REGULAR) for i in range(3)])
+        session.add(User(login="other_env", hashed_password="hash", project_id=generated_project_id,
+                         env=Environment.STAGE, domain=Domain.REGULAR))
+        await session.commit()
+
+    claimed = [await LockRepository.lock_any_user(sqlite_session_builder, project_id=generated_project_id,
+                                                  env=Environment.PROD) for _ in range(4)]
+
+    assert claimed[3] is None
+    assert len({user.id for user in claimed[:3]}) == 3
+    assert all(user.env == Environment.PROD and user.locktime is not None for user in claimed[:3])
+
+
+@pytest.mark.asyncio
+async def test_lock_users_best_effort(sqlite_session_builder, generated_project_id):
+    async with sqlite_session_builder() as session:
+        session.add_all([User(login=f"user{i}", hashed_password="hash", project_id=generated_project_id,
+                              env=Environment.PROD, domain=Domain.REGULAR) for i in range(3)])
+        await session.commit()
+
+    first = await LockRepository.lock_users(sqlite_session_builder, 2, project_id=generated_project_id)
+    second = await LockRepository.lock_users(sqlite_session_builder, 2, project_id=generated_project_id)
+
+    assert len(first) == 2
+    assert len(second) == 1
+    assert not {user.id for user in first} & {user.id for user in second}
+
+
+@pytest.mark.asyncio
+async def test_lock_users_all_or_nothing(sqlite_session_builder, generated_project_id):
+    async with sqlite_session_builder() as session:
+        session.add_all([User(login=f"user{i}", hashed_password="hash", project_id=generated_project_id,
+                              env=Environment.PROD, domain=Domain.REGULAR) for i in range(3)])
+        await session.commit()
+
+    failed = await LockRepository.lock_users(sqlite_session_builder, 4, project_id=generated_project_id,
+                                             all_or_nothing=True)
+    claimed = await LockRepository.lock_users(sqlite_session_builder, 3, project_id=generated_project_id,
+                                              all_or_nothing=True)
+
+    assert failed == []
+    assert len(claimed) == 3
+
+
+@pytest.mark.asyncio
+async def test_unlock_users(sqlite_session_builder, generated_project_id):
+    async with sqlite_session_builder() as session:
+        session.add_all([User(login=f"user{i}", hashed_password="hash", project_id=generated_project_id,
+                              env=Environment.PROD, domain=Domain.REGULAR) for i in range(3)])
+        await session.commit()
+
+    claimed = await LockRepository.lock_users(sqlite_session_builder, 2, project_id=generated_project_id)
+    locks = [(claimed[0].id, claimed[0].lock_token), (claimed[1].id, claimed[1].lock_token + 1), (uuid4(), 1)]
+    released = await LockRepository.unlock_users(sqlite_session_builder, locks)
+
+    assert [user.id for user in released] == [claimed[0].id]
+    assert len(await LockRepository.lock_users(sqlite_session_builder, 3, project_id=generated_project_id)) == 2
+
+    released = await LockRepository.unlock_users(sqlite_session_builder, [(claimed[1].id, claimed[1].lock_token)])
+
+    assert [user.id for user in released] == [claimed[1].id]
+
+
+@pytest.mark.asyncio
+async def test_try_lock_user_with_ttl_sets_lease(sqlite_session_builder, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    await LockRepository.try_lock_user(sqlite_session_builder, sample_user.id, ttl=60)
+
+    async with sqlite_session_builder() as session:
+        user = await session.get(User, sample_user.id)
+
+    assert user.lease_expires_at is not None
+    assert (user.lease_expires_at - user.locktime).total_seconds() == 60
+
+
+@pytest.mark.asyncio
+async def test_try_lock_user_takes_over_expired_lease(sqlite_session_builder, locked_user):
+    locked_user.lease_expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    async with sqlite_session_builder() as session:
+        session.add(locked_user)
+        await session.commit()
+
+    result = await LockRepository.try_lock_user(sqlite_session_builder, locked_user.id)
+
+    assert result is not None
+
+
+@pytest.mark.asyncio
+async def test_release_expired_locks(sqlite_session_builder, generated_project_id):
+    now = datetime.now(timezone.utc)
+    expired = [User(login=f"expired{i}", hashed_password="hash", project_id=generated_project_id,
+                    env=Environment.PROD, domain=Domain.REGULAR, locktime=now - timedelta(minutes=5),
+                    lease_expires_at=now - timedelta(minutes=1)) for i in range(3)]
+    active = User(login="active", hashed_password="hash", project_id=generated_project_id, env=Environment.PROD,
+                  domain=Domain.REGULAR, locktime=now, lease_expires_at=now + timedelta(minutes=5))
+
+    async with sqlite_session_builder() as session:
+        session.add_all(expired + [active])
+        await session.commit()
+
+    first_batch = await LockRepository.release_expired_locks(sqlite_session_builder, batch_size=2)
+    second_batch = await LockRepository.release_expired_locks(sqlite_session_builder, batch_size=2)
+
+    assert len(first_batch) == 2
+    assert len(second_batch) == 1
+    assert {user.id for user in first_batch + second_batch} == {user.id for user in expired}
+    assert {user.env for user in first_batch} == {Environment.PROD}
+
+
+@pytest.mark.asyncio
+async def test_renew_leases(sqlite_session_builder, generated_project_id):
+    now = datetime.now(timezone.utc)
+    active = [User(login=f"active{i}", hashed_password="hash", project_id=generated_project_id,
+                   env=Environment.PROD, domain=Domain.REGULAR, locktime=now,
+                   lease_expires_at=now + timedelta(seconds=5), lock_token=3) for i in range(2)]
+    stale = User(login="stale", hashed_password="hash", project_id=generated_project_id, env=Environment.PROD,
+                 domain=Domain.REGULAR, locktime=now, lease_expires_at=now + timedelta(seconds=5), lock_token=4)
+    expired = User(login="expired", hashed_password="hash", project_id=generated_project_id, env=Environment.PROD,
+                   domain=Domain.REGULAR, locktime=now, lease_expires_at=now - timedelta(seconds=5), lock_token=3)
+    free = User(login="free", hashed_password="hash", project_id=generated_project_id, env=Environment.PROD,
+                domain=Domain.REGULAR, lock_token=3)
+
+    async with sqlite_session_builder() as session:
+        session.add_all(active + [stale, expired, free])
+        await session.commit()
+
+    renewed = await LockRepository.renew_leases(sqlite_session_builder, {60: [(active[0].id, 3), (stale.id, 3),
+                                                                              (expired.id, 3), (free.id, 3)],
+                                                                         120: [(active[1].id, 3)]})
+
+    assert set(renewed) == {(user.id, 3) for user in active}
+
+    async with sqlite_session_builder() as session:
+        user = await session.get(User, active[1].id)
+
+    assert user.lease_expires_at.replace(tzinfo=timezone.utc) > now + timedelta(seconds=100)
+
+
+@pytest.mark.asyncio
+async def test_lock_token_grows_with_every_acquire(sqlite_session_builder, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
 
-    await LockRepository.toggle_user_lock(mock_session_builder, user_id1, should_lock=True)
-    await LockRepository.toggle_user_lock(mock_session_builder, user_id2, should_lock=True)
+    first = await LockRepository.try_lock_user(sqlite_session_builder, sample_user.id)
+    stale_release = await LockRepository.unlock_user(sqlite_session_builder, sample_user.id, first.lock_token - 1)
+    release = await LockRepository.unlock_user(sqlite_session_builder, sample_user.id, first.lock_token)
+    second = await LockRepository.try_lock_user(sqlite_session_builder, sample_user.id)
+    late_release = await LockRepository.unlock_user(sqlite_session_builder, sample_user.id, first.lock_token)
 
-    assert mock_session.commit.call_count == 2
+    assert stale_release is None
+    assert release.id == sample_user.id
+    assert release.project_id == sample_user.project_id
+    assert second.lock_token == first.lock_token + 1
+    assert late_release is None
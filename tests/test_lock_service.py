@@ -1,8 +1,16 @@
+import asyncio
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 
-from src.exceptions.exceptions import UserNotFoundException, UserIsAlreadyLockedException
+from src.exceptions.exceptions import UserNotFoundException, UserIsAlreadyLockedException, NoAvailableUsersException, \
+    NotEnoughAvailableUsersException, UserIsNotLockedException, StaleLockTokenException, TooManyWaitersException
+from src.repositories.lock_repository import LockRepository
+from src.schemas.Request.AcquireAnyUserRequest import AcquireAnyUserRequest
+from src.schemas.Request.AcquireUsersRequest import AcquireUsersRequest
+from src.schemas.Request.UserLockRequest import UserLockRequest
+from src.schemas.Response.LockedUserResponse import LockedUserResponse
 
 
 @pytest.mark.asyncio
@@ -38,9 +46,11 @@ async def test_acquire_lock_user_not_found(lock_service, mock_session_builder, m
 async def test_acquire_lock_user_already_locked(lock_service, mock_session_builder, mock_session, locked_user):
     user_id = locked_user.id
 
-    mock_result = MagicMock()
-    mock_result.scalar_one_or_none.return_value = locked_user
-    mock_session.execute = AsyncMock(return_value=mock_result)
+    lock_result = MagicMock()
+    lock_result.scalar_one_or_none.return_value = None
+    user_result = MagicMock()
+    user_result.scalar_one_or_none.return_value = locked_user
+    mock_session.execute = AsyncMock(side_effect=[lock_result, user_result])
 
     with pytest.raises(UserIsAlreadyLockedException) as exc_info:
         await lock_service.acquire_lock(mock_session_builder, user_id)
@@ -50,17 +60,46 @@ async def test_acquire_lock_user_already_locked(lock_service, mock_session_build
     assert "locktime" in exc_info.value.meta
 
 
+@pytest.mark.asyncio
+async def test_acquire_lock_success_single_query(lock_service, mock_session_builder, mock_session, locked_user):
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = locked_user
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await lock_service.acquire_lock(mock_session_builder, locked_user.id)
+
+    assert result.lock_token == locked_user.lock_token
+    assert mock_session.execute.call_count == 1
+    mock_session.commit.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_acquire_lock_concurrent_only_one_wins(lock_service, sqlite_session_builder, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    results = await asyncio.gather(*[lock_service.acquire_lock(sqlite_session_builder, sample_user.id)
+                                     for _ in range(20)], return_exceptions=True)
+
+    acquired = [result for result in results if isinstance(result, LockedUserResponse)]
+
+    assert len(acquired) == 1
+    assert acquired[0].lock_token == sample_user.lock_token + 1
+    assert all(isinstance(result, UserIsAlreadyLockedException) for result in results if result not in acquired)
+
+
 @pytest.mark.asyncio
 async def test_release_lock_success(lock_service, mock_session_builder, mock_session, locked_user):
     user_id = locked_user.id
 
     mock_result = MagicMock()
-    mock_result.scalar_one_or_none.return_value = locked_user
+    mock_result.one_or_none.return_value = locked_user
     mock_session.execute = AsyncMock(return_value=mock_result)
 
-    await lock_service.release_lock(mock_session_builder, user_id)
+    await lock_service.release_lock(mock_session_builder, user_id, locked_user.lock_token)
 
-    assert mock_session.execute.call_count >= 1
+    assert mock_session.execute.call_count == 1
     mock_session.commit.assert_called()
 
 
@@ -69,11 +108,12 @@ async def test_release_lock_user_not_found(lock_service, mock_session_builder, m
     user_id = uuid4()
 
     mock_result = MagicMock()
+    mock_result.one_or_none.return_value = None
     mock_result.scalar_one_or_none.return_value = None
     mock_session.execute = AsyncMock(return_value=mock_result)
 
     with pytest.raises(UserNotFoundException) as exc_info:
-        await lock_service.release_lock(mock_session_builder, user_id)
+        await lock_service.release_lock(mock_session_builder, user_id, 1)
 
     assert exc_info.value.status_code == 404
     assert exc_info.value.meta["id"] == str(user_id)
@@ -83,11 +123,331 @@ async def test_release_lock_user_not_found(lock_service, mock_session_builder, m
 async def test_release_lock_unlocked_user(lock_service, mock_session_builder, mock_session, sample_user):
     user_id = sample_user.id
 
+    release_result = MagicMock()
+    release_result.one_or_none.return_value = None
+    user_result = MagicMock()
+    user_result.scalar_one_or_none.return_value = sample_user
+    mock_session.execute = AsyncMock(side_effect=[release_result, user_result])
+
+    with pytest.raises(UserIsNotLockedException) as exc_info:
+        await lock_service.release_lock(mock_session_builder, user_id, sample_user.lock_token)
+
+    assert exc_info.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_release_lock_stale_token(lock_service, mock_session_builder, mock_session, locked_user):
+    release_result = MagicMock()
+    release_result.one_or_none.return_value = None
+    user_result = MagicMock()
+    user_result.scalar_one_or_none.return_value = locked_user
+    mock_session.execute = AsyncMock(side_effect=[release_result, user_result])
+
+    with pytest.raises(StaleLockTokenException) as exc_info:
+        await lock_service.release_lock(mock_session_builder, locked_user.id, locked_user.lock_token - 1)
+
+    assert exc_info.value.status_code == 409
+    assert exc_info.value.meta["id"] == str(locked_user.id)
+
+
+@pytest.mark.asyncio
+async def test_acquire_any_success(lock_service, mock_session_builder, mock_session, sample_user):
     mock_result = MagicMock()
     mock_result.scalar_one_or_none.return_value = sample_user
     mock_session.execute = AsyncMock(return_value=mock_result)
 
-    await lock_service.release_lock(mock_session_builder, user_id)
+    result = await lock_service.acquire_any(mock_session_builder,
+                                            AcquireAnyUserRequest(project_id=sample_user.project_id))
 
-    assert mock_session.execute.call_count >= 1
-    mock_session.commit.assert_called()
+    assert result.id == sample_user.id
+    assert mock_session.execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_acquire_any_no_available_users(lock_service, mock_session_builder, mock_session, generated_project_id):
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = None
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    with pytest.raises(NoAvailableUsersException) as exc_info:
+        await lock_service.acquire_any(mock_session_builder, AcquireAnyUserRequest(project_id=generated_project_id))
+
+    assert exc_info.value.status_code == 404
+    assert exc_info.value.meta["project_id"] == str(generated_project_id)
+
+
+@pytest.mark.asyncio
+async def test_acquire_users_best_effort(lock_service, mock_session_builder, mock_session, sample_user):
+    mock_result = MagicMock()
+    mock_result.scalars.return_value.all.return_value = [sample_user]
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await lock_service.acquire_users(mock_session_builder, AcquireUsersRequest(count=5))
+
+    assert len(result) == 1
+    assert result[0].id == sample_user.id
+    mock_session.commit.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_acquire_users_all_or_nothing_not_enough(lock_service, mock_session_builder, mock_session, sample_user):
+    mock_result = MagicMock()
+    mock_result.scalars.return_value.all.return_value = [sample_user]
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    with pytest.raises(NotEnoughAvailableUsersException) as exc_info:
+        await lock_service.acquire_users(mock_session_builder, AcquireUsersRequest(count=5, all_or_nothing=True))
+
+    assert exc_info.value.status_code == 409
+    assert exc_info.value.meta["count"] == 5
+    mock_session.rollback.assert_called_once()
+    mock_session.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_release_users(lock_service, mock_session_builder, mock_session, locked_user):
+    user_ids = [locked_user.id, uuid4()]
+
+    mock_result = MagicMock()
+    mock_result.all.return_value = [locked_user]
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await lock_service.release_users(mock_session_builder,
+                                              [UserLockRequest(user_id=user_id, lock_token=1) for user_id in user_ids])
+
+    assert result == user_ids[:1]
+    mock_session.execute.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_acquire_lock_uses_default_ttl(lock_service, mock_session_builder, monkeypatch, locked_user):
+    monkeypatch.setattr('src.config.settings.LOCK_DEFAULT_TTL', 30)
+    lock_service._lock_repository.try_lock_user = AsyncMock(return_value=locked_user)
+
+    await lock_service.acquire_lock(mock_session_builder, locked_user.id)
+    await lock_service.acquire_lock(mock_session_builder, locked_user.id, ttl=5)
+
+    assert lock_service._lock_repository.try_lock_user.call_args_list[0].kwargs["ttl"] == 30
+    assert lock_service._lock_repository.try_lock_user.call_args_list[1].kwargs["ttl"] == 5
+
+
+@pytest.mark.asyncio
+async def test_renew_lock_coalesces_heartbeats(lock_service, mock_session_builder):
+    locks = [(uuid4(), 1) for _ in range(50)]
+    lock_service._lock_repository.renew_leases = AsyncMock(return_value=locks)
+
+    await asyncio.gather(*[lock_service.renew_lock(mock_session_builder, user_id, lock_token, 30)
+                           for user_id, lock_token in locks])
+
+    lock_service._lock_repository.renew_leases.assert_called_once_with(mock_session_builder, {30: locks})
+
+
+@pytest.mark.asyncio
+async def test_renew_lock_user_not_locked(lock_service, mock_session_builder, mock_session, sample_user):
+    lock_service._lock_repository.renew_leases = AsyncMock(return_value=[])
+
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = sample_user
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    with pytest.raises(UserIsNotLockedException) as exc_info:
+        await lock_service.renew_lock(mock_session_builder, sample_user.id, sample_user.lock_token, 30)
+
+    assert exc_info.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_renew_lock_user_not_found(lock_service, mock_session_builder, mock_session):
+    lock_service._lock_repository.renew_leases = AsyncMock(return_value=[])
+
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = None
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    with pytest.raises(UserNotFoundException):
+        await lock_service.renew_lock(mock_session_builder, uuid4(), 1, 30)
+
+
+@pytest.mark.asyncio
+async def test_renew_lock_stale_token(lock_service, mock_session_builder, mock_session, locked_user):
+    lock_service._lock_repository.renew_leases = AsyncMock(return_value=[])
+
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = locked_user
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    with pytest.raises(StaleLockTokenException):
+        await lock_service.renew_lock(mock_session_builder, locked_user.id, locked_user.lock_token + 1, 30)
+
+
+@pytest.mark.asyncio
+async def test_renew_lock_expired_lease(lock_service, mock_session_builder, mock_session, locked_user):
+    lock_service._lock_repository.renew_leases = AsyncMock(return_value=[])
+
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none.return_value = locked_user
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    with pytest.raises(UserIsNotLockedException) as exc_info:
+        await lock_service.renew_lock(mock_session_builder, locked_user.id, locked_user.lock_token, 30)
+
+    assert exc_info.value.message == "Lease has expired"
+
+
+@pytest.mark.asyncio
+async def test_acquire_any_uses_availability_index(lock_service, sqlite_session_builder, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    await lock_service.rebuild_availability_index(sqlite_session_builder)
+    request = AcquireAnyUserRequest(project_id=sample_user.project_id, env=sample_user.env, domain=sample_user.domain)
+
+    acquired = await lock_service.acquire_any(sqlite_session_builder, request)
+
+    assert acquired.id == sample_user.id
+
+    with pytest.raises(NoAvailableUsersException):
+        await lock_service.acquire_any(sqlite_session_builder, request)
+
+    await lock_service.release_lock(sqlite_session_builder, acquired.id, acquired.lock_token)
+
+    assert (await lock_service.acquire_any(sqlite_session_builder, request)).id == sample_user.id
+
+
+@pytest.mark.asyncio
+async def test_acquire_any_stale_index_candidate_falls_back_to_db(lock_service, sqlite_session_builder,
+                                                                  availability_index, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    await lock_service.rebuild_availability_index(sqlite_session_builder)
+    bucket = (sample_user.project_id, sample_user.env, sample_user.domain)
+    # User locked by another worker is still free in this worker's index
+    await LockRepository.try_lock_user(sqlite_session_builder, sample_user.id)
+    availability_index.add_user(uuid4(), bucket)
+
+    with pytest.raises(NoAvailableUsersException):
+        await lock_service.acquire_any(sqlite_session_builder, AcquireAnyUserRequest(project_id=bucket[0],
+                                                                                     env=bucket[1],
+                                                                                     domain=bucket[2]))
+
+    assert availability_index.pick(bucket) is None
+
+
+@pytest.mark.asyncio
+async def test_acquire_any_waits_for_released_user(lock_service, sqlite_session_builder, user_waiters, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    request = AcquireAnyUserRequest(project_id=sample_user.project_id, wait_timeout=5)
+    first = await lock_service.acquire_any(sqlite_session_builder, request)
+    waiting = [asyncio.create_task(lock_service.acquire_any(sqlite_session_builder, request)) for _ in range(2)]
+
+    while user_waiters.parked < 2:
+        await asyncio.sleep(0.01)
+
+    # Let both requests finish their first claim attempt and park
+    await asyncio.sleep(0.1)
+    await lock_service.release_lock(sqlite_session_builder, first.id, first.lock_token)
+    second = await waiting[0]
+
+    assert second.lock_token == first.lock_token + 1
+    assert not waiting[1].done()
+
+    await lock_service.release_lock(sqlite_session_builder, second.id, second.lock_token)
+
+    assert (await waiting[1]).lock_token == second.lock_token + 1
+    assert user_waiters.parked == 0
+
+
+@pytest.mark.asyncio
+async def test_unsatisfied_all_or_nothing_waiter_passes_wake_on(lock_service, sqlite_session_builder, user_waiters,
+                                                                sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    locked = await lock_service.acquire_any(sqlite_session_builder,
+                                            AcquireAnyUserRequest(project_id=sample_user.project_id))
+    waiting_users = asyncio.create_task(lock_service.acquire_users(sqlite_session_builder, AcquireUsersRequest(
+        count=2, all_or_nothing=True, project_id=sample_user.project_id, wait_timeout=0.5)))
+
+    while user_waiters.parked < 1:
+        await asyncio.sleep(0.01)
+
+    waiting_any = asyncio.create_task(lock_service.acquire_any(
+        sqlite_session_builder, AcquireAnyUserRequest(project_id=sample_user.project_id, wait_timeout=5)))
+
+    while user_waiters.parked < 2:
+        await asyncio.sleep(0.01)
+
+    await asyncio.sleep(0.1)
+    await lock_service.release_lock(sqlite_session_builder, locked.id, locked.lock_token)
+
+    assert (await asyncio.wait_for(waiting_any, 0.3)).id == sample_user.id
+
+    with pytest.raises(NotEnoughAvailableUsersException):
+        await waiting_users
+
+
+@pytest.mark.asyncio
+async def test_free_user_is_acquired_while_waiters_are_full(lock_service, sqlite_session_builder, user_waiters,
+                                                            sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    # Another, exhausted bucket has taken every waiter slot
+    with pytest.raises(TooManyWaitersException):
+        while True:
+            user_waiters.park(user_waiters.enqueue((uuid4(), None, None)))
+
+    request = AcquireAnyUserRequest(project_id=sample_user.project_id, wait_timeout=1)
+
+    user = await lock_service.acquire_any(sqlite_session_builder, request)
+
+    assert user.id == sample_user.id
+
+    with pytest.raises(TooManyWaitersException):
+        await lock_service.acquire_any(sqlite_session_builder, request)
+
+
+async def release_elsewhere(session_builder, user, delay):
+    # Release by another worker: db is updated, but no local event wakes the waiters
+    await asyncio.sleep(delay)
+    await LockRepository.unlock_user(session_builder, user.id, user.lock_token)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("poll_interval, wait_timeout", [(0.05, 5), (10, 0.2)])
+async def test_acquire_waiting_sees_users_freed_by_other_workers(lock_service, sqlite_session_builder, monkeypatch,
+                                                                 locked_user, poll_interval, wait_timeout):
+    monkeypatch.setattr('src.config.settings.ACQUIRE_WAIT_POLL_INTERVAL', poll_interval)
+
+    async with sqlite_session_builder() as session:
+        session.add(locked_user)
+        await session.commit()
+
+    request = AcquireAnyUserRequest(project_id=locked_user.project_id, wait_timeout=wait_timeout)
+    release = asyncio.create_task(release_elsewhere(sqlite_session_builder, locked_user, 0.1))
+
+    user = await asyncio.wait_for(lock_service.acquire_any(sqlite_session_builder, request), 1)
+    await release
+
+    assert user.id == locked_user.id
+
+
+@pytest.mark.asyncio
+async def test_acquire_waiting_times_out(lock_service, sqlite_session_builder, user_waiters, generated_project_id):
+    with pytest.raises(NoAvailableUsersException):
+        await lock_service.acquire_any(sqlite_session_builder,
+                                       AcquireAnyUserRequest(project_id=generated_project_id, wait_timeout=0.05))
+
+    with pytest.raises(NotEnoughAvailableUsersException):
+        await lock_service.acquire_users(sqlite_session_builder,
+                                         AcquireUsersRequest(count=2, all_or_nothing=True, wait_timeout=0.05))
+
+    assert user_waiters.parked == 0
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from sqlalchemy.exc import DBAPIError
+
+from src.exceptions.exceptions import NoAvailableUsersException, StaleLockTokenException, \
+    UserIsAlreadyLockedException
+from src.models.user import User
+from src.repositories.lock_repository import LockRepository
+from src.schemas.Request.AcquireAnyUserRequest import AcquireAnyUserRequest
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.services.lock_write_batcher import LockWriteBatcher
+
+
+@pytest.fixture(autouse=True)
+def lock_write_batching(monkeypatch):
+    monkeypatch.setattr('src.config.settings.LOCK_WRITE_BATCHING_ENABLED', True)
+
+
+async def add_users(session_builder, project_id, count) -> list[User]:
+    users = [User(login=str(uuid4()), hashed_password="hash", project_id=project_id, env=Environment.PROD,
+                  domain=Domain.REGULAR) for _ in range(count)]
+
+    async with session_builder() as session:
+        session.add_all(users)
+        await session.commit()
+
+    return users
+
+
+@pytest.fixture
+def counted_batches(lock_repository, monkeypatch):
+    batches = []
+    apply_lock_batch = lock_repository.apply_lock_batch
+
+    async def counted_apply_lock_batch(*args):
+        batches.append(args[1:])
+        return await apply_lock_batch(*args)
+
+    monkeypatch.setattr(lock_repository, 'apply_lock_batch', counted_apply_lock_batch)
+
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_concurrent_acquires_are_written_by_one_transaction(db_session_builder, lock_service, counted_batches,
+                                                                  generated_project_id):
+    user, = await add_users(db_session_builder, generated_project_id, 1)
+
+    results = await asyncio.gather(*(lock_service.acquire_lock(db_session_builder, user.id) for _ in range(10)),
+                                   return_exceptions=True)
+
+    assert sum(not isinstance(result, Exception) for result in results) == 1
+    assert sum(isinstance(result, UserIsAlreadyLockedException) for result in results) == 9
+    assert len(counted_batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_batched_claims_split_free_users(db_session_builder, lock_service, counted_batches,
+                                               generated_project_id):
+    users = await add_users(db_session_builder, generated_project_id, 5)
+    request = AcquireAnyUserRequest(project_id=generated_project_id, env=Environment.PROD, domain=Domain.REGULAR)
+
+    results = await asyncio.gather(*(lock_service.acquire_any(db_session_builder, request) for _ in range(8)),
+                                   return_exceptions=True)
+    acquired = [result.id for result in results if not isinstance(result, Exception)]
+
+    assert sorted(acquired) == sorted(user.id for user in users)
+    assert sum(isinstance(result, NoAvailableUsersException) for result in results) == 3
+    # Claims with equal filters are one statement
+    assert counted_batches[0][2] == [(generated_project_id, Environment.PROD, Domain.REGULAR, None, 8)]
+
+
+@pytest.mark.asyncio
+async def test_release_frees_user_for_lock_in_same_batch(db_session_builder, lock_service, counted_batches,
+                                                         generated_project_id):
+    user, = await add_users(db_session_builder, generated_project_id, 1)
+    lock = await lock_service.acquire_lock(db_session_builder, user.id)
+
+    stale_release, release, relock = await asyncio.gather(
+        lock_service.release_lock(db_session_builder, user.id, lock.lock_token - 1),
+        lock_service.release_lock(db_session_builder, user.id, lock.lock_token),
+        lock_service.acquire_lock(db_session_builder, user.id), return_exceptions=True)
+
+    assert isinstance(stale_release, StaleLockTokenException)
+    assert release is None
+    assert relock.lock_token == lock.lock_token + 1
+    assert len(counted_batches) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_fails_every_caller(mock_session_builder):
+    lock_repository = MagicMock(spec=LockRepository)
+    lock_repository.apply_lock_batch = AsyncMock(side_effect=RuntimeError('connection lost'))
+    batcher = LockWriteBatcher(lock_repository, window=0.01, max_batch_size=100)
+
+    results = await asyncio.gather(batcher.lock(mock_session_builder, uuid4(), None),
+                                   batcher.release(mock_session_builder, uuid4(), 1), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    lock_repository.apply_lock_batch.assert_awaited_once()
+
+
+class Deadlock(Exception):
+    sqlstate = '40P01'
+
+
+@pytest.mark.asyncio
+async def test_deadlocked_batch_is_retried(mock_session_builder, sample_user):
+    lock_repository = MagicMock(spec=LockRepository)
+    lock_repository.apply_lock_batch = AsyncMock(side_effect=[DBAPIError('UPDATE users', None, Deadlock()),
+                                                              ([], [sample_user], [])])
+    batcher = LockWriteBatcher(lock_repository, window=0.01, max_batch_size=100)
+
+    locked, released = await asyncio.gather(batcher.lock(mock_session_builder, sample_user.id, None),
+                                            batcher.release(mock_session_builder, uuid4(), 1))
+
+    assert locked is sample_user
+    assert released is None
+    assert lock_repository.apply_lock_batch.await_count == 2
@@ -0,0 +1,99 @@
+import pytest
+from uuid import uuid4
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.db.database import get_db, instrument_statements
+from src.handlers.main import app
+from src.services.lock_service import LockService
+from src.utils.metrics import Counter, Gauge, LabeledHistogram, render_metrics
+from src.utils.timing import LAYER_DURATION, timed, timed_methods
+
+
+def test_render_metrics_in_prometheus_text_format():
+    counter = Counter('test_total', 'Test counter', registered=False)
+    counter.inc(3)
+    gauge = Gauge('test_gauge', 'Test gauge', registered=False)
+    gauge.set(2)
+    histogram = LabeledHistogram('test_seconds', 'Test histogram', ('layer',), buckets=(0.1, 1.0))
+    histogram.labels('d"b').observe(0.5)
+
+    lines = render_metrics([counter, gauge, histogram]).splitlines()
+
+    assert lines[:4] == ['# HELP test_total Test counter', '# TYPE test_total counter', 'test_total 3',
+                         '# HELP test_gauge Test gauge']
+    assert 'test_seconds_bucket{layer="d\\"b",le="0.1"} 0' in lines
+    assert 'test_seconds_bucket{layer="d\\"b",le="1.0"} 1' in lines
+    assert 'test_seconds_bucket{layer="d\\"b",le="+Inf"} 1' in lines
+    assert 'test_seconds_count{layer="d\\"b"} 1' in lines
+
+
+@pytest.mark.asyncio
+async def test_timed_methods_record_static_and_bound_coroutines():
+    @timed_methods('repository')
+    class Repository:
+        @staticmethod
+        async def load(value):
+            return value
+
+        async def save(self, value):
+            return value
+
+        def sync(self, value):
+            return value
+
+    load = LAYER_DURATION.labels('repository', 'Repository.load')
+    save = LAYER_DURATION.labels('repository', 'Repository.save')
+
+    assert await Repository.load(1) == 1
+    assert await Repository().save(2) == 2
+    assert Repository().sync(3) == 3
+    assert (load.count, save.count) == (1, 1)
+
+
+def test_disabled_timing_leaves_function_untouched(monkeypatch):
+    monkeypatch.setattr('src.config.settings.LATENCY_METRICS_ENABLED', False)
+
+    async def handler():
+        pass
+
+    assert timed('handler')(handler) is handler
+
+
+@pytest.mark.asyncio
+async def test_statements_are_timed_by_kind(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'botopia.db'}")
+    instrument_statements(engine.sync_engine)
+    selects = LAYER_DURATION.labels('db', 'SELECT')
+    count = selects.count
+
+    async with engine.connect() as connection:
+        await connection.execute(select(1))
+
+        with pytest.raises(Exception):
+            await connection.exec_driver_sql('SELECT * FROM missing')
+
+        assert connection.sync_connection.info['statement_started_at'] == []
+
+    assert selects.count == count + 1
+
+    await engine.dispose()
+
+
+def test_metrics_endpoint_exposes_layer_histograms(mock_session_builder, mock_lock_service):
+    app.dependency_overrides[get_db] = lambda: mock_session_builder
+    app.dependency_overrides[LockService] = lambda: mock_lock_service
+    client = TestClient(app)
+
+    client.post('/api/v1/lock/acquire_lock', json={'user_id': str(uuid4())})
+    response = client.get('/metrics')
+
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'botopia_layer_duration_seconds_count{layer="request",operation="/api/v1/lock/acquire_lock"} ' \
+           in response.text
+    assert 'botopia_layer_duration_seconds_count{layer="handler",operation="acquire_lock_handler"} ' in response.text
+    assert '# TYPE db_pool_checkout_wait_seconds histogram' in response.text
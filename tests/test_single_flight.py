@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.db.database import DeadlineSession
+from src.exceptions.exceptions import RequestDeadlineExceededException
+from src.schemas.Request.GetUsersRequest import GetUsersRequest
+from src.utils import deadline
+from src.utils.metrics import Counter, Histogram
+from src.utils.single_flight import SingleFlight
+
+
+def single_flight(ttl: float = 0) -> SingleFlight:
+    return SingleFlight(ttl=ttl, executed=Counter('executed', '', registered=False),
+                        coalesced=Counter('coalesced', '', registered=False),
+                        callers=Histogram('callers', '', buckets=(1, 5, 10), registered=False))
+
+
+class SlowCall:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, result='rows', error: Exception | None = None):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+
+        if error is not None:
+            raise error
+
+        return result
+
+
+@pytest.mark.asyncio
+async def test_concurrent_equal_keys_share_one_call():
+    flights = single_flight()
+    call = SlowCall()
+
+    results = await asyncio.gather(*[flights.do('key', call) for _ in range(10)],
+                                   flights.do('other', lambda: call('other rows')))
+
+    assert results == ['rows'] * 10 + ['other rows']
+    assert call.calls == 2
+    assert (flights._executed.value, flights._coalesced.value) == (2, 9)
+    assert flights._callers.bucket_counts == [1, 1, 2]
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_failure_is_shared_but_not_kept():
+    flights = single_flight(ttl=60)
+    call = SlowCall()
+
+    results = await asyncio.gather(*[flights.do('key', lambda: call(error=ValueError('db is down')))
+                                     for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert await flights.do('key', call) == 'rows'
+    assert call.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_ttl_extends_sharing_after_call_finished():
+    flights = single_flight(ttl=0.05)
+    call = SlowCall()
+
+    await flights.do('key', call)
+    await flights.do('key', call)
+    assert call.calls == 1
+
+    await asyncio.sleep(0.06)
+    await flights.do('key', call)
+    assert call.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flights = single_flight()
+    call = SlowCall()
+
+    first = asyncio.create_task(flights.do('key', call))
+    second = asyncio.create_task(flights.do('key', call))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == 'rows'
+    assert call.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_get_users_requests_share_query(user_service, user_repository, sqlite_session_builder,
+                                                        monkeypatch):
+    project_id = uuid4()
+    calls = []
+    get_filtered_rows = user_repository.get_filtered_rows
+
+    async def counted_get_filtered_rows(*args, **kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.01)
+        return await get_filtered_rows(*args, **kwargs)
+
+    monkeypatch.setattr(user_repository, 'get_filtered_rows', counted_get_filtered_rows)
+    # Same filters spelled differently are normalized by request parsing
+    requests = [GetUsersRequest.model_validate({'project_id': str(project_id).upper(), 'env': 'prod'}),
+                GetUsersRequest(project_id=project_id, env='prod', only_available=False)]
+
+    results = await asyncio.gather(*[user_service.get_users_json(sqlite_session_builder, request)
+                                     for request in requests * 5])
+
+    assert results == [b'[]'] * 10
+    assert len(calls) == 1
+
+    monkeypatch.setattr('src.config.settings.GET_USERS_COALESCING_ENABLED', False)
+    await asyncio.gather(*[user_service.get_users_json(sqlite_session_builder, request) for request in requests])
+
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_shared_get_users_query_keeps_request_deadline(user_service, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'botopia.db'}")
+    session_builder = async_sessionmaker(engine, sync_session_class=DeadlineSession)
+
+    deadline.set_deadline(-1)
+
+    with pytest.raises(RequestDeadlineExceededException):
+        await user_service.get_users(session_builder, GetUsersRequest(project_id=uuid4()))
+
+    await engine.dispose()
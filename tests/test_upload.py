@@ -0,0 +1,97 @@
+import pytest
+from uuid import uuid4
+
+from src.exceptions.exceptions import InvalidUploadException
+from src.schemas.Shared.Environment import Environment
+from src.utils.upload import iter_lines, parse_users_upload
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_across_chunks():
+    lines = [line async for line in iter_lines(stream(b'first\nsec', b'ond\n\nthi', b'rd'))]
+
+    assert lines == ["first", "second", "third"]
+
+
+@pytest.mark.asyncio
+async def test_parse_ndjson_upload():
+    project_id = uuid4()
+    body = (f'{{"login":"user1","password":"p1","project_id":"{project_id}","env":"prod","domain":"canary"}}\n'
+            f'{{"login":"user2","password":"p2","project_id":"{project_id}","env":"stage","domain":"regular"}}\n')
+
+    users = [user async for user in parse_users_upload("application/x-ndjson", stream(body.encode()))]
+
+    assert [user.login for user in users] == ["user1", "user2"]
+    assert users[1].env == Environment.STAGE
+
+
+@pytest.mark.asyncio
+async def test_parse_csv_upload():
+    project_id = uuid4()
+    body = f'login,password,project_id,env,domain\nuser1,p1,{project_id},prod,canary\n'
+
+    users = [user async for user in parse_users_upload("text/csv; charset=utf-8", stream(body.encode()))]
+
+    assert len(users) == 1
+    assert users[0].project_id == project_id
+
+
+@pytest.mark.asyncio
+async def test_parse_upload_invalid_line():
+    body = b'{"login":"user1"}\n'
+
+    with pytest.raises(InvalidUploadException) as exc_info:
+        [user async for user in parse_users_upload("application/x-ndjson", stream(body))]
+
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.meta["line"] == 1
+
+
+def test_parse_upload_unsupported_content_type():
+    with pytest.raises(InvalidUploadException):
+        parse_users_upload("application/xml", stream(b''))
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_rejects_too_long_line():
+    with pytest.raises(InvalidUploadException) as exc_info:
+        [line async for line in iter_lines(stream(b'short\n', b'x' * 8, b'x' * 8), max_line_length=10)]
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_rejects_invalid_utf8():
+    with pytest.raises(InvalidUploadException) as exc_info:
+        [line async for line in iter_lines(stream(b'first\n\nsec', b'ond \xff\nthird'))]
+
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.meta["line"] == 3
+
+
+@pytest.mark.asyncio
+async def test_parse_csv_upload_quoted_line_break():
+    project_id = uuid4()
+    body = (f'login,password,project_id,env,domain\n"user\n1","p,""1""",{project_id},prod,canary\n'
+            f'\nuser2,p2,{project_id},')
+
+    users = [user async for user in parse_users_upload("text/csv", stream(body.encode()[:50], body.encode()[50:],
+                                                                          b'stage,regular\n'))]
+
+    assert [user.login for user in users] == ["user\n1", "user2"]
+    assert users[0].password == 'p,"1"'
+
+
+@pytest.mark.asyncio
+async def test_parse_csv_upload_unterminated_quote():
+    body = b'login,password,project_id,env,domain\n"user1,p1\n'
+
+    with pytest.raises(InvalidUploadException) as exc_info:
+        [user async for user in parse_users_upload("text/csv", stream(body))]
+
+    assert exc_info.value.meta["line"] == 2
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from uuid import uuid4
+
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_event_stream import UserEventStream
+from src.services.user_events import UserEvent
+
+
+@pytest.fixture
+def bucket():
+    return uuid4(), Environment.PROD, Domain.CANARY
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_matching_events(bucket):
+    event_stream = UserEventStream(queue_size=10, heartbeat_interval=5)
+    frames = event_stream.stream((bucket[0], None, None))
+
+    assert await anext(frames) == b': connected\n\n'
+
+    next_frame = asyncio.create_task(anext(frames))
+    await asyncio.sleep(0)
+    event = UserEvent(uuid4(), UserEventType.LOCKED, bucket)
+    event_stream.apply_events([UserEvent(uuid4(), UserEventType.LOCKED, (uuid4(), bucket[1], bucket[2])), event])
+
+    frame = (await next_frame).decode()
+
+    assert frame.startswith("event: locked\ndata: ")
+    assert str(event.user_id) in frame and frame.count("event:") == 1
+
+    await frames.aclose()
+
+    assert len(event_stream) == 0
+
+
+@pytest.mark.asyncio
+async def test_idle_stream_gets_keepalive(bucket):
+    event_stream = UserEventStream(queue_size=10, heartbeat_interval=0.01)
+    frames = event_stream.stream((None, None, None))
+    await anext(frames)
+
+    assert await anext(frames) == b': keepalive\n\n'
+
+    await frames.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped(bucket):
+    event_stream = UserEventStream(queue_size=2, heartbeat_interval=5)
+    slow, fast = event_stream.stream((None, None, None)), event_stream.stream((None, None, None))
+    await anext(slow)
+    await anext(fast)
+
+    for event_type in (UserEventType.CREATED, UserEventType.LOCKED):
+        event_stream.apply_events([UserEvent(uuid4(), event_type, bucket)])
+        assert (await anext(fast)).startswith(f"event: {event_type.value}".encode())
+
+    event_stream.apply_events([UserEvent(uuid4(), UserEventType.RELEASED, bucket)])
+
+    assert (await anext(slow)).startswith(b"event: dropped")
+
+    with pytest.raises(StopAsyncIteration):
+        await anext(slow)
+
+    assert len(event_stream) == 1
+
+    await fast.aclose()
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_event_listener import UserEventListener, NOTIFICATION_LAG
+from src.services.user_events import UserEvent, UserEventBus, encode_events, decode_events, EVENTS_PER_PAYLOAD
+
+
+@pytest.fixture
+def notification_repository():
+    repository = MagicMock()
+    repository.notify = AsyncMock()
+    return repository
+
+
+@pytest.fixture
+def notifying_bus(notification_repository, monkeypatch):
+    monkeypatch.setattr('src.config.settings.USER_EVENTS_NOTIFY_ENABLED', True)
+    return UserEventBus(notification_repository, worker_id="worker")
+
+
+def test_encode_decode_round_trip():
+    events = [UserEvent(uuid4(), UserEventType.CREATED, (uuid4(), Environment.PROD, Domain.CANARY)),
+              UserEvent(uuid4(), UserEventType.RELEASED)]
+
+    payload = encode_events("worker", 123.5, events)
+
+    assert len(encode_events("worker", time.time(), events * (EVENTS_PER_PAYLOAD // 2))) < 8000
+    assert decode_events(payload) == ("worker", 123.5, events)
+
+
+@pytest.mark.asyncio
+async def test_publish_applies_locally_and_notifies_in_background(notifying_bus, notification_repository,
+                                                                  mock_session_builder):
+    received = []
+    notifying_bus.subscribe(received.extend)
+    events = [UserEvent(uuid4(), UserEventType.LOCKED) for _ in range(EVENTS_PER_PAYLOAD + 1)]
+
+    notifying_bus.publish(mock_session_builder, events[:1])
+    notifying_bus.publish(mock_session_builder, events[1:])
+
+    assert received == events
+    notification_repository.notify.assert_not_called()
+
+    await asyncio.sleep(0)
+
+    notification_repository.notify.assert_called_once()
+    session_builder, channel, payloads = notification_repository.notify.call_args.args
+
+    assert session_builder is mock_session_builder
+    assert [event for payload in payloads for event in decode_events(payload)[2]] == events
+    assert len(payloads) == 2
+
+
+@pytest.mark.asyncio
+async def test_publish_without_notifications(notification_repository, mock_session_builder):
+    bus = UserEventBus(notification_repository)
+
+    assert not bus.active
+
+    bus.publish(mock_session_builder, [UserEvent(uuid4(), UserEventType.LOCKED)])
+    await asyncio.sleep(0)
+
+    notification_repository.notify.assert_not_called()
+
+
+def test_listener_applies_only_other_workers_events(notifying_bus):
+    received = []
+    notifying_bus.subscribe(received.extend)
+    listener = UserEventListener("postgresql://localhost/db", notifying_bus, channel="events", reconnect_interval=1,
+                                 keepalive_interval=1)
+    events = [UserEvent(uuid4(), UserEventType.EXPIRED)]
+    lag_count = NOTIFICATION_LAG.count
+
+    listener.handle_notification(None, 1, "events", encode_events("worker", time.time(), events))
+    listener.handle_notification(None, 1, "events", encode_events("other", time.time() - 0.2, events))
+    listener.handle_notification(None, 1, "events", "not a payload")
+
+    assert received == events
+    assert NOTIFICATION_LAG.count == lag_count + 1
+
+
+@pytest.mark.asyncio
+async def test_listener_resyncs_after_connecting(notifying_bus):
+    resync = AsyncMock()
+    notifying_bus.on_resync(resync)
+    connection = MagicMock()
+    connection.add_listener = AsyncMock()
+    connection.is_closed.side_effect = [False, True, True]
+    connection.fetchval = AsyncMock()
+    listener = UserEventListener("postgresql://localhost/db", notifying_bus, channel="events", reconnect_interval=1,
+                                 keepalive_interval=0)
+
+    with patch('src.services.user_event_listener.asyncpg.connect', AsyncMock(return_value=connection)):
+        await listener.listen()
+
+    connection.add_listener.assert_called_once_with("events", listener.handle_notification)
+    resync.assert_called_once()
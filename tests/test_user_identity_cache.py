@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_events import UserEvent
+from src.services.user_identity_cache import UserIdentityCache, CACHE_HITS, CACHE_MISSES
+
+
+def identity(login):
+    return {"id": uuid4(), "login": login}
+
+
+@pytest.fixture
+def repository():
+    repository = MagicMock()
+    repository.get_filtered_rows = AsyncMock()
+    return repository
+
+
+@pytest.mark.asyncio
+async def test_read_through_by_id_and_login(repository, mock_session_builder):
+    user = identity("user")
+    repository.get_filtered_rows.return_value = [user]
+    cache = UserIdentityCache(repository, max_size=10, ttl=60)
+    hits, misses = CACHE_HITS.value, CACHE_MISSES.value
+
+    assert await cache.get_by_id(mock_session_builder, user["id"]) == user
+    assert await cache.get_by_id(mock_session_builder, user["id"]) == user
+    assert await cache.get_by_login(mock_session_builder, "user") == user
+
+    assert repository.get_filtered_rows.call_count == 1
+    assert "locktime" not in repository.get_filtered_rows.call_args.kwargs["fields"]
+    assert (CACHE_HITS.value - hits, CACHE_MISSES.value - misses) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_missing_users_are_not_cached(repository, mock_session_builder):
+    repository.get_filtered_rows.return_value = []
+    cache = UserIdentityCache(repository, max_size=10, ttl=60)
+
+    assert await cache.get_by_login(mock_session_builder, "user") is None
+    assert await cache.get_by_login(mock_session_builder, "user") is None
+    assert repository.get_filtered_rows.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_ttl(repository, mock_session_builder):
+    users = [identity(f"user{i}") for i in range(3)]
+    repository.get_filtered_rows.side_effect = [[user] for user in users] + [[users[0]]]
+    cache = UserIdentityCache(repository, max_size=2, ttl=60)
+
+    for user in users:
+        await cache.get_by_id(mock_session_builder, user["id"])
+
+    assert len(cache) == 2
+
+    await cache.get_by_login(mock_session_builder, "user0")
+
+    assert repository.get_filtered_rows.call_count == 4
+
+    expiring = UserIdentityCache(repository, max_size=2, ttl=0)
+    repository.get_filtered_rows.side_effect = None
+    repository.get_filtered_rows.return_value = [users[1]]
+
+    await expiring.get_by_id(mock_session_builder, users[1]["id"])
+    await expiring.get_by_id(mock_session_builder, users[1]["id"])
+
+    assert repository.get_filtered_rows.call_count == 6
+
+
+@pytest.mark.asyncio
+async def test_create_events_invalidate(repository, mock_session_builder):
+    user = identity("user")
+    repository.get_filtered_rows.return_value = [user]
+    cache = UserIdentityCache(repository, max_size=10, ttl=60)
+    await cache.get_by_id(mock_session_builder, user["id"])
+
+    cache.apply_events([UserEvent(user["id"], UserEventType.LOCKED)])
+
+    assert len(cache) == 1
+
+    cache.apply_events([UserEvent(user["id"], UserEventType.CREATED)])
+    await cache.get_by_login(mock_session_builder, "user")
+
+    assert repository.get_filtered_rows.call_count == 2
@@ -1,8 +1,14 @@
+from sqlalchemy.exc import IntegrityError
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
+from datetime import datetime, timezone, timedelta
 
+from src.models.user import User
 from src.repositories.user_repository import UserRepository
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
 
 
 @pytest.mark.asyncio
@@ -167,39 +173,86 @@ async def test_get_filtered_users_all_filters(mock_session_builder, mock_session
 
 
 @pytest.mark.asyncio
-async def test_add_users(mock_session_builder, mock_session, sample_user):
-    users = [sample_user]
-    
-    await UserRepository.add_users(mock_session_builder, users)
-    
-    mock_session.add_all.assert_called_once_with(users)
-    mock_session.commit.assert_called_once()
+async def test_get_filtered_users_keyset_pagination(sqlite_session_builder, generated_project_id):
+    created_at = datetime.now(timezone.utc)
+    users = [User(login=f"user{i}", hashed_password="hash", project_id=generated_project_id, env=Environment.PROD,
+                  domain=Domain.REGULAR, created_at=created_at + timedelta(seconds=i // 2)) for i in range(5)]
+
+    async with sqlite_session_builder() as session:
+        session.add_all(users)
+        await session.commit()
+
+    repository = UserRepository()
+    first_page = await repository.get_filtered_users(sqlite_session_builder, limit=3)
+    second_page = await repository.get_filtered_users(sqlite_session_builder, limit=3,
+                                                      after=(first_page[-1].created_at, first_page[-1].id))
+
+    expected = sorted(users, key=lambda user: (user.created_at, user.id))
+
+    assert [user.id for user in first_page + second_page] == [user.id for user in expected]
 
 
 @pytest.mark.asyncio
-async def test_check_existing_logins_found(mock_session_builder, mock_session):
-    logins = ["user1", "user2", "user3"]
-    existing_logins = ["user1", "user3"]
-    
-    mock_result = MagicMock()
-    mock_result.scalars.return_value.all.return_value = existing_logins
-    mock_session.execute = AsyncMock(return_value=mock_result)
-    
-    result = await UserRepository.check_existing_logins(mock_session_builder, logins)
-    
-    assert result == existing_logins
-    assert len(result) == 2
+async def test_stream_filtered_users(sqlite_session_builder, generated_project_id):
+    async with sqlite_session_builder() as session:
+        session.add_all([User(login=f"user{i}", hashed_password="hash", project_id=generated_project_id,
+                              env=Environment.PROD, domain=Domain.REGULAR) for i in range(5)])
+        session.add(User(login="other", hashed_password="hash", project_id=uuid4(), env=Environment.PROD,
+                         domain=Domain.REGULAR))
+        await session.commit()
+
+    batches = [rows async for rows in UserRepository.stream_filtered_users(sqlite_session_builder, batch_size=2,
+                                                                           project_id=generated_project_id)]
+
+    assert [len(rows) for rows in batches] == [2, 2, 1]
+    assert {row["login"] for rows in batches for row in rows} == {f"user{i}" for i in range(5)}
+    assert "hashed_password" not in batches[0][0]
 
 
 @pytest.mark.asyncio
-async def test_check_existing_logins_not_found(mock_session_builder, mock_session):
-    logins = ["new_user1", "new_user2"]
-    
-    mock_result = MagicMock()
-    mock_result.scalars.return_value.all.return_value = []
-    mock_session.execute = AsyncMock(return_value=mock_result)
-    
-    result = await UserRepository.check_existing_logins(mock_session_builder, logins)
-    
-    assert result == []
-    assert len(result) == 0
+async def test_get_filtered_rows_projection(sqlite_session_builder, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    rows = await UserRepository.get_filtered_rows(sqlite_session_builder, fields=["login", "env"],
+                                                  project_id=sample_user.project_id)
+    by_id = await UserRepository.get_filtered_rows(sqlite_session_builder, user_id=sample_user.id)
+    missing = await UserRepository.get_filtered_rows(sqlite_session_builder, login="missing")
+
+    assert [dict(row) for row in rows] == [{"login": sample_user.login, "env": Environment.PROD}]
+    assert by_id[0]["id"] == sample_user.id
+    assert "hashed_password" not in by_id[0]
+    assert missing == []
+
+
+async def user_chunks(project_id, logins_chunks):
+    for logins in logins_chunks:
+        yield [{"id": uuid4(), "created_at": datetime.now(timezone.utc), "login": login, "hashed_password": "hash",
+                "project_id": project_id, "env": Environment.PROD, "domain": Domain.REGULAR} for login in logins]
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert_users(db_session_builder, generated_project_id):
+    inserted = await UserRepository.bulk_insert_users(db_session_builder,
+                                                      user_chunks(generated_project_id, [["a", "b"], ["c"]]))
+
+    rows = await UserRepository.get_filtered_rows(db_session_builder, fields=["login"],
+                                                  project_id=generated_project_id)
+
+    assert inserted == 3
+    assert sorted(row["login"] for row in rows) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert_users_duplicate_rolls_back(db_session_builder, generated_project_id):
+    await UserRepository.bulk_insert_users(db_session_builder, user_chunks(generated_project_id, [["x"]]))
+
+    with pytest.raises(IntegrityError):
+        await UserRepository.bulk_insert_users(db_session_builder,
+                                               user_chunks(generated_project_id, [["a", "b"], ["c", "x"]]))
+
+    rows = await UserRepository.get_filtered_rows(db_session_builder, fields=["login"],
+                                                  project_id=generated_project_id)
+
+    assert [row["login"] for row in rows] == ["x"]
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from uuid import uuid4
+
+from src.models.user import User
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.services.user_stats import UserStats
+
+
+@pytest.mark.asyncio
+async def test_stats_count_free_and_locked_per_bucket(sqlite_session_builder, user_repository, generated_project_id):
+    now = datetime.now(timezone.utc)
+    other_project_id = uuid4()
+
+    def user(project_id, env, locktime=None, lease_expires_at=None):
+        return User(login=str(uuid4()), hashed_password="hash", project_id=project_id, env=env, domain=Domain.REGULAR,
+                    locktime=locktime, lease_expires_at=lease_expires_at)
+
+    async with sqlite_session_builder() as session:
+        session.add_all([user(generated_project_id, Environment.PROD), user(generated_project_id, Environment.PROD, now),
+                         user(generated_project_id, Environment.PROD, now, now - timedelta(seconds=1)),
+                         user(generated_project_id, Environment.STAGE, now), user(other_project_id, Environment.PROD)])
+        await session.commit()
+
+    stats = await UserStats(user_repository, ttl=60).get(sqlite_session_builder, (generated_project_id, None, None))
+    counts = {bucket.env: (bucket.total, bucket.free, bucket.locked) for bucket in stats.buckets}
+
+    # Expired lease counts as free even before the reaper clears it
+    assert counts == {Environment.PROD: (3, 2, 1), Environment.STAGE: (1, 0, 1)}
+
+
+@pytest.mark.asyncio
+async def test_stats_are_cached_for_ttl(sqlite_session_builder, user_repository, generated_project_id):
+    user_stats = UserStats(user_repository, ttl=60)
+    first = await user_stats.get(sqlite_session_builder, (None, None, None))
+
+    async with sqlite_session_builder() as session:
+        session.add(User(login="user", hashed_password="hash", project_id=generated_project_id, env=Environment.PROD,
+                         domain=Domain.REGULAR))
+        await session.commit()
+
+    assert (await user_stats.get(sqlite_session_builder, (None, None, None))).buckets == first.buckets == []
+    assert len((await UserStats(user_repository, ttl=0).get(sqlite_session_builder, (None, None, None))).buckets) == 1
@@ -0,0 +1,101 @@
+import pytest
+from uuid import uuid4
+
+from src.exceptions.exceptions import TooManyWaitersException
+from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.Environment import Environment
+from src.schemas.Shared.UserEventType import UserEventType
+from src.services.user_events import UserEvent
+from src.services.user_waiters import UserWaiters
+
+
+def freed(bucket, event_type=UserEventType.RELEASED):
+    return [UserEvent(uuid4(), event_type, bucket)]
+
+
+@pytest.fixture
+def bucket():
+    return uuid4(), Environment.PROD, Domain.REGULAR
+
+
+@pytest.mark.asyncio
+async def test_freed_user_wakes_longest_waiting_matching_waiter(user_waiters, bucket):
+    project_waiter = user_waiters.enqueue((bucket[0], None, None))
+    bucket_waiter = user_waiters.enqueue(bucket)
+    other_waiter = user_waiters.enqueue((uuid4(), None, None))
+
+    user_waiters.apply_events(freed(bucket))
+
+    assert await user_waiters.wait(project_waiter, 0.1)
+    assert not await user_waiters.wait(bucket_waiter, 0.01)
+
+    user_waiters.remove(project_waiter)
+
+    user_waiters.apply_events(freed(bucket, UserEventType.LOCKED) + freed(bucket, UserEventType.CREATED))
+
+    assert await user_waiters.wait(bucket_waiter, 0.1)
+    assert not other_waiter.future.done()
+
+
+@pytest.mark.asyncio
+async def test_woken_waiter_keeps_its_place(user_waiters, bucket):
+    first, second = user_waiters.enqueue(bucket), user_waiters.enqueue(bucket)
+
+    user_waiters.apply_events(freed(bucket))
+    await user_waiters.wait(first, 0.1)
+    user_waiters.apply_events(freed(bucket))
+
+    assert first.future.done()
+    assert not second.future.done()
+
+
+@pytest.mark.asyncio
+async def test_unused_wake_is_handed_over(user_waiters, bucket):
+    first, second = user_waiters.enqueue(bucket), user_waiters.enqueue(bucket)
+
+    user_waiters.apply_events(freed(bucket))
+    user_waiters.remove(first)
+
+    assert await user_waiters.wait(second, 0.1)
+
+    user_waiters.remove(second)
+
+    assert user_waiters.parked == 0
+
+
+@pytest.mark.asyncio
+async def test_wake_is_passed_to_next_waiter(user_waiters, bucket):
+    first, second = user_waiters.enqueue(bucket), user_waiters.enqueue((bucket[0], None, None))
+
+    user_waiters.apply_events(freed(bucket))
+    await user_waiters.wait(first, 0.1)
+    user_waiters.pass_wake(first)
+
+    assert await user_waiters.wait(second, 0.1)
+    assert not first.future.done()
+
+    user_waiters.pass_wake(first)
+
+    assert not second.future.done()
+
+
+@pytest.mark.asyncio
+async def test_waiters_cap(bucket):
+    user_waiters = UserWaiters(max_waiters=1)
+    waiter, unparked = user_waiters.enqueue(bucket), user_waiters.enqueue(bucket)
+    user_waiters.park(waiter)
+    user_waiters.park(waiter)
+
+    with pytest.raises(TooManyWaitersException) as exc_info:
+        user_waiters.park(unparked)
+
+    assert exc_info.value.status_code == 429
+    assert user_waiters.parked == 1
+
+    user_waiters.remove(unparked)
+    user_waiters.remove(waiter)
+    replacement = user_waiters.enqueue(bucket)
+    user_waiters.park(replacement)
+    user_waiters.remove(replacement)
+
+    assert user_waiters.parked == 0
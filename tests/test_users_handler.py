@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from fastapi.testclient import TestClient
@@ -5,6 +7,10 @@ from uuid import uuid4
 
 from src.handlers.main import app
 from src.db.database import get_db
+from src.schemas.Response.BucketStatsResponse import BucketStatsResponse
+from src.schemas.Response.UserStatsResponse import UserStatsResponse
+from src.services.user_event_stream import get_user_event_stream
+from src.services.user_stats import get_user_stats
 from src.services.users_service import UserService
 
 
@@ -81,7 +87,7 @@ def test_get_users_endpoint(client, sample_project_id, mock_user_service, mock_s
     response = client.post("/api/v1/users/get_users", json=get_users_request)
     
     assert response.status_code == 200
-    mock_user_service.get_users.assert_called_once()
+    mock_user_service.get_users_json.assert_called_once()
 
 
 def test_get_users_endpoint_with_id(client, mock_user_service, mock_session_builder):
@@ -93,7 +99,7 @@ def test_get_users_endpoint_with_id(client, mock_user_service, mock_session_buil
     response = client.post("/api/v1/users/get_users", json=get_users_request)
     
     assert response.status_code == 200
-    mock_user_service.get_users.assert_called_once()
+    mock_user_service.get_users_json.assert_called_once()
 
 
 def test_get_users_endpoint_with_login(client, mock_user_service, mock_session_builder):
@@ -104,4 +110,122 @@ def test_get_users_endpoint_with_login(client, mock_user_service, mock_session_b
     response = client.post("/api/v1/users/get_users", json=get_users_request)
 
     assert response.status_code == 200
-    mock_user_service.get_users.assert_called_once()
+    mock_user_service.get_users_json.assert_called_once()
+
+
+def test_get_users_page_endpoint(client, sample_project_id, mock_user_service, mock_session_builder):
+    get_users_request = {
+        "project_id": str(sample_project_id),
+        "limit": 50,
+        "cursor": "abc"
+    }
+
+    response = client.post("/api/v1/users/get_users_page", json=get_users_request)
+
+    assert response.status_code == 200
+    assert response.json() == {"users": [], "next_cursor": None}
+    mock_user_service.get_users_page.assert_called_once()
+
+
+def test_get_users_page_endpoint_limit_too_big(client, mock_user_service, mock_session_builder):
+    response = client.post("/api/v1/users/get_users_page", json={"limit": 100000})
+
+    assert response.status_code == 422
+
+
+def test_get_users_stream_endpoint(client, mock_user_service, mock_session_builder):
+    async def stream_users(*args, **kwargs):
+        yield b'{"login":"user1"}\n'
+        yield b'{"login":"user2"}\n'
+
+    mock_user_service.stream_users = MagicMock(side_effect=stream_users)
+
+    response = client.post("/api/v1/users/get_users_stream", json={"env": "prod"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text.splitlines() == ['{"login":"user1"}', '{"login":"user2"}']
+
+
+def test_get_users_endpoint_returns_serialized_users(client, mock_user_service, mock_session_builder):
+    mock_user_service.get_users_json.return_value = b'[{"login":"user1"}]'
+
+    response = client.post("/api/v1/users/get_users", json={"fields": ["login"]})
+
+    assert response.status_code == 200
+    assert response.json() == [{"login": "user1"}]
+
+
+def test_get_users_endpoint_unknown_field(client, mock_user_service, mock_session_builder):
+    response = client.post("/api/v1/users/get_users", json={"fields": ["hashed_password"]})
+
+    assert response.status_code == 422
+    mock_user_service.get_users_json.assert_not_called()
+
+
+def test_bulk_create_users_endpoint(client, sample_project_id, mock_user_service, mock_session_builder):
+    consumed = []
+
+    async def bulk_create_users(session_builder, users):
+        async for user in users:
+            consumed.append(user)
+        return len(consumed)
+
+    mock_user_service.bulk_create_users = AsyncMock(side_effect=bulk_create_users)
+    body = "login,password,project_id,env,domain\n" + "".join(
+        f"user{i},password{i},{sample_project_id},stage,regular\n" for i in range(3))
+
+    response = client.post("/api/v1/users/bulk_create_users", content=body, headers={"content-type": "text/csv"})
+
+    assert response.status_code == 200
+    assert response.json() == {"created": 3}
+    assert [user.login for user in consumed] == ["user0", "user1", "user2"]
+
+
+def test_bulk_create_users_endpoint_unsupported_content_type(client, mock_user_service, mock_session_builder):
+    response = client.post("/api/v1/users/bulk_create_users", content="<users/>",
+                           headers={"content-type": "application/xml"})
+
+    assert response.status_code == 400
+    mock_user_service.bulk_create_users.assert_not_called()
+
+
+def test_create_users_endpoint_conflict_mode(client, create_users_request, mock_user_service, mock_session_builder):
+    response = client.post("/api/v1/users/create_users", json={**create_users_request, "on_conflict": "update"})
+
+    assert response.status_code == 200
+    assert response.json() == {"inserted": [], "updated": [], "skipped": []}
+    assert mock_user_service.create_users.call_args.kwargs["on_conflict"] == "update"
+
+
+def test_user_events_endpoint(client, sample_project_id):
+    requested = []
+
+    class FakeStream:
+        async def stream(self, key):
+            requested.append(key)
+            yield b"event: created\ndata: {}\n\n"
+
+    app.dependency_overrides[get_user_event_stream] = lambda: FakeStream()
+
+    response = client.get("/api/v1/users/events", params={"project_id": str(sample_project_id), "env": "prod"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == "event: created\ndata: {}\n\n"
+    assert requested == [(sample_project_id, "prod", None)]
+
+
+def test_user_stats_endpoint(client, mock_session_builder, sample_project_id):
+    stats = MagicMock()
+    stats.get = AsyncMock(return_value=UserStatsResponse(buckets=[BucketStatsResponse(
+        project_id=sample_project_id, env="prod", domain="canary", total=3, free=1, locked=2)],
+        counted_at=datetime.now(timezone.utc)))
+    app.dependency_overrides[get_user_stats] = lambda: stats
+
+    response = client.get("/api/v1/users/stats", params={"domain": "canary"})
+
+    assert response.status_code == 200
+    assert response.json()["buckets"] == [{"project_id": str(sample_project_id), "env": "prod", "domain": "canary",
+                                           "total": 3, "free": 1, "locked": 2}]
+    stats.get.assert_called_once_with(mock_session_builder, (None, None, "canary"))
@@ -1,12 +1,21 @@
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 
-from src.exceptions.exceptions import UserAlreadyExistsException, UserNotFoundException
+from src.exceptions.exceptions import UserAlreadyExistsException, UserNotFoundException, InvalidCursorException
+from src.models.user import User
+from src.repositories.user_repository import UserRepository
 from src.schemas.Request.CreateUsersRequest import CreateUsersRequest
 from src.schemas.Request.GetUsersRequest import GetUsersRequest
 from src.schemas.Shared.Domain import Domain
+from src.schemas.Shared.ConflictMode import ConflictMode
 from src.schemas.Shared.Environment import Environment
+from src.utils.cursor import decode_cursor
+from src.utils.hashing import verify_password
 
 
 @pytest.mark.asyncio
@@ -29,17 +38,21 @@ async def test_create_users_success(user_service, mock_session_builder, mock_ses
         )
     ]
     
-    mock_result = MagicMock()
-    mock_result.scalars.return_value.all.return_value = []
-    mock_session.execute = AsyncMock(return_value=mock_result)
+    async def insert_users(session_builder, users, **kwargs):
+        return [SimpleNamespace(id=user["id"], login=user["login"]) for user in users]
+
+    user_service._user_repository.insert_users = AsyncMock(side_effect=insert_users)
     
-    with patch('src.services.users_service.hash_password') as mock_hash:
-        mock_hash.side_effect = lambda p: f"hashed_{p}"
+    with patch('src.services.users_service.hash_passwords') as mock_hash:
+        mock_hash.side_effect = lambda passwords: [f"hashed_{p}" for p in passwords]
         
-        await user_service.create_users(mock_session_builder, users_request)
+        result = await user_service.create_users(mock_session_builder, users_request)
     
-    assert mock_session.add_all.called
-    mock_session.commit.assert_called_once()
+    inserted_users = user_service._user_repository.insert_users.call_args.args[1]
+
+    assert result.inserted == ["user1", "user2"]
+    assert result.updated == [] and result.skipped == []
+    assert [user["hashed_password"] for user in inserted_users] == ["hashed_password1", "hashed_password2"]
 
 
 @pytest.mark.asyncio
@@ -56,14 +69,16 @@ async def test_create_users_user_already_exists(user_service, mock_session_build
     ]
     
     mock_result = MagicMock()
-    mock_result.scalars.return_value.all.return_value = ["existing_user"]
+    mock_result.all.return_value = []
     mock_session.execute = AsyncMock(return_value=mock_result)
     
     with pytest.raises(UserAlreadyExistsException) as exc_info:
         await user_service.create_users(mock_session_builder, users_request)
     
     assert exc_info.value.status_code == 409
-    assert "existing_logins" in exc_info.value.meta
+    assert exc_info.value.meta["existing_logins"] == ["existing_user"]
+    mock_session.execute.assert_called_once()
+    mock_session.rollback.assert_called_once()
 
 
 @pytest.mark.asyncio
@@ -175,3 +190,206 @@ async def test_get_users_priority_id_over_login(user_service, mock_session_build
     
     assert len(result) == 1
     assert result[0].id == sample_user.id
+
+
+@pytest.mark.asyncio
+async def test_get_users_page_has_next_cursor(user_service, mock_session_builder, mock_session, generated_project_id):
+    users = [User(id=uuid4(), login=f"user{i}", project_id=generated_project_id, env=Environment.PROD,
+                  domain=Domain.REGULAR, created_at=datetime.now(timezone.utc), locktime=None) for i in range(3)]
+
+    mock_result = MagicMock()
+    mock_result.scalars.return_value.all.return_value = users
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await user_service.get_users_page(mock_session_builder, GetUsersRequest(limit=2))
+
+    assert [user.id for user in result.users] == [user.id for user in users[:2]]
+    assert decode_cursor(result.next_cursor) == (users[1].created_at, users[1].id)
+
+
+@pytest.mark.asyncio
+async def test_get_users_page_last_page(user_service, mock_session_builder, mock_session, sample_user):
+    mock_result = MagicMock()
+    mock_result.scalars.return_value.all.return_value = [sample_user]
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await user_service.get_users_page(mock_session_builder, GetUsersRequest(limit=2))
+
+    assert len(result.users) == 1
+    assert result.next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_users_page_invalid_cursor(user_service, mock_session_builder):
+    with pytest.raises(InvalidCursorException) as exc_info:
+        await user_service.get_users_page(mock_session_builder, GetUsersRequest(cursor="not-a-cursor"))
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_stream_users_ndjson(user_service, mock_session_builder, sample_user):
+    row = {"id": sample_user.id, "created_at": sample_user.created_at, "login": sample_user.login,
+           "project_id": sample_user.project_id, "env": sample_user.env, "domain": sample_user.domain,
+           "locktime": None, "lease_expires_at": None}
+
+    async def stream_filtered_users(*args, **kwargs):
+        yield [row, row]
+        yield [row]
+
+    user_service._user_repository.stream_filtered_users = stream_filtered_users
+
+    chunks = [chunk async for chunk in user_service.stream_users(mock_session_builder, GetUsersRequest())]
+    lines = b"".join(chunks).decode().splitlines()
+
+    assert len(chunks) == 2
+    assert len(lines) == 3
+    assert json.loads(lines[0]) == {"id": str(sample_user.id), "created_at": sample_user.created_at.isoformat(),
+                                    "login": sample_user.login, "project_id": str(sample_user.project_id),
+                                    "env": "prod", "domain": "regular", "locktime": None, "lease_expires_at": None}
+
+
+@pytest.mark.asyncio
+async def test_get_users_json(user_service, mock_session_builder, mock_session, sample_user):
+    mock_result = MagicMock()
+    mock_result.mappings.return_value.all.return_value = [{"id": sample_user.id, "env": sample_user.env}]
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    result = await user_service.get_users_json(mock_session_builder, GetUsersRequest(fields=["id", "env"]))
+
+    assert json.loads(result) == [{"id": str(sample_user.id), "env": "prod"}]
+
+
+@pytest.mark.asyncio
+async def test_get_users_json_by_login_not_found(user_service, mock_session_builder, mock_session):
+    mock_result = MagicMock()
+    mock_result.mappings.return_value.all.return_value = []
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+    with pytest.raises(UserNotFoundException) as exc_info:
+        await user_service.get_users_json(mock_session_builder, GetUsersRequest(login="missing"))
+
+    assert exc_info.value.meta["login"] == "missing"
+
+
+async def create_requests(count, project_id):
+    for i in range(count):
+        yield CreateUsersRequest(login=f"user{i}", password=f"password{i}", project_id=project_id,
+                                 env=Environment.STAGE, domain=Domain.REGULAR)
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_users_in_chunks(user_service, mock_session_builder, monkeypatch, generated_project_id):
+    monkeypatch.setattr('src.config.settings.BULK_CREATE_CHUNK_SIZE', 2)
+    chunks = []
+
+    async def bulk_insert_users(session_builder, records):
+        async for chunk in records:
+            chunks.append(chunk)
+        return sum(map(len, chunks))
+
+    user_service._user_repository.bulk_insert_users = bulk_insert_users
+
+    created = await user_service.bulk_create_users(mock_session_builder, create_requests(5, generated_project_id))
+
+    assert created == 5
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0][0]["login"] == "user0"
+    assert verify_password("password0", chunks[0][0]["hashed_password"])
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_users_existing_login(user_service, db_session_builder, monkeypatch, generated_project_id):
+    monkeypatch.setattr('src.config.settings.BULK_CREATE_CHUNK_SIZE', 2)
+
+    async def requests(logins):
+        for login in logins:
+            yield CreateUsersRequest(login=login, password="password", project_id=generated_project_id,
+                                     env=Environment.STAGE, domain=Domain.REGULAR)
+
+    await user_service.bulk_create_users(db_session_builder, requests(["user4"]))
+
+    # Existing login is only met in the third chunk, the first two must not stay written
+    with pytest.raises(UserAlreadyExistsException):
+        await user_service.bulk_create_users(db_session_builder, requests([f"user{i}" for i in range(5)]))
+
+    rows = await UserRepository.get_filtered_rows(db_session_builder, fields=["login"],
+                                                  project_id=generated_project_id)
+
+    assert [row["login"] for row in rows] == ["user4"]
+
+
+@pytest.mark.asyncio
+async def test_create_users_skip_and_update_existing(user_service, sqlite_session_builder, generated_project_id):
+    def request(login, password, env=Environment.STAGE):
+        return CreateUsersRequest(login=login, password=password, project_id=generated_project_id, env=env,
+                                  domain=Domain.REGULAR)
+
+    await user_service.create_users(sqlite_session_builder, [request("user1", "old")])
+
+    skipped = await user_service.create_users(sqlite_session_builder,
+                                              [request("user1", "new"), request("user2", "p"), request("user2", "p")],
+                                              on_conflict=ConflictMode.SKIP)
+    updated = await user_service.create_users(sqlite_session_builder,
+                                              [request("user1", "new", Environment.PROD), request("user3", "p")],
+                                              on_conflict=ConflictMode.UPDATE)
+
+    assert skipped.model_dump() == {"inserted": ["user2"], "updated": [], "skipped": ["user1", "user2"]}
+    assert updated.model_dump() == {"inserted": ["user3"], "updated": ["user1"], "skipped": []}
+
+    result = await user_service.get_users(sqlite_session_builder, GetUsersRequest(login="user1"))
+
+    assert result[0].env == Environment.PROD
+
+
+@pytest.mark.asyncio
+async def test_create_users_error_mode_creates_nothing(user_service, sqlite_session_builder, generated_project_id):
+    users = [CreateUsersRequest(login=login, password="p", project_id=generated_project_id, env=Environment.STAGE,
+                                domain=Domain.REGULAR) for login in ("user1", "user2")]
+
+    await user_service.create_users(sqlite_session_builder, users[:1])
+
+    with pytest.raises(UserAlreadyExistsException) as exc_info:
+        await user_service.create_users(sqlite_session_builder, users)
+
+    assert exc_info.value.meta["existing_logins"] == ["user1"]
+    assert await user_service.get_users(sqlite_session_builder, GetUsersRequest(login="user1"))
+
+    with pytest.raises(UserNotFoundException):
+        await user_service.get_users(sqlite_session_builder, GetUsersRequest(login="user2"))
+
+
+@pytest.mark.asyncio
+async def test_create_users_error_mode_repeated_login_creates_nothing(user_service, sqlite_session_builder,
+                                                                      generated_project_id):
+    users = [CreateUsersRequest(login=login, password="p", project_id=generated_project_id, env=Environment.STAGE,
+                                domain=Domain.REGULAR) for login in ("user1", "user2", "user1")]
+
+    with pytest.raises(UserAlreadyExistsException) as exc_info:
+        await user_service.create_users(sqlite_session_builder, users)
+
+    assert exc_info.value.meta["repeated_logins"] == ["user1"]
+    assert await user_service.get_users(sqlite_session_builder, GetUsersRequest()) == []
+
+
+@pytest.mark.asyncio
+async def test_get_users_json_identity_fields_from_cache(user_service, sqlite_session_builder, sample_user):
+    async with sqlite_session_builder() as session:
+        session.add(sample_user)
+        await session.commit()
+
+    request = GetUsersRequest(login=sample_user.login, fields=["id", "env"])
+
+    first = json.loads(await user_service.get_users_json(sqlite_session_builder, request))
+
+    async with sqlite_session_builder() as session:
+        await session.delete(await session.get(User, sample_user.id))
+        await session.commit()
+
+    # Served from cache without going to db
+    second = json.loads(await user_service.get_users_json(sqlite_session_builder, request))
+
+    assert first == second == [{"id": str(sample_user.id), "env": sample_user.env.value}]
+
+    with pytest.raises(UserNotFoundException):
+        await user_service.get_users_json(sqlite_session_builder, GetUsersRequest(id=uuid4(), fields=["login"]))